@@ -41,6 +41,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    # first, so that it sees the session saved
+    'quiz.metrics.QuizMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -102,6 +104,57 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Cache
+# the quiz plans and pages are invalidated through the default cache: with
+# several worker processes it must be shared by them (see quiz.checks), e.g.
+# CACHES = {'default': {
+#     'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+#     'LOCATION': '127.0.0.1:11211'}}
+# the per-process default below is only correct with a single process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+# the warning about the per-process cache; remove it with a shared cache
+SILENCED_SYSTEM_CHECKS = ['quiz.W001']
+
+# Quiz
+# max number of compiled quizzes kept in memory by each worker
+QUIZ_PLAN_CACHE_SIZE = 128
+# max number of published snapshots kept in memory by each worker
+QUIZ_SNAPSHOT_CACHE_SIZE = 128
+# where the quiz progress is kept; use 'quiz.progress.SignedCookieProgressStore'
+# to keep it in a signed cookie instead of the session backend
+QUIZ_PROGRESS_STORE = 'quiz.progress.SessionProgressStore'
+# longest progress cookie; the progress of larger quizzes is kept in the session
+QUIZ_PROGRESS_COOKIE_MAX_BYTES = 3800
+# queue the analytics and leaderboard updates of the finished attempts and
+# write them in batches from a background thread
+QUIZ_AGGREGATES_WRITE_BEHIND = False
+# queue finished attempts and write them in batches from a background thread
+QUIZ_ATTEMPT_WRITE_BEHIND = False
+QUIZ_ATTEMPT_QUEUE_SIZE = 10000
+QUIZ_ATTEMPT_BATCH_SIZE = 500
+QUIZ_ATTEMPT_FLUSH_INTERVAL = 1.0
+# quizzes listed on each page of the index
+QUIZ_INDEX_PAGE_SIZE = 50
+# pages of questions kept in memory for each quiz with lazy_pages
+QUIZ_LAZY_PAGE_CACHE_SIZE = 64
+# questions shown on each page of the question inline of the quiz admin
+QUIZ_ADMIN_QUESTIONS_PER_PAGE = 50
+# best attempts shown on the leaderboard of each quiz
+QUIZ_LEADERBOARD_SIZE = 10
+# serve the request metrics at quiz/metrics/, to the staff users, the
+# addresses of QUIZ_METRICS_ALLOWED_IPS and the requests with the header
+# 'Authorization: Bearer <QUIZ_METRICS_TOKEN>'
+QUIZ_METRICS_ENABLED = False
+QUIZ_METRICS_ALLOWED_IPS = ()
+QUIZ_METRICS_TOKEN = None
+# seconds browsers and shared caches may keep the index and the quiz
+# definitions of the JSON API without revalidating them
+QUIZ_HTTP_MAX_AGE = 60
+
 # Logger
 LOGGING = {
     'version': 1,
@@ -1,6 +1,14 @@
-from django.contrib import admin
+from django.conf import settings
+from django.conf.urls import url
+from django.contrib import admin, messages
+from django.core.urlresolvers import reverse
+from django.forms.models import BaseInlineFormSet
+from django.shortcuts import get_object_or_404, render
 
+from .analytics import quiz_analytics
+from .bulk import clone_quiz
 from .models import Quiz, Question, Option
+from .snapshots import publish_quiz, unpublish_quiz
 
 
 class OptionInline(admin.StackedInline):
@@ -14,17 +22,130 @@ class QuestionAdmin(admin.ModelAdmin):
         (None,      {'fields': ['quiz_name', 'text']}),
     ]
     inlines = [OptionInline]
+    list_display = ('text', 'quiz_name', 'option_count')
+    list_select_related = ('quiz',)
+    search_fields = ('text', 'quiz__name')
 
+    def get_queryset(self, request):
+        # quiz_name of the change page without a query for the quiz
+        return super(QuestionAdmin, self).get_queryset(request).select_related('quiz')
 
-class QuestionInline(admin.StackedInline):
+    def lookup_allowed(self, lookup, value):
+        # the questions of a quiz, linked from QuestionInline
+        return lookup == 'quiz__id__exact' or \
+            super(QuestionAdmin, self).lookup_allowed(lookup, value)
+
+
+class QuestionInlineFormSet(BaseInlineFormSet):
+    '''The questions of one page of the quiz, see QuestionInline'''
+    page_no = 0
+    per_page = 50
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super(QuestionInlineFormSet, self).get_queryset()
+            self.question_count = queryset.count()
+            self.page_count = max((self.question_count + self.per_page - 1) // self.per_page, 1)
+            self.page_no = min(max(self.page_no, 0), self.page_count - 1)
+            start = self.page_no * self.per_page
+            self._queryset = queryset[start:start + self.per_page]
+        return self._queryset
+
+    def changelist_url(self):
+        return '%s?quiz__id__exact=%d' % (reverse('admin:quiz_question_changelist'),
+                                           self.instance.id)
+
+
+class QuestionInline(admin.TabularInline):
+    '''
+    The questions of a quiz are paginated (QUIZ_ADMIN_QUESTIONS_PER_PAGE
+    per page, the page is the questions_page query parameter) so the
+    change page of a large quiz stays small.
+    '''
     model = Question
-    extra = 3
+    formset = QuestionInlineFormSet
+    fields = ('text', 'option_count')
+    readonly_fields = ('option_count',)
+    extra = 1
     show_change_link = True
+    template = 'quiz_question_inline.html'
+    page_var = 'questions_page'
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super(QuestionInline, self).get_formset(request, obj, **kwargs)
+        try:
+            formset.page_no = int(request.GET.get(self.page_var, 0))
+        except ValueError:
+            pass
+        formset.per_page = getattr(settings, 'QUIZ_ADMIN_QUESTIONS_PER_PAGE', 50)
+        formset.page_var = self.page_var
+        return formset
 
 
 class QuizAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'max_score', 'published_version', 'analytics_link')
+    list_select_related = ('published_snapshot',)
     inlines = [QuestionInline]
+    actions = ['clone_quizzes', 'publish_quizzes', 'unpublish_quizzes']
+
+    def get_urls(self):
+        return [
+            url(r'^(\d+)/analytics/$', self.admin_site.admin_view(self.analytics_view),
+                name='quiz_quiz_analytics'),
+        ] + super(QuizAdmin, self).get_urls()
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # only the fields of the form: a full save would write back the
+            # published snapshot read with the form, undoing a publish or an
+            # unpublish made meanwhile
+            obj.save(update_fields=list(form.fields))
+        else:
+            obj.save()
+
+    def published_version(self, quiz):
+        snapshot = quiz.published_snapshot
+        return snapshot.version if snapshot is not None else ''
+    published_version.short_description = 'Published'
+
+    def analytics_link(self, quiz):
+        return '<a href="%s">analytics</a>' % reverse('admin:quiz_quiz_analytics', args=[quiz.id])
+    analytics_link.short_description = 'Analytics'
+    analytics_link.allow_tags = True
+
+    def analytics_view(self, request, quiz_id):
+        '''Reads only the analytics aggregates, never the attempts'''
+        quiz = get_object_or_404(Quiz, id=quiz_id)
+        context = dict(self.admin_site.each_context(request),
+                       quiz=quiz,
+                       analytics=quiz_analytics(quiz.id))
+        return render(request, 'quiz_analytics.html', context)
+
+    def clone_quizzes(self, request, queryset):
+        quiz_ids = list(queryset.values_list('id', flat=True))
+        for quiz_id in quiz_ids:
+            clone_quiz(quiz_id)
+        self.message_user(request, '%d quiz(zes) cloned.' % len(quiz_ids))
+    clone_quizzes.short_description = 'Clone the selected quizzes'
+
+    def publish_quizzes(self, request, queryset):
+        published = 0
+        for quiz in queryset:
+            try:
+                publish_quiz(quiz.id)
+            except ValueError as exception:
+                self.message_user(request, '%s: %s' % (quiz.name, exception), messages.ERROR)
+            else:
+                published += 1
+        self.message_user(request, '%d quiz(zes) published.' % published)
+    publish_quizzes.short_description = 'Publish the selected quizzes'
+
+    def unpublish_quizzes(self, request, queryset):
+        quiz_ids = list(queryset.values_list('id', flat=True))
+        for quiz_id in quiz_ids:
+            unpublish_quiz(quiz_id)
+        self.message_user(request, '%d quiz(zes) unpublished.' % len(quiz_ids))
+    unpublish_quizzes.short_description = 'Unpublish the selected quizzes'
 
 
 admin.site.register(Quiz, QuizAdmin)
@@ -0,0 +1,129 @@
+'''
+Per-quiz analytics: option pick counts and score histograms.
+
+The aggregate rows (OptionPickCount, ScoreCount) are incremented when
+attempts are saved, so reading them never scans the attempts. They can be
+recomputed from the raw attempts with the rebuild_quiz_analytics
+management command.
+'''
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .chunks import CHUNK_SIZE, chunks
+from .models import Option, Attempt, AttemptAnswer, OptionPickCount, ScoreCount
+from .plans import get_plan
+
+
+def _increment(model, lookup, count, defaults=None):
+    '''UPDATE ... SET count = count + n, or INSERT when there is no row yet'''
+    if model.objects.filter(**lookup).update(count=F('count') + count):
+        return
+    values = dict(lookup, count=count, **(defaults or {}))
+    try:
+        with transaction.atomic():
+            model.objects.create(**values)
+    except IntegrityError:
+        # created concurrently
+        model.objects.filter(**lookup).update(count=F('count') + count)
+
+
+def _increment_picks(pick_counts):
+    for option_ids in chunks(pick_counts):
+        existing = set(OptionPickCount.objects.filter(option_id__in=option_ids)
+                                              .values_list('option_id', flat=True))
+
+        # one UPDATE for all the options incremented by the same amount
+        by_count = defaultdict(list)
+        for option_id in existing:
+            by_count[pick_counts[option_id]].append(option_id)
+        for count, updated_ids in by_count.items():
+            OptionPickCount.objects.filter(option_id__in=updated_ids) \
+                                   .update(count=F('count') + count)
+
+        missing = [option_id for option_id in option_ids if option_id not in existing]
+        if not missing:
+            continue
+        new_rows = [OptionPickCount(option_id=option_id, question_id=question_id,
+                                    quiz_id=quiz_id, count=pick_counts[option_id])
+                    for option_id, question_id, quiz_id in
+                    Option.objects.filter(id__in=missing)
+                                  .values_list('id', 'question_id', 'question__quiz_id')]
+        try:
+            with transaction.atomic():
+                OptionPickCount.objects.bulk_create(new_rows)
+        except IntegrityError:
+            for row in new_rows:
+                _increment(OptionPickCount, {'option_id': row.option_id}, row.count,
+                           {'question_id': row.question_id, 'quiz_id': row.quiz_id})
+
+
+def update_analytics(records):
+    '''Adds a batch of quiz.attempts.AttemptRecord to the aggregates'''
+    score_counts = Counter((record.quiz_id, record.score) for record in records)
+    for (quiz_id, score), count in score_counts.items():
+        _increment(ScoreCount, {'quiz_id': quiz_id, 'score': score}, count)
+
+    _increment_picks(Counter(option_id
+                             for record in records
+                             for option_id in record.option_ids))
+
+
+def rebuild_analytics(quiz_ids=None):
+    '''Recomputes the aggregates of the given quizzes (all if None) from the attempts'''
+    attempts = Attempt.objects.all()
+    answers = AttemptAnswer.objects.all()
+    score_counts = ScoreCount.objects.all()
+    pick_counts = OptionPickCount.objects.all()
+    if quiz_ids is not None:
+        attempts = attempts.filter(quiz__in=quiz_ids)
+        answers = answers.filter(attempt__quiz__in=quiz_ids)
+        score_counts = score_counts.filter(quiz__in=quiz_ids)
+        pick_counts = pick_counts.filter(quiz__in=quiz_ids)
+
+    with transaction.atomic():
+        score_counts.delete()
+        pick_counts.delete()
+
+        ScoreCount.objects.bulk_create(
+            [ScoreCount(quiz_id=row['quiz'], score=row['score'], count=row['count'])
+             for row in attempts.values('quiz', 'score').annotate(count=Count('id'))],
+            batch_size=CHUNK_SIZE)
+        OptionPickCount.objects.bulk_create(
+            [OptionPickCount(option_id=row['option'],
+                             question_id=row['option__question'],
+                             quiz_id=row['option__question__quiz'],
+                             count=row['count'])
+             for row in answers.values('option', 'option__question', 'option__question__quiz')
+                               .annotate(count=Count('id'))],
+            batch_size=CHUNK_SIZE)
+
+
+def quiz_analytics(quiz_id):
+    '''
+    Reads the aggregates of a quiz:
+      {'attempts': 10,
+       'scores': [(score, count, percent), ...],
+       'questions': [('question_text', [('option_text', picks, percent), ...]), ...]}
+    '''
+    scores = list(ScoreCount.objects.filter(quiz=quiz_id)
+                                    .order_by('score')
+                                    .values_list('score', 'count'))
+    attempts = sum(count for _, count in scores)
+    picks = dict(OptionPickCount.objects.filter(quiz=quiz_id).values_list('option_id', 'count'))
+
+    def percent(count):
+        return 100.0 * count / attempts if attempts else 0.0
+
+    questions = []
+    for question in get_plan(quiz_id).full().questions:
+        options = []
+        for option in question.options:
+            option_picks = picks.get(option.id, 0)
+            options.append((option.text, option_picks, percent(option_picks)))
+        questions.append((question.text, options))
+
+    return {'attempts': attempts,
+            'scores': [(score, count, percent(count)) for score, count in scores],
+            'questions': questions}
@@ -0,0 +1,138 @@
+'''
+JSON API for quiz clients.
+
+  GET  api/<quiz_id>/          quiz definition, without the scores; sent with a
+                               strong ETag of the quiz content and the Last-Modified
+                               of the quiz, honours If-None-Match/If-Modified-Since
+  POST api/<quiz_id>/answers/  {"version": "...", "options": [option_id, ...], "page": 0}
+                               scores the selected options of one page, or of the
+                               whole quiz (and records the attempt) without "page"
+
+The API is stateless: nothing is kept in the session between requests, so
+quizzes with a sample_size, whose questions are drawn for each attempt, are
+not served (400), nor are the quizzes with lazy_pages, too large to be sent
+or scored at once.
+'''
+import json
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .attempts import record_attempt
+from .plans import get_plan
+from .progress import QuizProgress
+from .views import quiz_view
+
+
+def _is_served(plan):
+    return plan.sample_size is None and not plan.lazy
+
+
+def _plan_etag(request, quiz_id):
+    # none for the quizzes answered with a 400, which must not become a 304
+    plan = get_plan(quiz_id)
+    return plan.content_version if _is_served(plan) else None
+
+
+def _plan_last_modified(request, quiz_id):
+    plan = get_plan(quiz_id)
+    return plan.updated_at if _is_served(plan) else None
+
+
+def _error(status, message, **extra):
+    return JsonResponse(dict(extra, error=message), status=status)
+
+
+def _unserved_error(plan):
+    if plan.lazy:
+        return _error(400, 'This quiz is only served page by page.')
+    return _error(400, 'The questions of this quiz are drawn for each attempt.')
+
+
+def _sugestion_json(sugestion):
+    (best_text, best_diff), (worst_text, worst_diff) = sugestion
+    return {'best': {'text': best_text, 'score_change': best_diff},
+            'worst': {'text': worst_text, 'score_change': worst_diff}}
+
+
+@require_GET
+@condition(etag_func=_plan_etag, last_modified_func=_plan_last_modified)
+def quiz_definition(request, quiz_id):
+    plan = get_plan(quiz_id)
+    if not _is_served(plan):
+        return _unserved_error(plan)
+    response = JsonResponse({
+        'id': plan.quiz_id,
+        'version': plan.version,
+        'questions_per_page': quiz_view.questions_per_page,
+        'questions': [{'id': question.id,
+                       'text': question.text,
+                       'options': [{'id': option.id, 'text': option.text}
+                                   for option in question.options]}
+                      for question in plan.questions]})
+    patch_cache_control(response, public=True,
+                        max_age=getattr(settings, 'QUIZ_HTTP_MAX_AGE', 60))
+    return response
+
+
+@csrf_exempt
+@require_POST
+def submit_answers(request, quiz_id):
+    plan = get_plan(quiz_id)
+    if not _is_served(plan):
+        return _unserved_error(plan)
+    questions_per_page = quiz_view.questions_per_page
+
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        option_ids = [int(option_id) for option_id in data.get('options', [])]
+        page = data.get('page')
+        if page is not None:
+            page = int(page)
+    except (ValueError, TypeError, AttributeError):
+        return _error(400, 'Invalid request body.')
+
+    if data.get('version', plan.version) != plan.version:
+        return _error(409, 'The quiz was changed.', version=plan.version)
+
+    progress = QuizProgress.for_plan(plan, questions_per_page)
+    if page is not None and not 0 <= page <= progress.last_page_no:
+        return _error(400, 'Invalid page.')
+
+    option_indexes = plan.option_indexes
+    for option_id in option_ids:
+        if option_id not in option_indexes:
+            return _error(400, 'Invalid option %d.' % option_id)
+        progress.set_selected(option_indexes[option_id], True)
+
+    errors = quiz_view._get_page_errors(plan, progress,
+                                        [page] if page is not None else None)
+    if errors:
+        return _error(400, 'Invalid answers.',
+                      pages=dict((str(page_no), error) for page_no, error in errors.items()))
+
+    scoring = plan.scoring
+    mask = scoring.selection_mask(progress)
+    if page is not None:
+        page_questions = plan.page_questions(page, questions_per_page)
+        page_score = quiz_view._calculate_score([option
+                                                 for question in page_questions
+                                                 for option in question.options
+                                                 if progress.is_selected(option.index)])
+        record = scoring.page_change_record(mask, questions_per_page, page)
+        return JsonResponse({'page': page,
+                             'score': page_score,
+                             'sugestion': _sugestion_json(scoring.sugestion_texts([record])[0])})
+
+    # a whole quiz submission is a finished attempt
+    progress.current_score = [scoring.score(mask)]
+    record_attempt(plan, progress)
+
+    records = scoring.change_records(mask, questions_per_page)
+    return JsonResponse({'score': progress.current_score[0],
+                         'max_score': scoring.max_score,
+                         'sugestions': [_sugestion_json(sugestion)
+                                        for sugestion in scoring.sugestion_texts(records)]})
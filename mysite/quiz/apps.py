@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class QuizConfig(AppConfig):
+    name = 'quiz'
+
+    def ready(self):
+        # connect the plan cache invalidation handlers
+        from . import signals  # noqa
+        from . import checks  # noqa
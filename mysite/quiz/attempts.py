@@ -0,0 +1,147 @@
+'''
+Persistence of finished quiz attempts.
+
+The Finish request saves the attempt, its answers and the increments of
+the analytics aggregates and the leaderboards. With the
+QUIZ_AGGREGATES_WRITE_BEHIND setting it only inserts the attempt and its
+answers: the increments are queued and written in batches by a
+quiz.writebehind.WriteBehindBuffer, so the result page does not count the
+attempt yet. The attempt must be committed when it is queued, so the views
+recording attempts must not run in ATOMIC_REQUESTS.
+
+With the QUIZ_ATTEMPT_WRITE_BEHIND setting the whole attempts are queued
+and written in batches by another buffer instead of during the Finish
+request.
+'''
+from collections import namedtuple
+import threading
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import update_analytics
+from .chunks import chunks
+from .leaderboard import update_leaderboards
+from .models import Attempt, AttemptAnswer, Option
+from .writebehind import WriteBehindBuffer
+
+
+AttemptRecord = namedtuple('AttemptRecord', ['quiz_id', 'score', 'max_score',
+                                             'option_ids', 'finished_at'])
+
+
+def _insert_attempts(records):
+    '''One INSERT for each AttemptRecord, one bulk INSERT for all their answers'''
+    answers = []
+    attempts = []
+    for record in records:
+        attempt = Attempt.objects.create(quiz_id=record.quiz_id,
+                                         score=record.score,
+                                         max_score=record.max_score,
+                                         finished_at=record.finished_at)
+        answers.extend(AttemptAnswer(attempt=attempt, option_id=option_id)
+                       for option_id in record.option_ids)
+        attempts.append(attempt)
+    AttemptAnswer.objects.bulk_create(answers)
+    return attempts
+
+
+def save_aggregates(saved):
+    '''
+    Adds a batch of saved attempts, (AttemptRecord, Attempt) pairs, to the
+    analytics aggregates and the leaderboards in a single transaction.
+    '''
+    with transaction.atomic():
+        update_analytics([record for record, _ in saved])
+        update_leaderboards([attempt for _, attempt in saved])
+
+
+def save_attempts(records):
+    '''
+    Saves a batch of AttemptRecord in a single transaction: the attempts,
+    their answers and the increments of the analytics aggregates and the
+    leaderboards.
+    '''
+    with transaction.atomic():
+        attempts = _insert_attempts(records)
+        update_analytics(records)
+        update_leaderboards(attempts)
+    return attempts
+
+
+def _writer(write_batch):
+    writer = WriteBehindBuffer(
+        write_batch,
+        max_queue=getattr(settings, 'QUIZ_ATTEMPT_QUEUE_SIZE', 10000),
+        batch_size=getattr(settings, 'QUIZ_ATTEMPT_BATCH_SIZE', 500),
+        flush_interval=getattr(settings, 'QUIZ_ATTEMPT_FLUSH_INTERVAL', 1.0))
+    writer.start()
+    return writer
+
+
+_attempt_writer = None
+_aggregate_writer = None
+_writers_lock = threading.Lock()
+
+
+def get_attempt_writer():
+    '''Returns the process-wide attempt writer, started on first use'''
+    global _attempt_writer
+    with _writers_lock:
+        if _attempt_writer is None:
+            _attempt_writer = _writer(save_attempts)
+    return _attempt_writer
+
+
+def get_aggregate_writer():
+    '''Returns the process-wide writer of the aggregates, started on first use'''
+    global _aggregate_writer
+    with _writers_lock:
+        if _aggregate_writer is None:
+            _aggregate_writer = _writer(save_aggregates)
+    return _aggregate_writer
+
+
+def attempt_writer_stats():
+    '''Statistics of the attempt writer, None when it was not started'''
+    writer = _attempt_writer
+    return writer.stats() if writer is not None else None
+
+
+def aggregate_writer_stats():
+    '''Statistics of the writer of the aggregates, None when it was not started'''
+    writer = _aggregate_writer
+    return writer.stats() if writer is not None else None
+
+
+def record_attempt(plan, progress):
+    '''
+    Records a finished attempt; returns the saved Attempt or None when the
+    attempt was queued for the write-behind writer.
+    '''
+    scoring = plan.scoring
+    option_ids = plan.option_ids(np.flatnonzero(scoring.selection_mask(progress)))
+    if plan.published:
+        # the quiz may have been edited since its snapshot was published
+        option_ids = [option_id for chunk in chunks(option_ids)
+                      for option_id in Option.objects.filter(id__in=chunk)
+                                                     .values_list('id', flat=True)]
+    record = AttemptRecord(plan.quiz_id,
+                           sum(progress.current_score),
+                           scoring.max_score,
+                           option_ids,
+                           timezone.now())
+
+    if getattr(settings, 'QUIZ_ATTEMPT_WRITE_BEHIND', False):
+        get_attempt_writer().submit(record)
+        return None
+    if not getattr(settings, 'QUIZ_AGGREGATES_WRITE_BEHIND', False):
+        return save_attempts([record])[0]
+
+    with transaction.atomic():
+        attempt = _insert_attempts([record])[0]
+    get_aggregate_writer().submit((record, attempt))
+    return attempt
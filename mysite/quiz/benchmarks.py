@@ -0,0 +1,234 @@
+'''
+Microbenchmarks of the quiz request path and of the plan loaders, used by
+the quiz_benchmark management command.
+
+Each helper is timed over synthetic quizzes of increasing option counts
+(OPTIONS_PER_QUESTION options per question, random scores, at least one
+selected option per question). The results are
+  {'helper': {'<options>': {'seconds': 0.001, 'peak_kb': 12.5}, ...}, ...}
+where seconds is the best time of one call over the repeats and peak_kb
+the peak memory of one call: the memory allocated by Python with
+tracemalloc (Python 3), else the growth of the peak resident set size of
+the process, reset before the call through /proc/self/clear_refs (Linux),
+which also counts the memory of the C libraries (SQLite, numpy) but not
+the memory Python reuses from earlier calls; None when neither is
+available. Baselines are only comparable on the same interpreter.
+
+HELPERS are the code the quiz views run: the ScoringEngine behind the
+pages, the suggestions and the result, the page validation and
+QuizPlan.load, which builds the plan from values_list tuples; and the
+QuizView helpers the ScoringEngine replaced, still the reference of its
+tests. The REFERENCE_HELPERS are only benchmarked when asked for:
+load_plan_models, the plan loaded through Question and Option model
+instances with prefetch_related, as it used to be.
+
+compare() checks results against stored baseline results and returns the
+regressions beyond a threshold.
+'''
+import gc
+import random
+import time
+
+from django.db.models import Prefetch
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from .bulk import QuizImporter
+from .models import Question, Option
+from .plans import QuizPlan
+from .progress import QuizProgress
+from .views import QuizView
+
+
+OPTIONS_PER_QUESTION = 5
+SIZES = (10, 100, 1000, 10000, 100000)
+HELPERS = ('selection_mask', 'score', 'page_change_record', 'change_records',
+           'sugestion_texts', 'get_question_mapping', '_get_context_question_list',
+           '_compute_sugestions', '_find_best_option', '_calculate_max_score',
+           '_validate_min_options_selected', 'load_plan')
+REFERENCE_HELPERS = ('load_plan_models',)
+
+# a call is repeated until it took at least this long, to time fast helpers
+MIN_TIMING_SECONDS = 0.2
+# time differences below this are timer noise and are never regressions
+MIN_REGRESSION_SECONDS = 5e-6
+
+
+class BenchmarkCase(object):
+    '''The synthetic quiz of one size and everything the helpers are called with'''
+
+    def __init__(self, option_count, seed=0):
+        rand = random.Random(seed)
+        question_count = max(option_count // OPTIONS_PER_QUESTION, 1)
+
+        importer = QuizImporter(chunk_size=5000)
+        importer.run(('benchmark', '%d options' % option_count, 'question %d' % question_no,
+                      [('option %d' % option_no, rand.randint(-50, 50))
+                       for option_no in range(OPTIONS_PER_QUESTION)])
+                     for question_no in range(question_count))
+        quiz_id = importer.quiz_ids[0]
+
+        self.question_list = list(
+            Question.objects.filter(quiz=quiz_id).order_by('id').prefetch_related(
+                Prefetch('option_set', queryset=Option.objects.order_by('id'))))
+        self.plan = QuizPlan.from_questions(quiz_id, self.question_list)
+
+        self.progress = QuizProgress.for_plan(self.plan, QuizView.questions_per_page)
+        for question in self.plan.questions:
+            for option in question.options:
+                if option is question.options[0] or rand.random() < 0.3:
+                    self.progress.set_selected(option.index, True)
+
+        scoring = self.plan.scoring
+        self.mask = scoring.selection_mask(self.progress)
+        self.records = scoring.change_records(self.mask, QuizView.questions_per_page)
+
+        self.option_dicts = [{'id': option.key,
+                              'text': option.text,
+                              'is_sel': self.progress.is_selected(option.index),
+                              'score': option.score}
+                             for option in self.plan.options]
+
+
+def _load_plan_models(quiz_id):
+    question_list = Question.objects.filter(quiz=quiz_id).order_by('id').prefetch_related(
+        Prefetch('option_set', queryset=Option.objects.order_by('id')))
+    return QuizPlan.from_questions(quiz_id, question_list)
+
+
+def _helpers(view, case):
+    '''(name, call) of each helper in HELPERS and REFERENCE_HELPERS'''
+    questions_per_page = view.questions_per_page
+    scoring = case.plan.scoring
+    last_page_no = len(case.plan.questions) // questions_per_page
+    return [
+        ('selection_mask',
+         lambda: scoring.selection_mask(case.progress)),
+        ('score',
+         lambda: scoring.score(case.mask)),
+        ('page_change_record',
+         lambda: scoring.page_change_record(case.mask, questions_per_page, last_page_no // 2)),
+        ('change_records',
+         lambda: scoring.change_records(case.mask, questions_per_page)),
+        ('sugestion_texts',
+         lambda: scoring.sugestion_texts(case.records)),
+        ('get_question_mapping',
+         lambda: view.get_question_mapping(case.question_list)),
+        ('_get_context_question_list',
+         lambda: view._get_context_question_list(case.plan.questions, case.progress)),
+        ('_compute_sugestions',
+         lambda: view._compute_sugestions(case.plan.questions, case.progress,
+                                          questions_per_page)),
+        ('_find_best_option',
+         lambda: view._find_best_option(case.option_dicts, selected=False, positive=True)),
+        ('_calculate_max_score',
+         lambda: view._calculate_max_score(case.plan.options)),
+        ('_validate_min_options_selected',
+         lambda: view._validate_min_options_selected(case.plan.questions, case.progress)),
+        ('load_plan',
+         lambda: QuizPlan.load(case.plan.quiz_id)),
+        ('load_plan_models',
+         lambda: _load_plan_models(case.plan.quiz_id)),
+    ]
+
+
+def _time(func, repeat):
+    number = 1
+    while True:
+        start = time.time()
+        for _ in range(number):
+            func()
+        duration = time.time() - start
+        if duration >= MIN_TIMING_SECONDS:
+            break
+        number *= 10
+
+    best = duration / number
+    for _ in range(repeat - 1):
+        start = time.time()
+        for _ in range(number):
+            func()
+        best = min(best, (time.time() - start) / number)
+    return best
+
+
+def _proc_status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+
+def _reset_peak_rss():
+    '''Resets the peak RSS of the process, False when it cannot be reset'''
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def _peak_kb(func):
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return round(peak / 1024.0, 1)
+
+    if not _reset_peak_rss():
+        return None
+    rss = _proc_status_kb('VmRSS')
+    func()
+    return float(max(_proc_status_kb('VmHWM') - rss, 0))
+
+
+def run_benchmarks(sizes=SIZES, helpers=None, repeat=5, seed=0, progress=None):
+    view = QuizView()
+    results = dict((name, {}) for name in (helpers or HELPERS))
+    for size in sizes:
+        case = BenchmarkCase(size, seed)
+        for name, func in _helpers(view, case):
+            if name not in results:
+                continue
+            gc.collect()
+            # before the timing, whose calls would leave memory to reuse
+            peak_kb = _peak_kb(func)
+            results[name][str(size)] = {'seconds': _time(func, repeat), 'peak_kb': peak_kb}
+            if progress:
+                progress(name, size, results[name][str(size)])
+    return results
+
+
+def compare(results, baseline, threshold=0.25):
+    '''
+    Returns the regressions of results over baseline, as messages: a time
+    or a peak memory more than `threshold` (a fraction) above the baseline
+    (and a time at least MIN_REGRESSION_SECONDS above it). Helpers or sizes
+    missing from either side are not compared.
+    '''
+    regressions = []
+    for name in sorted(results):
+        for size in sorted(results[name], key=int):
+            expected = baseline.get(name, {}).get(size)
+            if expected is None:
+                continue
+            measured = results[name][size]
+            for metric in ('seconds', 'peak_kb'):
+                if not measured.get(metric) or not expected.get(metric):
+                    continue
+                ratio = measured[metric] / expected[metric]
+                if metric == 'seconds' and \
+                        measured[metric] - expected[metric] < MIN_REGRESSION_SECONDS:
+                    continue
+                if ratio > 1 + threshold:
+                    regressions.append('%s with %s options: %s %.6g, baseline %.6g (+%d%%)' % (
+                        name, size, metric, measured[metric], expected[metric],
+                        round((ratio - 1) * 100)))
+    return regressions
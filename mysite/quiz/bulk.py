@@ -0,0 +1,308 @@
+'''
+Streaming import and export of quizzes, used by the import_quizzes and
+export_quizzes management commands and by the clone action of the quiz
+admin.
+
+Both formats are read and written one question at a time:
+
+JSON Lines, one question per line:
+  {"quiz": "name", "description": "text", "question": "text",
+   "options": [{"text": "text", "score": 1}, ...],
+   "key": 1, "single_page": false, "sample_size": null, "lazy_pages": false}
+  consecutive lines with the same quiz name and key belong to the same
+  quiz. The key and the flags of the quiz are optional: the export writes
+  the id of the quiz as its key, so quizzes of the same name are kept
+  apart.
+
+CSV, one option per row with the columns quiz, description, question,
+option, score, key, single_page, sample_size, lazy_pages; a row with an
+empty quiz (or question) cell continues the quiz (or question) of the
+previous row, a question without options has empty option and score
+cells. The last four columns are only filled on the first row of a quiz,
+and may be left out.
+'''
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.utils import six
+
+from .models import Quiz, Question, Option
+from .plans import invalidate_quiz
+
+
+CSV_HEADER = ['quiz', 'description', 'question', 'option', 'score',
+              'key', 'single_page', 'sample_size', 'lazy_pages']
+
+# the fields of the quiz besides its name and description
+QUIZ_FIELDS = ['key', 'single_page', 'sample_size', 'lazy_pages']
+
+
+# records are (quiz_name, quiz_description, question_text, [(option_text, score), ...], quiz)
+# where quiz is a dict with some of the QUIZ_FIELDS; QuizImporter also takes
+# records without it
+
+
+def _record_quiz(record):
+    return record[4] if len(record) > 4 else {}
+
+
+def read_jsonl(fileobj):
+    for line in fileobj:
+        line = line.strip()
+        if not line:
+            continue
+        data = json.loads(line.decode('utf-8') if isinstance(line, bytes) else line)
+        yield (data['quiz'],
+               data.get('description', ''),
+               data['question'],
+               [(option['text'], int(option['score'])) for option in data.get('options', [])],
+               dict((name, data[name]) for name in QUIZ_FIELDS if name in data))
+
+
+def write_jsonl(fileobj, records):
+    for record in records:
+        quiz_name, description, question_text, options = record[:4]
+        data = {'quiz': quiz_name,
+                'description': description,
+                'question': question_text,
+                'options': [{'text': text, 'score': score} for text, score in options]}
+        data.update(_record_quiz(record))
+        fileobj.write(json.dumps(data) + '\n')
+
+
+def _csv_reader(fileobj):
+    if six.PY2:
+        for row in csv.reader(fileobj):
+            yield [cell.decode('utf-8') for cell in row]
+    else:
+        for row in csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8', newline='')):
+            yield row
+
+
+def _read_csv_quiz(cells):
+    '''The quiz dict of the key, single_page, sample_size and lazy_pages cells'''
+    quiz = {}
+    for name, cell in zip(QUIZ_FIELDS, cells):
+        if not cell:
+            continue
+        if name == 'key':
+            quiz[name] = cell
+        elif name == 'sample_size':
+            quiz[name] = int(cell)
+        else:
+            quiz[name] = bool(int(cell))
+    return quiz
+
+
+def _write_csv_quiz(quiz):
+    cells = []
+    for name in QUIZ_FIELDS:
+        value = quiz.get(name)
+        if value is None:
+            cells.append('')
+        elif isinstance(value, bool):
+            cells.append(int(value))
+        else:
+            cells.append(value)
+    return cells
+
+
+def read_csv(fileobj):
+    record = None
+    for row in _csv_reader(fileobj):
+        if not row or row == CSV_HEADER[:len(row)]:
+            continue
+        # the files without the quiz fields have the first five columns only
+        row = row + [''] * (len(CSV_HEADER) - len(row))
+        quiz_name, description, question_text, option_text, score = row[:5]
+        if quiz_name or question_text:
+            if record is not None:
+                yield record
+            if quiz_name:
+                quiz = _read_csv_quiz(row[5:])
+            else:
+                if record is None:
+                    raise ValueError('The first row must have a quiz name.')
+                quiz_name, description, quiz = record[0], record[1], record[4]
+            record = (quiz_name, description, question_text, [], quiz)
+        if option_text or score:
+            record[3].append((option_text, int(score)))
+    if record is not None:
+        yield record
+
+
+def write_csv(fileobj, records):
+    if six.PY2:
+        writer = csv.writer(fileobj)
+
+        def writerow(row):
+            writer.writerow([six.text_type(cell).encode('utf-8') for cell in row])
+    else:
+        writerow = csv.writer(fileobj).writerow
+
+    writerow(CSV_HEADER)
+    no_quiz_cells = [''] * len(QUIZ_FIELDS)
+    last_quiz = None
+    for record in records:
+        quiz_name, description, question_text, options = record[:4]
+        quiz = _record_quiz(record)
+        if (quiz_name, quiz.get('key')) != last_quiz:
+            quiz_cells, more_quiz_cells = [quiz_name, description], _write_csv_quiz(quiz)
+            last_quiz = (quiz_name, quiz.get('key'))
+        else:
+            quiz_cells, more_quiz_cells = ['', ''], no_quiz_cells
+        if not options:
+            writerow(quiz_cells + [question_text, '', ''] + more_quiz_cells)
+        for idx, (option_text, score) in enumerate(options):
+            writerow((quiz_cells + [question_text] if idx == 0 else ['', '', '']) +
+                     [option_text, score] + more_quiz_cells)
+            quiz_cells, more_quiz_cells = ['', ''], no_quiz_cells
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv}
+
+
+class QuizImporter(object):
+    '''
+    Creates a new quiz for each run of records with the same quiz name and
+    key, with the flags of their quiz dict, and writes its questions and options with chunked bulk_create, one
+    transaction per chunk. The denormalized statistics (see quiz.stats)
+    are computed while importing since bulk_create sends no signals, and
+    the cached plan of the quiz is dropped after each chunk.
+    '''
+
+    def __init__(self, chunk_size=1000, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.quizzes = 0
+        self.quiz_ids = []
+        self.questions = 0
+        self.options = 0
+
+        self._quiz = None
+        self._quiz_key = None
+        self._max_score = 0
+        self._last_question_id = 0
+        self._chunk = []
+
+    def run(self, records):
+        for record in records:
+            quiz_name, description, question_text, options = record[:4]
+            quiz = _record_quiz(record)
+            quiz_key = (quiz_name, quiz.get('key'))
+            if self._quiz is None or quiz_key != self._quiz_key:
+                self._finish_quiz()
+                self._quiz = Quiz.objects.create(name=quiz_name, description=description,
+                                                 **dict((name, quiz[name])
+                                                        for name in QUIZ_FIELDS[1:]
+                                                        if name in quiz))
+                self._quiz_key = quiz_key
+                self.quizzes += 1
+                self.quiz_ids.append(self._quiz.id)
+            self._chunk.append((question_text, options))
+            if len(self._chunk) >= self.chunk_size:
+                self._flush()
+        self._finish_quiz()
+
+    def _finish_quiz(self):
+        if self._quiz is None:
+            return
+        self._flush()
+        Quiz.objects.filter(id=self._quiz.id).update(max_score=self._max_score)
+        invalidate_quiz(self._quiz.id)
+        self._quiz = None
+        self._max_score = 0
+        self._last_question_id = 0
+
+    def _flush(self):
+        if not self._chunk:
+            return
+        with transaction.atomic():
+            questions = []
+            for question_text, options in self._chunk:
+                scores = [score for _, score in options]
+                questions.append(Question(quiz=self._quiz,
+                                          text=question_text,
+                                          option_count=len(scores)))
+                self._max_score += sum(score for score in scores if score > 0)
+            Question.objects.bulk_create(questions)
+
+            # bulk_create does not return the ids; the quiz is only written by this import
+            question_ids = list(Question.objects.filter(quiz=self._quiz,
+                                                        id__gt=self._last_question_id)
+                                                .order_by('id')
+                                                .values_list('id', flat=True))
+            options = [Option(question_id=question_id, text=option_text, scor=score)
+                       for question_id, (_, question_options) in zip(question_ids, self._chunk)
+                       for option_text, score in question_options]
+            Option.objects.bulk_create(options)
+
+        invalidate_quiz(self._quiz.id)
+        self._last_question_id = question_ids[-1]
+        self.questions += len(questions)
+        self.options += len(options)
+        self._chunk = []
+        if self.progress:
+            self.progress(self)
+
+
+def export_records(quiz_ids=None, chunk_size=1000):
+    '''
+    Yields the records of the quizzes, reading the questions by id ranges
+    of chunk_size with .iterator() so memory use does not grow with the
+    quiz size.
+    '''
+    quizzes = Quiz.objects.order_by('id')
+    if quiz_ids:
+        quizzes = quizzes.filter(id__in=quiz_ids)
+
+    for quiz_id, quiz_name, description, single_page, sample_size, lazy_pages in \
+            quizzes.values_list('id', 'name', 'description',
+                                'single_page', 'sample_size', 'lazy_pages').iterator():
+        quiz = {'key': quiz_id, 'single_page': single_page, 'sample_size': sample_size,
+                'lazy_pages': lazy_pages}
+        last_question_id = 0
+        while True:
+            questions = list(Question.objects.filter(quiz=quiz_id, id__gt=last_question_id)
+                                             .order_by('id')
+                                             .values_list('id', 'text')[:chunk_size])
+            if not questions:
+                break
+            first_question_id, last_question_id = questions[0][0], questions[-1][0]
+
+            options = {}
+            for question_id, option_text, score in \
+                    Option.objects.filter(question__quiz=quiz_id,
+                                          question__gte=first_question_id,
+                                          question__lte=last_question_id) \
+                                  .order_by('id') \
+                                  .values_list('question_id', 'text', 'scor').iterator():
+                options.setdefault(question_id, []).append((option_text, score))
+
+            for question_id, question_text in questions:
+                yield quiz_name, description, question_text, options.get(question_id, []), quiz
+
+
+def clone_quiz(quiz_id, name=None, chunk_size=1000):
+    '''
+    Copies a quiz with its questions and options through QuizImporter
+    (chunked bulk_create, no per-object saves), returns the new quiz id.
+    '''
+    quiz = Quiz.objects.get(id=quiz_id)
+    name = name or quiz.name + ' (copy)'
+    importer = QuizImporter(chunk_size=chunk_size)
+    importer.run((name, quiz.description, question_text, options)
+                 for _, _, question_text, options, _ in export_records([quiz_id], chunk_size))
+    if importer.quiz_ids:
+        clone_id = importer.quiz_ids[0]
+    else:
+        # no questions to import
+        clone_id = Quiz.objects.create(name=name, description=quiz.description).id
+    Quiz.objects.filter(id=clone_id).update(single_page=quiz.single_page,
+                                            sample_size=quiz.sample_size,
+                                            lazy_pages=quiz.lazy_pages)
+    invalidate_quiz(clone_id)
+    return clone_id
@@ -0,0 +1,29 @@
+'''
+System checks of the quiz app.
+
+The cached plans (quiz.plans) and the cached pages (quiz.pagecache) are
+invalidated through generations kept in the default Django cache: with
+several worker processes it must be a cache they share (memcached, redis,
+the database cache), else an edit is only seen by the process which
+served it. The consumed attempt nonces (quiz.progress) are kept there too.
+'''
+from django.conf import settings
+from django.core import checks
+
+
+PER_PROCESS_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache')
+
+
+@checks.register('caches')
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PER_PROCESS_BACKENDS:
+        return []
+    return [checks.Warning(
+        'The default cache (%s) is not shared between processes: with several '
+        'worker processes, quiz edits do not invalidate the plans and pages '
+        'cached by the other processes.' % backend,
+        hint='Use a shared cache backend (memcached, redis, database) as the '
+             'default cache, or silence quiz.W001 when running a single process.',
+        id='quiz.W001')]
@@ -0,0 +1,14 @@
+'''
+Chunked IN (...) lookups: the lists of ids are split so that every query
+stays under the SQLite limit of 999 variables.
+'''
+
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=None):
+    '''Yields lists of at most size (CHUNK_SIZE by default) of the items'''
+    items = list(items)
+    size = size or CHUNK_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,35 @@
+'''
+Generation numbers kept in the Django cache.
+
+A cache key which carries the generation of what it depends on (a quiz,
+the quiz index) stops being read once the generation is bumped, in all the
+processes sharing the cache: see quiz.plans.PlanCache and quiz.pagecache.
+'''
+import time
+
+from django.core.cache import cache
+
+
+def _initial_generation():
+    # a generation evicted from the cache starts again above the previous
+    # ones, so the keys built from them are not served again
+    return int(time.time() * 1000)
+
+
+def get_generation(key):
+    '''The current generation stored under the key, set on first use'''
+    generation = cache.get(key)
+    if generation is None:
+        initial = _initial_generation()
+        cache.add(key, initial, None)
+        generation = cache.get(key, initial)
+    return generation
+
+
+def bump_generation(key):
+    '''Moves the generation stored under the key to a new value'''
+    try:
+        cache.incr(key)
+    except ValueError:
+        # not cached yet, or evicted
+        cache.add(key, _initial_generation(), None)
@@ -0,0 +1,145 @@
+'''
+Per-quiz leaderboards: the QUIZ_LEADERBOARD_SIZE best attempts of each quiz.
+
+The best attempts are kept in LeaderboardEntry rows, at most K of them per
+quiz, so showing the leaderboard reads K rows whatever the number of
+attempts. They are updated when attempts are saved (see
+quiz.attempts.save_attempts and save_aggregates): the entries of the quiz are loaded into a
+min-heap, each attempt of the batch costs O(log K) and only the entries
+which entered or left the top are written. An attempt ranks above the
+later attempts with the same score.
+
+The rank of a score is read from the ScoreCount aggregates of
+quiz.analytics, one row per distinct score: it is approximate since the
+attempts with the same score share it and the attempts still queued by
+the write-behind writers are not counted yet.
+
+The leaderboards are recomputed from the attempts with the
+rebuild_quiz_analytics management command.
+'''
+from collections import defaultdict, namedtuple
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, When
+
+from .models import Attempt, LeaderboardEntry, ScoreCount
+
+
+LeaderboardRow = namedtuple('LeaderboardRow', ['score', 'finished_at'])
+
+
+def leaderboard_size():
+    return getattr(settings, 'QUIZ_LEADERBOARD_SIZE', 10)
+
+
+class TopAttempts(object):
+    '''
+    Bounded min-heap of the best attempts of a quiz: the root is the
+    attempt the next better one replaces.
+    '''
+
+    def __init__(self, size, attempts=()):
+        self.size = size
+        # a later attempt with the same score is worse: (score, -attempt_id)
+        self._heap = [(score, -attempt_id, finished_at)
+                      for score, attempt_id, finished_at in attempts]
+        heapq.heapify(self._heap)
+        self.evicted = []
+        while len(self._heap) > size:
+            self.evicted.append(-heapq.heappop(self._heap)[1])
+
+    def push(self, score, attempt_id, finished_at):
+        '''
+        Adds the attempt if it is among the best ones; returns the id of the
+        attempt which left the top (the new one when it does not enter it),
+        or None.
+        '''
+        item = (score, -attempt_id, finished_at)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, item)
+            return None
+        if item <= self._heap[0]:
+            return attempt_id
+        return -heapq.heapreplace(self._heap, item)[1]
+
+
+def _load_top(quiz_id, size):
+    return TopAttempts(size, LeaderboardEntry.objects.filter(quiz=quiz_id)
+                                                     .values_list('score', 'attempt_id',
+                                                                  'finished_at'))
+
+
+def update_leaderboards(attempts):
+    '''Adds a batch of saved Attempt to the leaderboards of their quizzes'''
+    size = leaderboard_size()
+    by_quiz = defaultdict(list)
+    for attempt in attempts:
+        by_quiz[attempt.quiz_id].append(attempt)
+
+    for quiz_id, quiz_attempts in by_quiz.items():
+        top = _load_top(quiz_id, size)
+        # entries over the size, left by concurrent updates or a smaller size
+        evicted = set(top.evicted)
+        new_ids = set()
+        for attempt in quiz_attempts:
+            evicted_id = top.push(attempt.score, attempt.id, attempt.finished_at)
+            if evicted_id != attempt.id:
+                new_ids.add(attempt.id)
+                if evicted_id is not None:
+                    evicted.add(evicted_id)
+
+        # attempts of the batch may enter the top and leave it again
+        dropped = new_ids & evicted
+        new_ids -= dropped
+        evicted -= dropped
+        if evicted:
+            LeaderboardEntry.objects.filter(attempt__in=evicted).delete()
+        if new_ids:
+            LeaderboardEntry.objects.bulk_create(
+                [LeaderboardEntry(quiz_id=quiz_id, attempt_id=attempt.id,
+                                  score=attempt.score, finished_at=attempt.finished_at)
+                 for attempt in quiz_attempts if attempt.id in new_ids])
+
+
+def rebuild_leaderboards(quiz_ids=None):
+    '''Recomputes the leaderboards of the given quizzes (all if None) from the attempts'''
+    size = leaderboard_size()
+    attempts = Attempt.objects.all()
+    entries = LeaderboardEntry.objects.all()
+    if quiz_ids is not None:
+        attempts = attempts.filter(quiz__in=quiz_ids)
+        entries = entries.filter(quiz__in=quiz_ids)
+
+    with transaction.atomic():
+        entries.delete()
+        for quiz_id in attempts.order_by().values_list('quiz', flat=True).distinct():
+            LeaderboardEntry.objects.bulk_create(
+                [LeaderboardEntry(quiz_id=quiz_id, attempt_id=attempt_id,
+                                  score=score, finished_at=finished_at)
+                 for attempt_id, score, finished_at in
+                 Attempt.objects.filter(quiz=quiz_id)
+                                .order_by('-score', 'id')
+                                .values_list('id', 'score', 'finished_at')[:size]])
+
+
+def top_scores(quiz_id):
+    '''LeaderboardRow of the best attempts of the quiz, best first'''
+    return [LeaderboardRow(score, finished_at)
+            for score, finished_at in
+            LeaderboardEntry.objects.filter(quiz=quiz_id)
+                                    .order_by('-score', 'attempt')
+                                    .values_list('score', 'finished_at')[:leaderboard_size()]]
+
+
+def approximate_rank(quiz_id, score):
+    '''
+    Returns (rank, attempts): one more than the number of recorded attempts
+    of the quiz with a better score, and the number of recorded attempts.
+    '''
+    counts = ScoreCount.objects.filter(quiz=quiz_id).aggregate(
+        better=Sum(Case(When(score__gt=score, then=F('count')),
+                        default=0, output_field=IntegerField())),
+        attempts=Sum('count'))
+    return (counts['better'] or 0) + 1, counts['attempts'] or 0
@@ -0,0 +1,239 @@
+'''
+Load-test harness for the quiz flow, used by the quiz_loadtest management
+command.
+
+Each simulated user is a django.test.Client driven by its own thread
+through the real URLconf: it starts the quiz, goes through the pages with
+Next (and now and then back with Previous) and finishes it. Each step is
+built from the page the server rendered: the user picks one of the options
+of each question shown and posts with one of the buttons of the form, so
+sampled quizzes are answered with their own questions. Every request is
+recorded as a step:
+  start     first GET of the quiz
+  next      POST of a page with Next
+  previous  POST of a page with Previous
+  finish    POST of the last page with Finish
+  page      GET following the redirect of a next/previous POST
+  result    GET of the result page
+Single-page quizzes are a start GET, a finish POST and the result GET.
+
+A validation error rendered on a page, or a finish which does not reach
+the result page, ends the attempt and is reported in 'errors'.
+
+The report is a JSON-serializable dict, meant to be diffed between
+releases: throughput, latency percentiles and DB queries per step, and the
+size of the session and of the progress cookies.
+'''
+from importlib import import_module
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+import numpy as np
+
+from .bulk import QuizImporter
+from .plans import get_plan
+
+
+STEPS = ('start', 'next', 'previous', 'page', 'finish', 'result')
+
+# the markup of the quiz templates the simulated users read
+QUESTION_RE = re.compile(r'<p> ')
+OPTION_RE = re.compile(r"type='checkbox' name='(option_\d+)'")
+BUTTON_RE = re.compile(r"type='submit' value='[^']*' name='(\w+)'")
+ERROR_RE = re.compile(r'ERROR: ([^<]*)<')
+RESULT_MARKER = '<h1> RESULT </h1>'
+
+
+def create_quiz(questions, options_per_question, name='load test'):
+    '''Creates a quiz with generated questions and options, returns its id'''
+    def records():
+        for question_no in range(questions):
+            yield (name, '%d questions' % questions, 'question %d' % question_no,
+                   [('option %d' % option_no, option_no - 1)
+                    for option_no in range(options_per_question)])
+
+    importer = QuizImporter()
+    importer.run(records())
+    return importer.quiz_ids[0]
+
+
+class Sample(object):
+    __slots__ = ('step', 'seconds', 'queries', 'session_bytes', 'cookie_bytes')
+
+    def __init__(self, step, seconds, queries, session_bytes, cookie_bytes):
+        self.step = step
+        self.seconds = seconds
+        self.queries = queries
+        self.session_bytes = session_bytes
+        self.cookie_bytes = cookie_bytes
+
+
+def default_host():
+    '''A host accepted by ALLOWED_HOSTS for the requests of the simulated users'''
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class LoadTest(object):
+    def __init__(self, quiz_id, users=10, iterations=1, previous_rate=0.1, seed=0, host=None):
+        self.quiz_id = quiz_id
+        self.users = users
+        self.iterations = iterations
+        self.previous_rate = previous_rate
+        self.seed = seed
+        self.host = host or default_host()
+
+        self.plan = get_plan(quiz_id).full()
+        self.url = reverse('quiz', kwargs={'quiz_id': quiz_id})
+        self.samples = []
+        self.errors = []
+        self._lock = threading.Lock()
+        self._session_engine = import_module(settings.SESSION_ENGINE)
+
+    def run(self):
+        '''Runs the users concurrently, returns the report'''
+        threads = [threading.Thread(target=self._run_thread, args=(user_no,),
+                                    name='quiz-loadtest-%d' % user_no)
+                   for user_no in range(self.users)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.time() - start)
+
+    def _run_thread(self, user_no):
+        try:
+            self.run_user(user_no)
+        except Exception as exception:
+            with self._lock:
+                self.errors.append('user %d: %r' % (user_no, exception))
+        finally:
+            connection.close()
+
+    def run_user(self, user_no):
+        '''Takes the quiz `iterations` times as one user, from the calling thread'''
+        rand = random.Random(self.seed * 100003 + user_no)
+        for iteration in range(self.iterations):
+            error = self._take_quiz(Client(HTTP_HOST=self.host), rand)
+            if error:
+                with self._lock:
+                    self.errors.append('user %d, iteration %d: %s' % (user_no, iteration, error))
+
+    def _take_quiz(self, client, rand):
+        '''
+        Goes through the quiz as the pages are served (a sampled quiz serves
+        its own questions to each attempt), answering the questions of each
+        rendered page; returns an error message, or None once the result page
+        is reached.
+        '''
+        response = self._request(client, 'start', 'get')
+        while True:
+            content = response.content.decode('utf-8')
+            error = ERROR_RE.search(content)
+            if error:
+                return 'validation error: %s' % error.group(1).strip()
+
+            buttons = set(BUTTON_RE.findall(content))
+            if 'Previous' in buttons and rand.random() < self.previous_rate:
+                step, next_step = 'previous', 'page'
+            elif 'Next' in buttons:
+                step, next_step = 'next', 'page'
+            elif 'Finish' in buttons:
+                step, next_step = 'finish', 'result'
+            else:
+                return 'no form to post'
+
+            response = self._request(client, step, 'post',
+                                     self._answers(rand, content, step.capitalize()))
+            if response.status_code in (301, 302):
+                response = self._request(client, next_step, 'get')
+            if step == 'finish':
+                content = response.content.decode('utf-8')
+                if RESULT_MARKER in content:
+                    return None
+                if not ERROR_RE.search(content):
+                    return 'finish did not reach the result page'
+
+    def _answers(self, rand, content, button):
+        '''Selects one of the rendered options of each rendered question'''
+        data = {button: button}
+        for question in QUESTION_RE.split(content)[1:]:
+            option_keys = OPTION_RE.findall(question)
+            if option_keys:
+                data[rand.choice(option_keys)] = 'on'
+        return data
+
+    def _request(self, client, step, method, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            if method == 'get':
+                response = client.get(self.url)
+            else:
+                response = client.post(self.url, data)
+            seconds = time.time() - start
+
+        sample = Sample(step, seconds, len(queries),
+                        self._session_bytes(client), self._cookie_bytes(client))
+        with self._lock:
+            self.samples.append(sample)
+        if response.status_code >= 400:
+            raise AssertionError('%s returned %d' % (step, response.status_code))
+        return response
+
+    def _session_bytes(self, client):
+        '''Size of the encoded session data'''
+        cookie = client.cookies.get(settings.SESSION_COOKIE_NAME)
+        if cookie is None or not cookie.value:
+            return 0
+        store = self._session_engine.SessionStore(cookie.value)
+        return len(store.encode(store.load()))
+
+    def _cookie_bytes(self, client):
+        '''Size of the progress cookies (see quiz.progress.SignedCookieProgressStore)'''
+        return sum(len(morsel.value) for name, morsel in client.cookies.items()
+                   if name.startswith('quiz_progress_'))
+
+    def report(self, elapsed):
+        def distribution(values):
+            values = np.array(values, dtype=np.float64)
+            return {'mean': round(float(values.mean()), 3), 'max': round(float(values.max()), 3)}
+
+        steps = {}
+        for step in STEPS:
+            samples = [sample for sample in self.samples if sample.step == step]
+            if not samples:
+                continue
+            milliseconds = np.array([sample.seconds * 1000 for sample in samples])
+            p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+            steps[step] = {'count': len(samples),
+                           'p50_ms': round(float(p50), 3),
+                           'p95_ms': round(float(p95), 3),
+                           'p99_ms': round(float(p99), 3),
+                           'queries': distribution([sample.queries for sample in samples])}
+
+        return {'quiz': {'id': self.quiz_id,
+                         'questions': len(self.plan.questions),
+                         'options': len(self.plan.options),
+                         'single_page': self.plan.single_page},
+                'users': self.users,
+                'iterations': self.iterations,
+                'requests': len(self.samples),
+                'errors': self.errors,
+                'elapsed_seconds': round(elapsed, 3),
+                'throughput_rps': round(len(self.samples) / elapsed, 3) if elapsed else 0,
+                'steps': steps,
+                'session_bytes': distribution([sample.session_bytes for sample in self.samples]
+                                              or [0]),
+                'cookie_bytes': distribution([sample.cookie_bytes for sample in self.samples]
+                                             or [0])}
@@ -0,0 +1,48 @@
+'''
+Bounded LRU used by the process-wide caches of the app: the compiled plans
+(quiz.plans.PlanCache), the plans of snapshots (quiz.snapshots) and the
+pages of a LazyQuizPlan.
+'''
+from collections import OrderedDict
+import threading
+
+
+class LRU(object):
+    '''Thread-safe mapping which keeps the max_size most recently used items'''
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''Returns the item of the key, now the most recently used one, or None'''
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def discard_keys(self, predicate):
+        '''Removes the items whose key matches the predicate'''
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def keys(self):
+        with self._lock:
+            return list(self._items)
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import six
+
+from ...bulk import export_records, WRITERS
+
+
+class Command(BaseCommand):
+    help = 'Exports quizzes (all of them by default) to a JSON Lines or CSV file (see quiz.bulk).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="output file, '-' for stdout")
+        parser.add_argument('quiz_ids', nargs='*', type=int)
+        parser.add_argument('--format', choices=sorted(WRITERS),
+                            help='file format, guessed from the extension by default')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='questions read per query')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.')
+        if file_format not in WRITERS:
+            raise CommandError('Unknown format %r, use --format.' % file_format)
+
+        counts = {'questions': 0, 'options': 0}
+
+        def counted(records):
+            for record in records:
+                counts['questions'] += 1
+                counts['options'] += len(record[3])
+                yield record
+
+        start = time.time()
+        if path == '-':
+            fileobj = sys.stdout
+        elif six.PY2:
+            fileobj = open(path, 'wb')
+        else:
+            fileobj = open(path, 'w', encoding='utf-8', newline='')
+        try:
+            WRITERS[file_format](fileobj, counted(export_records(options['quiz_ids'],
+                                                                 options['chunk_size'])))
+        finally:
+            if fileobj is not sys.stdout:
+                fileobj.close()
+        duration = time.time() - start
+
+        rows = counts['questions'] + counts['options']
+        self.stderr.write('Exported %d questions, %d options in %.1fs (%d rows/s)' % (
+            counts['questions'], counts['options'], duration,
+            rows / duration if duration else rows))
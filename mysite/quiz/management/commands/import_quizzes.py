@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...bulk import QuizImporter, READERS
+
+
+class Command(BaseCommand):
+    help = ('Imports quizzes from a JSON Lines or CSV file (see quiz.bulk for the formats). '
+            'Each quiz of the file is created as a new quiz.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="file to import, '-' for stdin")
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='file format, guessed from the extension by default')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='questions written per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.')
+        if file_format not in READERS:
+            raise CommandError('Unknown format %r, use --format.' % file_format)
+
+        start = time.time()
+        verbosity = options['verbosity']
+
+        def report(importer):
+            if verbosity > 1:
+                self.stderr.write(self._summary(importer, time.time() - start))
+
+        importer = QuizImporter(options['chunk_size'], progress=report)
+        fileobj = sys.stdin if path == '-' else open(path, 'rb')
+        try:
+            importer.run(READERS[file_format](fileobj))
+        except ValueError as exception:
+            raise CommandError(str(exception))
+        finally:
+            if fileobj is not sys.stdin:
+                fileobj.close()
+
+        self.stdout.write('Imported ' + self._summary(importer, time.time() - start))
+
+    def _summary(self, importer, duration):
+        rows = importer.questions + importer.options
+        return '%d quizzes, %d questions, %d options in %.1fs (%d rows/s)' % (
+            importer.quizzes, importer.questions, importer.options,
+            duration, rows / duration if duration else rows)
@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ...benchmarks import HELPERS, REFERENCE_HELPERS, SIZES, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Times the quiz request path over synthetic quizzes of 10 to 100k options '
+            '(see quiz.benchmarks), in a test database created for the run; use it with '
+            '--settings=quiz.tests.test_settings to run it in memory. Fails when a helper '
+            'is slower, or uses more memory, than the --baseline results by more than '
+            '--threshold.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES),
+                            help='comma separated option counts of the synthetic quizzes')
+        parser.add_argument('--helpers', default=','.join(HELPERS),
+                            help='comma separated helpers to time, the reference helpers '
+                                 '(%s) are only timed when listed' % ', '.join(REFERENCE_HELPERS))
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='timings of each helper, the best one is kept')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline',
+                            help='JSON results of an earlier run to compare with')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='write the results to --baseline instead of comparing')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='allowed regression over the baseline, as a fraction')
+        parser.add_argument('--output', help='file the results are written to')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma separated integers.')
+        helpers = options['helpers'].split(',')
+        unknown = set(helpers) - set(HELPERS) - set(REFERENCE_HELPERS)
+        if unknown:
+            raise CommandError('Unknown helpers: %s.' % ', '.join(sorted(unknown)))
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs --baseline.')
+
+        baseline = None
+        if options['baseline'] and not options['save_baseline']:
+            with open(options['baseline']) as fileobj:
+                baseline = json.load(fileobj)
+
+        verbosity = options['verbosity']
+
+        def report(name, size, result):
+            if verbosity > 1:
+                self.stderr.write('%s with %d options: %.6fs, %s KiB' % (
+                    name, size, result['seconds'], result['peak_kb']))
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                                      serialize=False)
+        try:
+            results = run_benchmarks(sizes, helpers, options['repeat'], options['seed'],
+                                     progress=report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(results, indent=2, sort_keys=True, separators=(',', ': '))
+        path = options['baseline'] if options['save_baseline'] else options['output']
+        if path:
+            with open(path, 'w') as fileobj:
+                fileobj.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions over the baseline:\n  ' +
+                                   '\n  '.join(regressions))
+            self.stderr.write('No regression over the baseline.')
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...loadtest import LoadTest, create_quiz
+from ...models import Quiz
+
+
+class Command(BaseCommand):
+    help = ('Drives concurrent simulated users through the quiz pages and writes a JSON '
+            'report of the throughput, latencies, DB queries and session sizes per step '
+            '(see quiz.loadtest). Run it against a database shared by the threads, not an '
+            'in-memory SQLite one.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int,
+                            help='id of the quiz to take, a quiz is generated by default')
+        parser.add_argument('--questions', type=int, default=20,
+                            help='questions of the generated quiz')
+        parser.add_argument('--options', type=int, default=4,
+                            help='options per question of the generated quiz')
+        parser.add_argument('--single-page', action='store_true',
+                            help='generate a quiz shown in one form')
+        parser.add_argument('--users', type=int, default=10,
+                            help='concurrent users')
+        parser.add_argument('--iterations', type=int, default=1,
+                            help='times each user takes the quiz')
+        parser.add_argument('--previous-rate', type=float, default=0.1,
+                            help='probability of going back a page instead of forward')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--host',
+                            help='Host header of the requests, from ALLOWED_HOSTS by default')
+        parser.add_argument('--output', help='file the report is written to, stdout by default')
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the generated quiz')
+
+    def handle(self, *args, **options):
+        quiz_id = options['quiz']
+        generated = quiz_id is None
+        if generated:
+            quiz_id = create_quiz(options['questions'], options['options'])
+            if options['single_page']:
+                Quiz.objects.filter(id=quiz_id).update(single_page=True)
+        elif not Quiz.objects.filter(id=quiz_id).exists():
+            raise CommandError('Quiz %d does not exist.' % quiz_id)
+
+        try:
+            report = LoadTest(quiz_id,
+                              users=options['users'],
+                              iterations=options['iterations'],
+                              previous_rate=options['previous_rate'],
+                              seed=options['seed'],
+                              host=options['host']).run()
+        finally:
+            if generated and not options['keep']:
+                Quiz.objects.filter(id=quiz_id).delete()
+
+        output = json.dumps(report, indent=2, sort_keys=True, separators=(',', ': '))
+        if options['output']:
+            with open(options['output'], 'w') as fileobj:
+                fileobj.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if report['errors']:
+            raise CommandError('%d users failed.' % len(report['errors']))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...analytics import rebuild_analytics
+from ...leaderboard import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the analytics aggregates and the leaderboards of the quizzes (all of them by default) from the attempts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        rebuild_analytics(options['quiz_ids'] or None)
+        rebuild_leaderboards(options['quiz_ids'] or None)
+        self.stdout.write('Rebuilt analytics.')
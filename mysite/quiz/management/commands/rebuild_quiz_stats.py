@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ...stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized statistics of the quizzes (all of them by default).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        count = rebuild_stats(options['quiz_ids'] or None)
+        self.stdout.write('Rebuilt statistics of %d quizzes.' % count)
@@ -0,0 +1,344 @@
+'''
+Per-request performance metrics, exposed in the Prometheus text format.
+
+QuizMetricsMiddleware records, for each request, labelled with the view
+and the quiz step (see QuizView, which sets request.quiz_step to init,
+page_post, page_get or finish):
+  quiz_request_seconds            time spent in the middlewares and the view
+  quiz_db_queries                 number of DB queries
+  quiz_db_seconds                 time spent executing them
+  quiz_session_load_seconds       time spent loading the session
+  quiz_session_save_seconds       time spent saving the session
+  quiz_session_bytes              size of the saved session data
+  quiz_template_render_seconds    time spent rendering templates
+into in-process histograms (one set per worker process, each process is
+scraped separately). metrics_view serves them with the statistics of the
+writers of the attempts and of the aggregates (see quiz.attempts).
+
+The metrics are only served with the QUIZ_METRICS_ENABLED setting, to the
+staff users, the addresses of QUIZ_METRICS_ALLOWED_IPS and the requests
+with the 'Authorization: Bearer <QUIZ_METRICS_TOKEN>' header (for the
+Prometheus scrapers); the other requests are answered with a 403.
+
+The middleware must come first in MIDDLEWARE_CLASSES so the session is
+saved before its process_response. The DB queries are timed by wrapping
+the cursors of the connections of the request thread and the templates by
+wrapping the render of the Django template backend, so the overhead is a
+few clock reads per query and per template.
+'''
+from bisect import bisect_left
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.template.backends import django as django_backend
+from django.utils.crypto import constant_time_compare
+
+from .attempts import aggregate_writer_stats, attempt_writer_stats
+
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+LABEL_NAMES = ('view', 'step')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=''):
+    labels = ','.join('%s="%s"' % (name, _escape(value)) for name, value in zip(names, values))
+    if extra:
+        labels = labels + ',' + extra if labels else extra
+    return '{%s}' % labels if labels else ''
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Histogram(object):
+    def __init__(self, name, documentation, buckets, label_names=LABEL_NAMES):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        # buckets are upper bounds, the last slot is +Inf
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            values[0][idx] += 1
+            values[1] += value
+            values[2] += 1
+
+    def samples(self, labels):
+        '''Returns (cumulative bucket counts, sum, count) of the labels'''
+        with self._lock:
+            counts, total, count = self._values.get(labels, [[0] * (len(self.buckets) + 1), 0, 0])
+            counts = list(counts)
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s histogram' % self.name]
+        with self._lock:
+            label_sets = sorted(self._values)
+        for labels in label_sets:
+            cumulative, total, count = self.samples(labels)
+            bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+            for bound, bucket_count in zip(bounds, cumulative):
+                lines.append('%s_bucket%s %d' % (
+                    self.name, _format_labels(self.label_names, labels, 'le="%s"' % bound),
+                    bucket_count))
+            lines.append('%s_sum%s %s' % (self.name, _format_labels(self.label_names, labels),
+                                          _format_value(total)))
+            lines.append('%s_count%s %d' % (self.name, _format_labels(self.label_names, labels),
+                                            count))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+REQUEST_SECONDS = Histogram('quiz_request_seconds',
+                            'Time spent in the middlewares and the view.', TIME_BUCKETS)
+DB_QUERIES = Histogram('quiz_db_queries', 'DB queries per request.', COUNT_BUCKETS)
+DB_SECONDS = Histogram('quiz_db_seconds', 'Time spent executing DB queries.', TIME_BUCKETS)
+SESSION_LOAD_SECONDS = Histogram('quiz_session_load_seconds',
+                                 'Time spent loading the session.', TIME_BUCKETS)
+SESSION_SAVE_SECONDS = Histogram('quiz_session_save_seconds',
+                                 'Time spent saving the session.', TIME_BUCKETS)
+SESSION_BYTES = Histogram('quiz_session_bytes', 'Size of the saved session data.', BYTES_BUCKETS)
+TEMPLATE_SECONDS = Histogram('quiz_template_render_seconds',
+                             'Time spent rendering templates.', TIME_BUCKETS)
+
+HISTOGRAMS = (REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, SESSION_LOAD_SECONDS,
+              SESSION_SAVE_SECONDS, SESSION_BYTES, TEMPLATE_SECONDS)
+
+# statistics of quiz.writebehind.WriteBehindBuffer: (key, metric name, type); the
+# names are prefixed with quiz_attempt_ or quiz_aggregate_, see WRITERS
+WRITER_METRICS = (
+    ('queue_depth', 'queue_depth', 'gauge'),
+    ('enqueued', 'enqueued_total', 'counter'),
+    ('written', 'written_total', 'counter'),
+    ('failed', 'failed_total', 'counter'),
+    ('retried', 'retried_total', 'counter'),
+    ('sync_writes', 'sync_writes_total', 'counter'),
+    ('batches', 'batches_total', 'counter'),
+    ('last_flush_seconds', 'last_flush_seconds', 'gauge'),
+    ('max_flush_seconds', 'max_flush_seconds', 'gauge'),
+    ('total_flush_seconds', 'flush_seconds_total', 'counter'),
+)
+
+# the stats functions are looked up when the metrics are rendered
+WRITERS = (('quiz_attempt_', lambda: attempt_writer_stats()),
+           ('quiz_aggregate_', lambda: aggregate_writer_stats()))
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for prefix, writer_stats in WRITERS:
+        stats = writer_stats()
+        if stats is None:
+            continue
+        for key, name, metric_type in WRITER_METRICS:
+            lines.append('# TYPE %s%s %s' % (prefix, name, metric_type))
+            lines.append('%s%s %s' % (prefix, name, _format_value(stats[key])))
+    return '\n'.join(lines) + '\n'
+
+
+def _can_read_metrics(request):
+    token = getattr(settings, 'QUIZ_METRICS_TOKEN', None)
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''),
+                                       'Bearer ' + token):
+        return True
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'QUIZ_METRICS_ALLOWED_IPS', ()):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_active and user.is_staff
+
+
+def metrics_view(request):
+    if not getattr(settings, 'QUIZ_METRICS_ENABLED', False):
+        raise Http404('The metrics are not enabled.')
+    if not _can_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
+
+
+class RequestStats(object):
+    '''Measures of the request being served by the thread'''
+    __slots__ = ('queries', 'db_seconds', 'session_load_seconds', 'session_save_seconds',
+                 'session_bytes', 'template_seconds', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.session_load_seconds = None
+        self.session_save_seconds = None
+        self.session_bytes = None
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+
+_local = threading.local()
+
+
+def _current_stats():
+    return getattr(_local, 'stats', None)
+
+
+class TimedCursor(object):
+    '''Wraps a cursor of django.db to count and time its queries'''
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.cursor.__exit__(exc_type, exc_value, traceback)
+
+    def _timed(self, method, sql, params):
+        stats = _current_stats()
+        if stats is None:
+            return method(sql, params)
+        start = time.time()
+        try:
+            return method(sql, params)
+        finally:
+            stats.queries += 1
+            stats.db_seconds += time.time() - start
+
+    def execute(self, sql, params=None):
+        return self._timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(self.cursor.executemany, sql, param_list)
+
+
+def _instrument_connection(connection):
+    if getattr(connection, '_quiz_metrics', False):
+        return
+    make_cursor = connection.make_cursor
+    make_debug_cursor = connection.make_debug_cursor
+    connection.make_cursor = lambda cursor: TimedCursor(make_cursor(cursor))
+    connection.make_debug_cursor = lambda cursor: TimedCursor(make_debug_cursor(cursor))
+    connection._quiz_metrics = True
+
+
+_templates_lock = threading.Lock()
+
+
+def _instrument_templates():
+    with _templates_lock:
+        template_class = django_backend.Template
+        if getattr(template_class, '_quiz_metrics', False):
+            return
+        render = template_class.render
+
+        def timed_render(self, context=None, request=None):
+            stats = _current_stats()
+            if stats is None or stats.template_depth:
+                # only the outermost render is timed
+                return render(self, context, request)
+            stats.template_depth += 1
+            start = time.time()
+            try:
+                return render(self, context, request)
+            finally:
+                stats.template_depth -= 1
+                stats.template_seconds += time.time() - start
+
+        template_class.render = timed_render
+        template_class._quiz_metrics = True
+
+
+def _instrument_session(session, stats):
+    load = session.load
+    save = session.save
+
+    def timed_load():
+        start = time.time()
+        try:
+            return load()
+        finally:
+            stats.session_load_seconds = time.time() - start
+
+    def timed_save(*args, **kwargs):
+        start = time.time()
+        try:
+            return save(*args, **kwargs)
+        finally:
+            stats.session_save_seconds = time.time() - start
+            stats.session_bytes = len(session.encode(session._get_session(no_load=True)))
+
+    session.load = timed_load
+    session.save = timed_save
+
+
+class QuizMetricsMiddleware(object):
+    def __init__(self):
+        _instrument_templates()
+
+    def process_request(self, request):
+        for connection in connections.all():
+            _instrument_connection(connection)
+        request._quiz_metrics_start = time.time()
+        request._quiz_metrics_view = ''
+        _local.stats = RequestStats()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._quiz_metrics_view = getattr(view_func, '__name__', type(view_func).__name__)
+        stats = _current_stats()
+        session = getattr(request, 'session', None)
+        if stats is not None and session is not None:
+            _instrument_session(session, stats)
+
+    def process_response(self, request, response):
+        stats = _current_stats()
+        start = getattr(request, '_quiz_metrics_start', None)
+        _local.stats = None
+        if stats is None or start is None:
+            return response
+
+        labels = (request._quiz_metrics_view, getattr(request, 'quiz_step', ''))
+        REQUEST_SECONDS.observe(labels, time.time() - start)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_SECONDS.observe(labels, stats.db_seconds)
+        TEMPLATE_SECONDS.observe(labels, stats.template_seconds)
+        if stats.session_load_seconds is not None:
+            SESSION_LOAD_SECONDS.observe(labels, stats.session_load_seconds)
+        if stats.session_save_seconds is not None:
+            SESSION_SAVE_SECONDS.observe(labels, stats.session_save_seconds)
+            SESSION_BYTES.observe(labels, stats.session_bytes)
+        return response
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def compute_stats(apps, schema_editor):
+    Quiz = apps.get_model('quiz', 'Quiz')
+    Question = apps.get_model('quiz', 'Question')
+    Option = apps.get_model('quiz', 'Option')
+
+    for stats in Option.objects.values('question').annotate(max_option_score=Max('scor'),
+                                                            min_option_score=Min('scor'),
+                                                            option_count=Count('id')):
+        Question.objects.filter(id=stats.pop('question')).update(**stats)
+
+    for quiz_id, max_score in Option.objects.filter(scor__gt=0) \
+                                            .values_list('question__quiz') \
+                                            .annotate(Sum('scor')):
+        Quiz.objects.filter(id=quiz_id).update(max_score=max_score)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='max_option_score',
+            field=models.IntegerField(null=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='min_option_score',
+            field=models.IntegerField(null=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='option_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='max_score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_quiz_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attempt',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('score', models.IntegerField()),
+                ('max_score', models.IntegerField()),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AttemptAnswer',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('attempt', models.ForeignKey(to='quiz.Attempt')),
+                ('option', models.ForeignKey(to='quiz.Option')),
+            ],
+        ),
+    ]
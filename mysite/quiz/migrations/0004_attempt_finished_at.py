@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attempt',
+            name='finished_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_attempt_finished_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OptionPickCount',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('count', models.IntegerField(default=0)),
+                ('option', models.OneToOneField(to='quiz.Option')),
+                ('question', models.ForeignKey(to='quiz.Question')),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScoreCount',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('score', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='scorecount',
+            unique_together=set([('quiz', 'score')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_quiz_single_page'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='sample_size',
+            field=models.PositiveIntegerField(help_text='Number of questions drawn at random for each attempt; all of them when empty.', null=True, blank=True),
+        ),
+    ]
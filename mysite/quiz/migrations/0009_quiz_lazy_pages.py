@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_quiz_sample_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='lazy_pages',
+            field=models.BooleanField(default=False, help_text='Load the questions of each page when it is shown, for very large quizzes.'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_quiz_lazy_pages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSnapshot',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('version', models.CharField(max_length=12)),
+                ('data', models.BinaryField()),
+                ('max_score', models.IntegerField()),
+                ('question_count', models.IntegerField()),
+                ('option_count', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('quiz', models.ForeignKey(related_name='snapshots', to='quiz.Quiz')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='published_snapshot',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.SET_NULL, blank=True, editable=False, to='quiz.QuizSnapshot', null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quizsnapshot',
+            unique_together=set([('quiz', 'version')]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_quiz_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('score', models.IntegerField()),
+                ('finished_at', models.DateTimeField()),
+                ('attempt', models.OneToOneField(to='quiz.Attempt')),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='leaderboardentry',
+            index_together=set([('quiz', 'score')]),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_leaderboard'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='question',
+            name='max_option_score',
+        ),
+        migrations.RemoveField(
+            model_name='question',
+            name='min_option_score',
+        ),
+    ]
@@ -1,9 +1,26 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Quiz(models.Model):
     name = models.CharField(max_length=200)
     description = models.CharField(max_length=300)
+    single_page = models.BooleanField(default=False,
+                                      help_text='Show all the pages in one form, submitted once.')
+    sample_size = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text='Number of questions drawn at random for each attempt; all of them when empty.')
+    lazy_pages = models.BooleanField(
+        default=False,
+        help_text='Load the questions of each page when it is shown, for very large quizzes.')
+    # the snapshot served instead of the questions and options, see quiz.snapshots
+    published_snapshot = models.ForeignKey('QuizSnapshot', null=True, blank=True, editable=False,
+                                           on_delete=models.SET_NULL, related_name='+')
+
+    # denormalized statistics, maintained by quiz.stats
+    max_score = models.IntegerField(default=0, editable=False)
+    # last change of the quiz, its questions or options; see quiz.stats
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return self.name + " - " + self.description
@@ -13,6 +30,9 @@ class Question(models.Model):
     quiz = models.ForeignKey(Quiz)
     text = models.CharField(max_length=400)
 
+    # denormalized statistics, maintained by quiz.stats
+    option_count = models.IntegerField(default=0, editable=False)
+
     def __str__(self):
         return self.text
 
@@ -27,3 +47,66 @@ class Option(models.Model):
 
     def __str__(self):
         return self.text
+
+
+class QuizSnapshot(models.Model):
+    '''Immutable published version of a quiz, see quiz.snapshots'''
+    quiz = models.ForeignKey(Quiz, related_name='snapshots')
+    # QuizPlan.content_version of the snapshot
+    version = models.CharField(max_length=12)
+    # zlib compressed JSON of the questions, see QuizPlan.to_snapshot_data
+    data = models.BinaryField()
+    max_score = models.IntegerField()
+    question_count = models.IntegerField()
+    option_count = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('quiz', 'version')
+
+    def __str__(self):
+        return self.quiz.name + " - " + self.version
+
+
+class Attempt(models.Model):
+    quiz = models.ForeignKey(Quiz)
+    score = models.IntegerField()
+    max_score = models.IntegerField()
+    finished_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return str(self.score) + " / " + str(self.max_score)
+
+
+class AttemptAnswer(models.Model):
+    attempt = models.ForeignKey(Attempt)
+    option = models.ForeignKey(Option)
+
+
+class OptionPickCount(models.Model):
+    '''Number of finished attempts which selected the option, see quiz.analytics'''
+    quiz = models.ForeignKey(Quiz)
+    question = models.ForeignKey(Question)
+    option = models.OneToOneField(Option)
+    count = models.IntegerField(default=0)
+
+
+class ScoreCount(models.Model):
+    '''Number of finished attempts of the quiz with the score, see quiz.analytics'''
+    quiz = models.ForeignKey(Quiz)
+    score = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('quiz', 'score')
+
+
+class LeaderboardEntry(models.Model):
+    '''One of the best attempts of the quiz, see quiz.leaderboard'''
+    quiz = models.ForeignKey(Quiz)
+    attempt = models.OneToOneField(Attempt)
+    score = models.IntegerField()
+    finished_at = models.DateTimeField()
+
+    class Meta:
+        index_together = ('quiz', 'score')
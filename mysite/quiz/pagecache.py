@@ -0,0 +1,31 @@
+'''
+Caching of rendered pages in the Django cache.
+
+Cache keys carry a generation number (see quiz.generations); bumping
+the generation (from the model signals, see quiz.signals, and again after
+the commit of the edit, see quiz.transactions) invalidates every page
+rendered before, in all the processes sharing the cache.
+'''
+from .generations import bump_generation, get_generation
+
+
+INDEX_GENERATION_KEY = 'quiz:index:generation'
+
+
+def index_page_key(after):
+    return 'quiz:index:page:%d:%d' % (get_generation(INDEX_GENERATION_KEY), after)
+
+
+def index_cursor_key(after):
+    '''Set when the index page after the quiz <after> is linked from a cached page'''
+    return 'quiz:index:cursor:%d:%d' % (get_generation(INDEX_GENERATION_KEY), after)
+
+
+def invalidate_index():
+    bump_generation(INDEX_GENERATION_KEY)
+
+
+def page_fragment_key(plan, page_no, questions_per_page):
+    # the content version changes with the quiz content, stale fragments just expire
+    return 'quiz:page:%d:%s:%d:%d' % (plan.quiz_id, plan.content_version, questions_per_page,
+                                      page_no)
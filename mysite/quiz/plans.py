@@ -0,0 +1,504 @@
+'''
+Compiled quiz plans.
+
+A plan is the immutable, fully loaded definition of a quiz (questions,
+options and scores in a stable order). Plans are kept in a process-wide
+LRU cache so that starting a session for a hot quiz does not hit the DB.
+The cache is invalidated by the model signals in quiz.signals, in all the
+processes: the plans are keyed by a generation of the quiz kept in the
+Django cache.
+
+Plans are loaded from values_list tuples, one query for the questions and
+one for their options, without instantiating the Question and Option models.
+
+The plan of a quiz with a sample_size (each attempt gets that many random
+questions of a large pool) is only the index of its question ids: an
+attempt draws its ids from the index with sample() and loads the plan of
+these questions alone with sample_plan(), so starting or continuing an
+attempt costs in proportion to the sample, not to the pool.
+
+The plan of a quiz with lazy_pages is a LazyQuizPlan: the ordered question
+ids and option counts only, the questions of a page are loaded when it is
+shown.
+
+The plan of a published quiz is read from its QuizSnapshot, one row, and
+not from the questions and options (see quiz.snapshots).
+'''
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+import hashlib
+import json
+import random
+import zlib
+
+from django.conf import settings
+from django.http import Http404
+
+from .chunks import chunks
+from .lru import LRU
+from .models import Quiz, Question, Option, QuizSnapshot
+from .generations import bump_generation, get_generation
+from .stats import touch_quiz
+from .scoring import LazyScoringEngine, ScoringEngine
+
+
+class PlanOption(namedtuple('PlanOption', ['index', 'id', 'text', 'score'])):
+    '''One option of a plan; `index` is its position in QuizPlan.options'''
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return 'option_' + str(self.id)
+
+
+PlanQuestion = namedtuple('PlanQuestion', ['id', 'text', 'options'])
+
+
+class StalePlan(Exception):
+    '''
+    Raised by a LazyQuizPlan when the questions it loads no longer match
+    its question ids and option counts; the plan is invalidated.
+    '''
+
+
+QUESTION_FIELDS = ('id', 'text')
+OPTION_FIELDS = ('question', 'id', 'text', 'scor')
+
+
+def group_question_rows(question_rows, option_rows):
+    '''
+    Groups (question_id, 'question_text') and (question_id, option_id,
+    'option_text', score) tuples into the questions format of QuizPlan;
+    the questions keep the order of question_rows and the options the
+    order of option_rows.
+    '''
+    options = defaultdict(list)
+    for question_id, option_id, option_text, score in option_rows:
+        options[question_id].append((option_id, option_text, score))
+    return [(question_id, question_text, options.get(question_id, ()))
+            for question_id, question_text in question_rows]
+
+
+def load_question_rows(question_queryset):
+    '''
+    Loads the questions of a queryset, in its order, with their options
+    (by id) in the questions format of QuizPlan, with two queries.
+    '''
+    rows = list(question_queryset.values_list(*QUESTION_FIELDS))
+    if question_queryset.query.low_mark or question_queryset.query.high_mark is not None:
+        # a sliced subquery is not supported by every backend
+        option_queryset = Option.objects.filter(question__in=[row[0] for row in rows])
+    else:
+        option_queryset = Option.objects.filter(question__in=question_queryset.order_by()
+                                                                              .values('id'))
+    return group_question_rows(rows, option_queryset.order_by('id').values_list(*OPTION_FIELDS))
+
+
+def _load_questions(quiz_id, question_ids):
+    '''
+    Loads the given questions of a quiz in the questions format of
+    QuizPlan, in the given order; ids of questions which are no longer in
+    the quiz are skipped.
+    '''
+    questions = {}
+    for chunk in chunks(question_ids):
+        for question in group_question_rows(
+                Question.objects.filter(quiz=quiz_id, id__in=chunk).values_list(*QUESTION_FIELDS),
+                Option.objects.filter(question__in=chunk).order_by('id')
+                                                         .values_list(*OPTION_FIELDS)):
+            questions[question[0]] = question
+    return [questions[question_id] for question_id in question_ids
+            if question_id in questions]
+
+
+class QuizPlan(object):
+    '''Immutable definition of a quiz, shared by all the sessions'''
+
+    lazy = False
+    published = False
+
+    def __init__(self, quiz_id, questions, max_score=None, updated_at=None, single_page=False,
+                 sample_size=None, question_ids=None, sampled=False):
+        '''
+        questions = [(question_id, 'question_text', [(option_id, 'option_text', score),
+                                                      (option_id, 'option_text', score)]),
+                     (question_id, 'question_text', [(option_id, 'option_text', score)])]
+
+        max_score is the stored Quiz.max_score; it is computed when not given.
+        updated_at, single_page and sample_size are the Quiz fields of the
+        loaded quiz. A quiz with a sample_size has no questions: its plan
+        has the question_ids of the pool instead. sampled is set on the
+        plans of the questions drawn for an attempt.
+        '''
+        self.quiz_id = quiz_id
+        self.max_score = max_score
+        self.updated_at = updated_at
+        self.single_page = single_page
+        self.sample_size = sample_size
+        self.sampled = sampled
+
+        plan_questions = []
+        plan_options = []
+        for question_id, question_text, raw_options in questions:
+            options = []
+            for option_id, option_text, score in raw_options:
+                option = PlanOption(len(plan_options), option_id, option_text, score)
+                options.append(option)
+                plan_options.append(option)
+            plan_questions.append(PlanQuestion(question_id, question_text, tuple(options)))
+
+        self.questions = tuple(plan_questions)
+        self.options = tuple(plan_options)
+        self.question_ids = tuple(question_ids if question_ids is not None else
+                                  (question.id for question in self.questions))
+        # the sessions are kept while the questions and options stay the same,
+        # whatever their texts and scores; the rendered pages are kept while
+        # the content stays the same
+        self.version = hashlib.md5(repr(tuple(
+            (question.id, tuple(option.id for option in question.options))
+            for question in self.questions)).encode('utf-8')).hexdigest()[:12]
+        self.content_version = hashlib.md5(repr(self.questions).encode('utf-8')).hexdigest()[:12]
+        self._scoring = None
+        self._option_indexes = None
+
+    @classmethod
+    def from_questions(cls, quiz_id, question_list, max_score=None, updated_at=None,
+                       single_page=False):
+        '''Builds a plan from Question instances (with their option_set)'''
+        return cls(quiz_id, [(question.id,
+                              question.text,
+                              [(option.id, option.text, option.scor)
+                               for option in question.option_set.all()])
+                             for question in question_list],
+                   max_score, updated_at, single_page)
+
+    @classmethod
+    def load(cls, quiz_id):
+        '''
+        Loads the plan of a quiz, the question index of a sampled quiz or the
+        LazyQuizPlan of a quiz with lazy_pages from DB; raises Quiz.DoesNotExist
+        '''
+        quiz = Quiz.objects.filter(id=quiz_id) \
+                           .values_list('max_score', 'updated_at', 'single_page', 'sample_size',
+                                        'lazy_pages', 'published_snapshot') \
+                           .first()
+        if quiz is None:
+            raise Quiz.DoesNotExist('Quiz %s does not exist.' % quiz_id)
+        max_score, updated_at, single_page, sample_size, lazy_pages, snapshot_id = quiz
+        if snapshot_id is not None:
+            return cls.from_snapshot(QuizSnapshot.objects.get(pk=snapshot_id), single_page)
+        if sample_size is not None:
+            question_ids = Question.objects.filter(quiz=quiz_id).order_by('id') \
+                                           .values_list('id', flat=True)
+            return cls(quiz_id, [], None, updated_at, single_page,
+                       sample_size=sample_size, question_ids=question_ids)
+        if lazy_pages and not single_page:
+            # a single form shows all the questions anyway
+            return LazyQuizPlan.load(quiz_id, max_score, updated_at)
+
+        questions = group_question_rows(
+            Question.objects.filter(quiz=quiz_id).order_by('id').values_list(*QUESTION_FIELDS),
+            Option.objects.filter(question__quiz=quiz_id).order_by('id')
+                                                          .values_list(*OPTION_FIELDS))
+        return cls(quiz_id, questions, max_score, updated_at, single_page)
+
+    @classmethod
+    def load_rows(cls, quiz_id):
+        '''Loads the plan of a quiz from its questions and options, even when it is published'''
+        return cls(quiz_id, load_question_rows(Question.objects.filter(quiz=quiz_id)
+                                                               .order_by('id')),
+                   *(Quiz.objects.filter(id=quiz_id)
+                                 .values_list('max_score', 'updated_at', 'single_page')
+                                 .first() or (None, None, False)))
+
+    def to_snapshot_data(self):
+        '''The questions of the plan as stored in QuizSnapshot.data'''
+        return zlib.compress(json.dumps(
+            [[question.id, question.text,
+              [[option.id, option.text, option.score] for option in question.options]]
+             for question in self.questions], separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_snapshot(cls, snapshot, single_page=False):
+        questions = json.loads(zlib.decompress(bytes(snapshot.data)).decode('utf-8'))
+        plan = cls(snapshot.quiz_id, questions, snapshot.max_score, snapshot.created_at,
+                   single_page)
+        plan.published = True
+        return plan
+
+    def sample(self, rand=random):
+        '''Draws the question ids of an attempt at a sampled quiz, in random order'''
+        return rand.sample(self.question_ids, min(self.sample_size, len(self.question_ids)))
+
+    def sample_plan(self, question_ids):
+        '''
+        Loads the plan of the given questions of the quiz, in the given
+        order; ids of questions which are no longer in the quiz are skipped.
+        '''
+        plan = type(self)(self.quiz_id, _load_questions(self.quiz_id, question_ids),
+                          None, self.updated_at, self.single_page)
+        plan.sampled = True
+        return plan
+
+    def full(self):
+        '''The plan with all the questions of the quiz, loading the pool of a sampled quiz'''
+        if self.sample_size is not None:
+            return self.sample_plan(self.question_ids)
+        return self
+
+    @property
+    def option_count(self):
+        return len(self.options)
+
+    def page_questions(self, page_no, questions_per_page):
+        first_question = page_no * questions_per_page
+        return self.questions[first_question:first_question + questions_per_page]
+
+    def option_ids(self, option_indexes):
+        return [self.options[idx].id for idx in option_indexes]
+
+    @property
+    def option_indexes(self):
+        '''Maps the option ids to their index in plan.options, built on first use'''
+        if self._option_indexes is None:
+            self._option_indexes = dict((option.id, option.index) for option in self.options)
+        return self._option_indexes
+
+    @property
+    def scoring(self):
+        '''Array-backed ScoringEngine of the plan, built on first use'''
+        if self._scoring is None:
+            self._scoring = ScoringEngine(self)
+        return self._scoring
+
+    def question_mapping(self):
+        '''
+        Returns fresh copies of the (questions_mapping, selected_options)
+        structures, as documented in QuizView.get_question_mapping.
+        '''
+        questions_mapping = []
+        selected_options = {}
+        for question in self.questions:
+            mapped_options = {}
+            for option in question.options:
+                mapped_options[option.key] = option.text
+                selected_options[option.key] = {'is_selected': False,
+                                                'score': option.score}
+            questions_mapping.append({'question_text': question.text,
+                                      'options': mapped_options})
+        return questions_mapping, selected_options
+
+
+class LazyQuizPlan(object):
+    '''
+    Plan of a quiz with lazy_pages, for quizzes too large to be loaded up
+    front. Only the question ids and their option counts (the denormalized
+    Question.option_count, see quiz.stats) are loaded, which gives the
+    index of every option in the progress bitset. The questions of a page
+    are loaded when the page is shown, with a keyset query (id >= the first
+    id of the page), and kept in a small LRU of the plan; the plan is
+    replaced on every change of the quiz, and its cached pages with it.
+
+    Loaded questions which do not match the ids and option counts of the
+    plan (a change not seen yet, or a stale Question.option_count) would
+    put their options at the wrong indexes: the plan raises StalePlan
+    instead, after dropping itself from the plan cache of the process. It
+    writes nothing on this read path: the option counts are fixed by the
+    signals, or by rebuild_quiz_stats after writes which send none.
+
+    It has the interface of QuizPlan used by the paged quiz flow, without
+    the questions and options tuples; scoring is a LazyScoringEngine.
+    '''
+
+    lazy = True
+    single_page = False
+    sample_size = None
+    sampled = False
+    published = False
+
+    def __init__(self, quiz_id, question_ids, option_counts, max_score, updated_at,
+                 page_cache_size=None):
+        self.quiz_id = quiz_id
+        self.question_ids = tuple(question_ids)
+        self.option_counts = tuple(option_counts)
+        self.max_score = max_score
+        self.updated_at = updated_at
+
+        # index in the progress bitset of the first option of each question
+        self.option_starts = []
+        option_count = 0
+        for count in self.option_counts:
+            self.option_starts.append(option_count)
+            option_count += count
+        self.option_count = option_count
+
+        # the content of the quiz is not loaded: updated_at is touched on every change
+        self.version = hashlib.md5(repr((self.question_ids, self.option_counts,
+                                         str(updated_at))).encode('utf-8')).hexdigest()[:12]
+        self.content_version = self.version
+        self._pages = LRU(page_cache_size or getattr(settings, 'QUIZ_LAZY_PAGE_CACHE_SIZE', 64))
+        self._scoring = None
+
+    @classmethod
+    def load(cls, quiz_id, max_score, updated_at):
+        rows = list(Question.objects.filter(quiz=quiz_id).order_by('id')
+                                    .values_list('id', 'option_count'))
+        return cls(quiz_id, [question_id for question_id, _ in rows],
+                   [option_count for _, option_count in rows], max_score, updated_at)
+
+    def _plan_question(self, question_no, question):
+        '''PlanQuestion of a question in the questions format of QuizPlan'''
+        question_id, question_text, options = question
+        option_start = self.option_starts[question_no]
+        return PlanQuestion(question_id, question_text,
+                            tuple(PlanOption(option_start + option_no, option_id, option_text,
+                                             score)
+                                  for option_no, (option_id, option_text, score)
+                                  in enumerate(options)))
+
+    def _is_current(self, question_no, question):
+        return self.question_ids[question_no] == question.id and \
+            self.option_counts[question_no] == len(question.options)
+
+    def _stale(self):
+        '''Drops the plan from the cache of the process; returns StalePlan'''
+        plan_cache.discard(self.quiz_id)
+        return StalePlan('The plan of quiz %s is stale.' % self.quiz_id)
+
+    def page_questions(self, page_no, questions_per_page):
+        key = (page_no, questions_per_page)
+        questions = self._pages.get(key)
+        if questions is not None:
+            return questions
+
+        first_question = page_no * questions_per_page
+        question_ids = self.question_ids[first_question:first_question + questions_per_page]
+        if not question_ids:
+            return ()
+        question_list = load_question_rows(
+            Question.objects.filter(quiz=self.quiz_id, id__gte=question_ids[0])
+                            .order_by('id')[:len(question_ids)])
+        questions = tuple(self._plan_question(first_question + question_no, question)
+                          for question_no, question in enumerate(question_list))
+
+        if len(questions) != len(question_ids) or \
+                not all(self._is_current(first_question + question_no, question)
+                        for question_no, question in enumerate(questions)):
+            raise self._stale()
+        self._pages.set(key, questions)
+        return questions
+
+    def questions_at(self, question_numbers):
+        '''Returns {question_no: PlanQuestion} of the given positions in question_ids'''
+        question_numbers = sorted(set(question_numbers))
+        positions = dict((self.question_ids[question_no], question_no)
+                         for question_no in question_numbers)
+        questions = dict((positions[question[0]],
+                          self._plan_question(positions[question[0]], question))
+                         for question in _load_questions(self.quiz_id, list(positions)))
+        # the questions deleted since the plan was loaded are left out, the
+        # indexes of the options of the others do not depend on them
+        if not all(self._is_current(question_no, question)
+                   for question_no, question in questions.items()):
+            raise self._stale()
+        return questions
+
+    def option_ids(self, option_indexes):
+        '''Option ids of the given bitset indexes, loaded for their questions only'''
+        question_numbers = sorted(set(bisect_right(self.option_starts, idx) - 1
+                                      for idx in option_indexes))
+        question_ids = [self.question_ids[question_no] for question_no in question_numbers]
+        options = {}
+        for chunk in chunks(question_ids):
+            for question_id, option_id in Option.objects.filter(question__in=chunk) \
+                                                        .order_by('id') \
+                                                        .values_list('question', 'id'):
+                options.setdefault(question_id, []).append(option_id)
+
+        if any(len(options.get(question_id, ())) != self.option_counts[question_no]
+               for question_no, question_id in zip(question_numbers, question_ids)):
+            raise self._stale()
+
+        option_ids = []
+        for idx in option_indexes:
+            question_no = bisect_right(self.option_starts, idx) - 1
+            option_ids.append(options[self.question_ids[question_no]]
+                              [idx - self.option_starts[question_no]])
+        return option_ids
+
+    def full(self):
+        '''Loads the QuizPlan with all the questions of the quiz'''
+        return QuizPlan(self.quiz_id, _load_questions(self.quiz_id, list(self.question_ids)),
+                        self.max_score, self.updated_at)
+
+    @property
+    def scoring(self):
+        '''LazyScoringEngine of the plan, built on first use'''
+        if self._scoring is None:
+            self._scoring = LazyScoringEngine(self)
+        return self._scoring
+
+
+def _plan_generation_key(quiz_id):
+    return 'quiz:plan:generation:%d' % quiz_id
+
+
+class PlanCache(object):
+    '''
+    Bounded LRU of compiled plans, keyed by (quiz_id, generation).
+
+    The generation of a quiz is kept in the Django cache and bumped on every
+    invalidation, so an edit made in any process stops the plans compiled
+    before it from being served by all the processes sharing the cache. The
+    signals bump it again once the edit is committed (see quiz.transactions),
+    so a plan compiled from the rows read before the commit is not served
+    after it. Each get costs one cache read.
+    '''
+
+    def __init__(self, max_size):
+        self._plans = LRU(max_size)
+
+    def get(self, quiz_id):
+        quiz_id = int(quiz_id)
+        key = (quiz_id, get_generation(_plan_generation_key(quiz_id)))
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = QuizPlan.load(quiz_id)
+            self._plans.set(key, plan)
+        return plan
+
+    def invalidate(self, quiz_id):
+        quiz_id = int(quiz_id)
+        bump_generation(_plan_generation_key(quiz_id))
+        self.discard(quiz_id)
+
+    def discard(self, quiz_id):
+        '''Drops the plans of the quiz from this process only, they are reloaded on next get'''
+        quiz_id = int(quiz_id)
+        self._plans.discard_keys(lambda key: key[0] == quiz_id)
+
+    def clear(self):
+        self._plans.clear()
+
+    def __len__(self):
+        return len(self._plans)
+
+
+plan_cache = PlanCache(getattr(settings, 'QUIZ_PLAN_CACHE_SIZE', 128))
+
+
+def invalidate_quiz(quiz_id):
+    '''
+    Touches the quiz and drops its cached plans, after the writes which send
+    no signals (update(), bulk_create())
+    '''
+    touch_quiz(quiz_id)
+    plan_cache.invalidate(quiz_id)
+
+
+def get_plan(quiz_id):
+    '''The cached plan of the quiz; raises Http404 for an unknown quiz, which is not cached'''
+    try:
+        return plan_cache.get(quiz_id)
+    except Quiz.DoesNotExist:
+        raise Http404('No quiz matches the given query.')
@@ -0,0 +1,183 @@
+'''
+Compact representation of a quiz session and where it is stored.
+
+Only the quiz id and version, the current page, the per-page scores and
+suggestion records and a bitset of the selected options are kept; questions and options text are
+resolved from the QuizPlan at render time. The version only changes with the
+questions and options of the quiz, not with their texts and scores: the
+content version the scores were computed with is kept too, they are
+computed again on Finish when it changed (see QuizView._rescore). An attempt at a sampled quiz also keeps
+the ids of its questions, to reload the same plan on every request.
+
+The store is chosen with the QUIZ_PROGRESS_STORE setting:
+  quiz.progress.SessionProgressStore - in request.session (default)
+  quiz.progress.SignedCookieProgressStore - in a signed, compressed cookie,
+      so taking a quiz does not read or write the session backend
+
+The cookie leaves out the suggestion records, they are computed again from
+the selected options on Finish (see QuizView._get_sugestions). Browsers drop
+the cookies over about 4 KB: a token longer than QUIZ_PROGRESS_COOKIE_MAX_BYTES
+(the selected options of a quiz with thousands of options) is kept in the
+session instead.
+
+A token stays valid after its quiz is finished, only the cookie is
+deleted: each attempt carries a random nonce, consumed in the default
+cache when the attempt is recorded (see consume_nonce), so a replayed
+token shows the result without recording the attempt again.
+'''
+import base64
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+
+class QuizProgress(object):
+    def __init__(self, quiz_id, version, option_count, last_page_no,
+                 current_page_no=0, current_score=None, selected=None, error=None,
+                 page_sugestions=None, question_ids=None, nonce=None, content_version=None):
+        self.quiz_id = quiz_id
+        self.version = version
+        # the content of the plan the pages were scored with, see QuizPlan.content_version
+        self.content_version = content_version
+        self.last_page_no = last_page_no
+        self.current_page_no = current_page_no
+        self.current_score = current_score or [0] * (last_page_no + 1)
+        # bit i of the bitset is set when plan.options[i] is selected
+        self.selected = selected or bytearray((option_count + 7) // 8)
+        self.error = error
+        # change records (see quiz.scoring) of each submitted page, None if not submitted
+        self.page_sugestions = page_sugestions or [None] * (last_page_no + 1)
+        # the questions drawn for an attempt at a sampled quiz, see QuizPlan.sample
+        self.question_ids = question_ids
+        # identifies the attempt, recorded once, see consume_nonce
+        self.nonce = nonce
+
+    @classmethod
+    def for_plan(cls, plan, questions_per_page):
+        return cls(plan.quiz_id, plan.version, plan.option_count,
+                   len(plan.question_ids) // questions_per_page,
+                   question_ids=list(plan.question_ids) if plan.sampled else None,
+                   nonce=get_random_string(16),
+                   content_version=plan.content_version)
+
+    def is_selected(self, option_index):
+        return bool(self.selected[option_index >> 3] & (1 << (option_index & 7)))
+
+    def set_selected(self, option_index, is_selected):
+        if is_selected:
+            self.selected[option_index >> 3] |= 1 << (option_index & 7)
+        else:
+            self.selected[option_index >> 3] &= ~(1 << (option_index & 7)) & 0xff
+
+    def matches(self, plan):
+        return self.quiz_id == plan.quiz_id and self.version == plan.version
+
+    def to_dict(self):
+        return {'quiz_id': self.quiz_id,
+                'version': self.version,
+                'last_page_no': self.last_page_no,
+                'current_page_no': self.current_page_no,
+                'current_score': self.current_score,
+                'selected': base64.b64encode(bytes(self.selected)).decode('ascii'),
+                'error': self.error,
+                'page_sugestions': self.page_sugestions,
+                'question_ids': self.question_ids,
+                'nonce': self.nonce,
+                'content_version': self.content_version}
+
+    @classmethod
+    def from_dict(cls, data):
+        selected = bytearray(base64.b64decode(data['selected']))
+        return cls(data['quiz_id'], data['version'], len(selected) * 8,
+                   data['last_page_no'],
+                   current_page_no=data['current_page_no'],
+                   current_score=data['current_score'],
+                   selected=selected,
+                   error=data['error'],
+                   page_sugestions=data['page_sugestions'],
+                   question_ids=data.get('question_ids'),
+                   nonce=data.get('nonce'),
+                   content_version=data.get('content_version'))
+
+
+class SessionProgressStore(object):
+    session_key = 'quiz_progress'
+
+    def load(self, request, quiz_id):
+        return request.session.get(self.session_key)
+
+    def start(self, request, progress):
+        request.session.clear()
+        request.session[self.session_key] = progress.to_dict()
+
+    def save(self, request, response, progress):
+        request.session[self.session_key] = progress.to_dict()
+
+    def finish(self, request, response, progress):
+        request.session.clear()
+
+
+class SignedCookieProgressStore(object):
+    salt = 'quiz.progress'
+
+    def __init__(self, max_age=None, max_bytes=None):
+        self.max_age = max_age or getattr(settings, 'QUIZ_PROGRESS_MAX_AGE', 24 * 60 * 60)
+        self.max_bytes = max_bytes or getattr(settings, 'QUIZ_PROGRESS_COOKIE_MAX_BYTES', 3800)
+        self.fallback = SessionProgressStore()
+
+    def _cookie_name(self, quiz_id):
+        return 'quiz_progress_' + str(quiz_id)
+
+    def load(self, request, quiz_id):
+        token = request.COOKIES.get(self._cookie_name(quiz_id))
+        if token is None:
+            # without a session cookie the session backend is not read
+            return self.fallback.load(request, quiz_id)
+        try:
+            return signing.loads(token, salt=self.salt, max_age=self.max_age)
+        except signing.BadSignature:
+            return None
+
+    def start(self, request, progress):
+        # nothing to keep until the first answer is posted
+        pass
+
+    def save(self, request, response, progress):
+        data = progress.to_dict()
+        data['page_sugestions'] = None
+        token = signing.dumps(data, salt=self.salt, compress=True)
+        cookie_name = self._cookie_name(progress.quiz_id)
+        if len(token) > self.max_bytes:
+            self.fallback.save(request, response, progress)
+            if cookie_name in request.COOKIES:
+                response.delete_cookie(cookie_name)
+            return
+        response.set_cookie(cookie_name, token, max_age=self.max_age, httponly=True)
+
+    def finish(self, request, response, progress):
+        cookie_name = self._cookie_name(progress.quiz_id)
+        if cookie_name in request.COOKIES:
+            response.delete_cookie(cookie_name)
+        if self.fallback.session_key in request.session:
+            self.fallback.finish(request, response, progress)
+
+
+def consume_nonce(progress):
+    '''
+    Marks the attempt of the progress as recorded; returns False when it
+    already was (a replayed progress token) or when the progress has no
+    nonce (a token signed before the nonces were added).
+    '''
+    if progress.nonce is None:
+        return False
+    # kept as long as the tokens which carry it are valid
+    return cache.add('quiz:attempt:nonce:' + progress.nonce, True,
+                     getattr(settings, 'QUIZ_PROGRESS_MAX_AGE', 24 * 60 * 60))
+
+
+def get_progress_store():
+    return import_string(getattr(settings, 'QUIZ_PROGRESS_STORE',
+                                 'quiz.progress.SessionProgressStore'))()
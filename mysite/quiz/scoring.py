@@ -0,0 +1,253 @@
+'''
+Array-backed scoring of a quiz.
+
+The options of a QuizPlan are stored contiguously, question after
+question, so every per-question reduction is a single ufunc.reduceat over
+the option arrays. Only the texts of the chosen suggestions are built in
+Python.
+
+Suggestions are computed as change records, per page:
+  [best, worst] with best/worst = [question_index, from_option, to_option, diff]
+                                  or None when no change is possible
+where from_option/to_option are indexes in plan.options. Records are small
+enough to be kept in the quiz progress when a page is submitted.
+
+LazyScoringEngine scores a quiz loaded page by page (see
+quiz.plans.LazyQuizPlan) with the arrays of one page at a time.
+'''
+from collections import namedtuple
+
+import numpy as np
+
+
+_MIN = np.iinfo(np.int64).min
+_MAX = np.iinfo(np.int64).max
+
+NO_BEST_SUGESTION = 'for best: No sugestion to improve score'
+NO_WORST_SUGESTION = 'for worst: No sugestion to decrese score'
+
+
+class ScoringEngine(object):
+    def __init__(self, plan):
+        self.plan = plan
+        self.scores = np.array([option.score for option in plan.options], dtype=np.int64)
+        self.option_count = len(self.scores)
+        if plan.max_score is not None:
+            self.max_score = plan.max_score
+        else:
+            self.max_score = int(self.scores[self.scores > 0].sum())
+
+        option_counts = np.array([len(question.options) for question in plan.questions],
+                                 dtype=np.int64)
+        # questions without options are left out of the per-question reductions
+        self.answerable = np.flatnonzero(option_counts)
+        self.starts = (np.cumsum(option_counts) - option_counts)[self.answerable]
+        self.counts = option_counts[self.answerable]
+
+    def selection_mask(self, progress):
+        '''Unpacks the progress bitset into a boolean array over plan.options'''
+        bits = np.unpackbits(np.frombuffer(bytes(progress.selected), dtype=np.uint8))
+        # the bitset is least significant bit first
+        bits = bits.reshape(-1, 8)[:, ::-1].ravel()
+        return bits[:self.option_count].astype(bool)
+
+    def score(self, mask):
+        return int(self.scores[mask].sum())
+
+    def _group_extreme(self, values, starts, counts, ufunc):
+        '''Returns the extreme value of each group of options and the position of its first hit'''
+        extreme = ufunc.reduceat(values, starts)
+        hits = values == np.repeat(extreme, counts)
+        positions = np.arange(len(values), dtype=np.int64)
+        first = np.minimum.reduceat(np.where(hits, positions, len(values)), starts)
+        return extreme, first
+
+    def _best_change(self, to_values, from_values, starts, counts):
+        '''
+        Per question, the biggest score difference obtained by replacing
+        the `from` option (lowest of from_values) with the `to` option
+        (highest of to_values).
+        '''
+        to_score, to_option = self._group_extreme(to_values, starts, counts, np.maximum)
+        from_score, from_option = self._group_extreme(from_values, starts, counts, np.minimum)
+
+        valid = (to_score != _MIN) & (from_score != _MAX)
+        diff = np.where(valid, np.where(valid, to_score, 0) - np.where(valid, from_score, 0), 0)
+        return np.maximum(diff, 0), from_option, to_option
+
+    def _page_records(self, diff, from_option, to_option, answerable,
+                      first_question, page_count, questions_per_page, option_offset):
+        '''Picks, for each page, the question with the biggest diff (first one on ties)'''
+        page_diff = np.zeros(page_count * questions_per_page, dtype=np.int64)
+        page_diff[answerable - first_question] = diff
+        page_diff = page_diff.reshape(page_count, questions_per_page)
+        best = page_diff.argmax(axis=1)
+
+        # map the page question back to its position in `answerable`
+        lookup = np.zeros(page_count * questions_per_page, dtype=np.int64)
+        lookup[answerable - first_question] = np.arange(len(answerable))
+
+        records = []
+        for page_no, question_no in enumerate(best):
+            change = int(page_diff[page_no, question_no])
+            if change > 0:
+                idx = lookup[page_no * questions_per_page + question_no]
+                records.append([int(answerable[idx]),
+                                int(from_option[idx]) + option_offset,
+                                int(to_option[idx]) + option_offset,
+                                change])
+            else:
+                records.append(None)
+        return records
+
+    def change_records(self, mask, questions_per_page, first_page=0, page_count=None):
+        '''
+        Returns the change records of page_count pages starting with
+        first_page (up to the last page by default); mask covers all
+        plan.options.
+        '''
+        if page_count is None:
+            page_count = len(self.plan.questions) // questions_per_page + 1 - first_page
+        first_question = first_page * questions_per_page
+        lo, hi = np.searchsorted(self.answerable,
+                                 [first_question, first_question + page_count * questions_per_page])
+        if lo == hi:
+            return [[None, None] for _ in range(page_count)]
+
+        answerable = self.answerable[lo:hi]
+        option_lo = self.starts[lo]
+        option_hi = self.starts[hi - 1] + self.counts[hi - 1]
+        starts = self.starts[lo:hi] - option_lo
+        counts = self.counts[lo:hi]
+        scores = self.scores[option_lo:option_hi]
+        selected = mask[option_lo:option_hi]
+        unselected = ~selected
+
+        # for best the lowest selected option is replaced by the highest unselected one
+        best = self._best_change(np.where(unselected, scores, _MIN),
+                                 np.where(selected, scores, _MAX),
+                                 starts, counts)
+        # for worst the highest selected option is replaced by the lowest unselected one
+        worst_diff, min_unselected, max_selected = self._best_change(
+            np.where(selected, scores, _MIN),
+            np.where(unselected, scores, _MAX),
+            starts, counts)
+        worst = (worst_diff, max_selected, min_unselected)
+
+        page_args = (answerable, first_question, page_count, questions_per_page, int(option_lo))
+        best_records = self._page_records(*(best + page_args))
+        worst_records = self._page_records(*(worst + page_args))
+        return [list(page_records) for page_records in zip(best_records, worst_records)]
+
+    def page_change_record(self, mask, questions_per_page, page_no):
+        return self.change_records(mask, questions_per_page, page_no, 1)[0]
+
+    def _record_questions(self, records):
+        '''The questions of the records, indexable by question index'''
+        return self.plan.questions
+
+    def _sugestion_text(self, prefix, record, questions):
+        question_idx, from_option, to_option, _ = record
+        question = questions[question_idx]
+        # the options of a question are contiguous
+        first_option = question.options[0].index
+        return (prefix + question.text +
+                '<' + question.options[from_option - first_option].text + '> -> <' +
+                question.options[to_option - first_option].text + '>')
+
+    def sugestion_texts(self, records):
+        '''
+        Builds the result page suggestions from change records:
+          [((best_text, best_diff), (worst_text, -worst_diff)), ...] for each page
+        '''
+        questions = self._record_questions(records)
+        sugestions = []
+        for best, worst in records:
+            if best:
+                best_sugestion = (self._sugestion_text('for best: ', best, questions), best[3])
+            else:
+                best_sugestion = (NO_BEST_SUGESTION, 0)
+            if worst:
+                worst_sugestion = (self._sugestion_text('for worst: ', worst, questions),
+                                   -worst[3])
+            else:
+                worst_sugestion = (NO_WORST_SUGESTION, 0)
+            sugestions.append((best_sugestion, worst_sugestion))
+        return sugestions
+
+    def sugestions(self, mask, questions_per_page):
+        '''Same result as QuizView._compute_sugestions'''
+        return self.sugestion_texts(self.change_records(mask, questions_per_page))
+
+
+_Page = namedtuple('_Page', ['questions', 'options', 'max_score'])
+
+
+class LazyScoringEngine(ScoringEngine):
+    '''
+    Scoring of a LazyQuizPlan: the change records of a page are computed by
+    a ScoringEngine over the questions of that page only, and the texts of
+    the suggestions load the questions they name. The maximum score is the
+    stored Quiz.max_score. There is no score of the whole bitset: the paged
+    flow adds up the scores of the pages as they are submitted, and the
+    single form and the API do not serve lazy quizzes.
+    '''
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.max_score = plan.max_score
+        self.option_count = plan.option_count
+
+    def change_records(self, mask, questions_per_page, first_page=0, page_count=None):
+        if page_count is None:
+            page_count = len(self.plan.question_ids) // questions_per_page + 1 - first_page
+
+        loaded = None
+        if page_count > 1:
+            # the questions of all the pages in one chunked load, not one per page
+            first_question = first_page * questions_per_page
+            loaded = self.plan.questions_at(range(
+                first_question,
+                min(first_question + page_count * questions_per_page,
+                    len(self.plan.question_ids))))
+
+        records = []
+        for page_no in range(first_page, first_page + page_count):
+            questions = self._page_questions(page_no, questions_per_page, loaded)
+            options = tuple(option for question in questions for option in question.options)
+            if not options:
+                records.append([None, None])
+                continue
+            option_offset = options[0].index
+            engine = ScoringEngine(_Page(questions, options, 0))
+            page_record = engine.change_records(
+                mask[option_offset:option_offset + len(options)], questions_per_page, 0, 1)[0]
+
+            # positions in the page back to positions in the quiz
+            question_offset = page_no * questions_per_page
+            record = []
+            for change in page_record:
+                if change is not None:
+                    question_idx, from_option, to_option, diff = change
+                    change = [question_idx + question_offset, from_option + option_offset,
+                              to_option + option_offset, diff]
+                record.append(change)
+            records.append(record)
+        return records
+
+    def _page_questions(self, page_no, questions_per_page, loaded):
+        if loaded is not None:
+            first_question = page_no * questions_per_page
+            question_numbers = range(first_question,
+                                     min(first_question + questions_per_page,
+                                         len(self.plan.question_ids)))
+            if all(question_no in loaded and
+                   self.plan._is_current(question_no, loaded[question_no])
+                   for question_no in question_numbers):
+                return tuple(loaded[question_no] for question_no in question_numbers)
+        # a question changed since the plan was loaded
+        return self.plan.page_questions(page_no, questions_per_page)
+
+    def _record_questions(self, records):
+        return self.plan.questions_at(change[0] for record in records
+                                      for change in record if change)
@@ -0,0 +1,79 @@
+from collections import defaultdict
+import threading
+
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Quiz, Question, Option
+from .pagecache import invalidate_index
+from .plans import plan_cache
+from .stats import touch_quiz, update_question_stats, update_quiz_stats
+from .transactions import after_commit, run_deferred
+
+
+# ids of the quizzes and questions being deleted by the current thread: the
+# rows deleted with them in cascade do not update their statistics one by one
+_deleting = threading.local()
+
+
+def _being_deleted(model):
+    try:
+        return _deleting.ids[model]
+    except AttributeError:
+        _deleting.ids = defaultdict(set)
+        return _deleting.ids[model]
+
+
+def _option_quiz_id(option):
+    try:
+        return option.question.quiz_id
+    except Question.DoesNotExist:
+        return None
+
+
+@receiver(pre_delete, sender=Quiz)
+@receiver(pre_delete, sender=Question)
+def parent_deleting(sender, instance, **kwargs):
+    _being_deleted(sender).add(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    # also after a save, in case a delete of the quiz was rolled back
+    _being_deleted(Quiz).discard(instance.id)
+    if kwargs['signal'] is post_save:
+        # a full save writes back the statistics loaded with the instance
+        update_quiz_stats(instance.id)
+        touch_quiz(instance.id)
+    after_commit(plan_cache.invalidate, instance.id)
+    after_commit(invalidate_index)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    _being_deleted(Question).discard(instance.id)
+    if kwargs['signal'] is post_save:
+        update_question_stats(instance.id)
+    elif instance.quiz_id in _being_deleted(Quiz):
+        return
+    update_quiz_stats(instance.quiz_id)
+    touch_quiz(instance.quiz_id)
+    after_commit(plan_cache.invalidate, instance.quiz_id)
+
+
+@receiver([post_save, post_delete], sender=Option)
+def option_changed(sender, instance, **kwargs):
+    if kwargs['signal'] is post_delete and instance.question_id in _being_deleted(Question):
+        # updated once the question is deleted
+        return
+    update_question_stats(instance.question_id)
+    quiz_id = _option_quiz_id(instance)
+    if quiz_id is not None:
+        update_quiz_stats(quiz_id)
+        touch_quiz(quiz_id)
+        after_commit(plan_cache.invalidate, quiz_id)
+
+
+# the invalidations deferred on Django 1.8, see quiz.transactions
+request_finished.connect(run_deferred, dispatch_uid='quiz.transactions.run_deferred')
@@ -0,0 +1,82 @@
+'''
+Published quiz snapshots.
+
+publish_quiz() freezes the questions and options of a quiz into an
+immutable QuizSnapshot row (a compressed blob with the question order,
+the option texts and scores, and the totals) and serves it from then on:
+the plan of a published quiz is loaded with one primary key read instead
+of the questions and options (see QuizPlan.load). Editing a published
+quiz changes nothing for the quiz takers until it is published again.
+
+Snapshots are never changed or deleted, so a session started on a
+snapshot goes on with it after the quiz is published again:
+get_snapshot_plan() loads the plan of any version of a quiz, kept in a
+process-wide LRU since snapshots never change.
+
+Sampled quizzes and quizzes with lazy_pages are served from their
+questions and cannot be published.
+'''
+from django.conf import settings
+from django.db import transaction
+
+from .lru import LRU
+from .models import Quiz, QuizSnapshot
+from .plans import QuizPlan, invalidate_quiz
+
+
+def publish_quiz(quiz_id):
+    '''Publishes the current questions and options of the quiz, returns the QuizSnapshot'''
+    quiz = Quiz.objects.get(id=quiz_id)
+    if quiz.sample_size is not None or quiz.lazy_pages:
+        raise ValueError('Sampled quizzes and quizzes with lazy pages cannot be published.')
+
+    plan = QuizPlan.load_rows(quiz_id)
+    with transaction.atomic():
+        # publishing an unchanged quiz again reuses its snapshot
+        snapshot, _ = QuizSnapshot.objects.get_or_create(
+            quiz_id=quiz_id, version=plan.content_version,
+            defaults={'data': plan.to_snapshot_data(),
+                      'max_score': plan.scoring.max_score,
+                      'question_count': len(plan.questions),
+                      'option_count': len(plan.options)})
+        Quiz.objects.filter(id=quiz_id).update(published_snapshot=snapshot)
+    invalidate_quiz(quiz_id)
+    return snapshot
+
+
+def unpublish_quiz(quiz_id):
+    '''Serves the quiz from its questions and options again'''
+    Quiz.objects.filter(id=quiz_id).update(published_snapshot=None)
+    invalidate_quiz(quiz_id)
+
+
+class SnapshotPlanCache(object):
+    '''Bounded LRU of the plans of snapshots, keyed by (quiz_id, version)'''
+
+    def __init__(self, max_size):
+        self._plans = LRU(max_size)
+
+    def get(self, quiz_id, version):
+        '''Returns the plan of the snapshot or None when there is no such snapshot'''
+        key = (int(quiz_id), version)
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+
+        snapshot = QuizSnapshot.objects.filter(quiz=quiz_id, version=version).first()
+        if snapshot is None:
+            return None
+        # only the sessions of the paged flow are kept on a snapshot
+        plan = QuizPlan.from_snapshot(snapshot)
+        self._plans.set(key, plan)
+        return plan
+
+    def clear(self):
+        self._plans.clear()
+
+
+snapshot_plan_cache = SnapshotPlanCache(getattr(settings, 'QUIZ_SNAPSHOT_CACHE_SIZE', 128))
+
+
+def get_snapshot_plan(quiz_id, version):
+    return snapshot_plan_cache.get(quiz_id, version)
@@ -0,0 +1,56 @@
+'''
+Denormalized quiz statistics.
+
+Quiz.max_score and Question.option_count only change when a
+quiz is edited, so they are stored with the quiz and refreshed from the
+model signals (see quiz.signals) or in bulk with the rebuild_quiz_stats
+management command. update() is used so no further signals are sent.
+
+Quiz.updated_at is touched the same way on every change of the quiz
+content; it is sent as the Last-Modified of the quiz pages.
+'''
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Quiz, Question, Option
+
+
+def update_quiz_stats(quiz_id):
+    max_score = Option.objects.filter(question__quiz=quiz_id,
+                                      scor__gt=0).aggregate(max_score=Sum('scor'))['max_score']
+    Quiz.objects.filter(id=quiz_id).update(max_score=max_score or 0)
+
+
+def touch_quiz(quiz_id):
+    Quiz.objects.filter(id=quiz_id).update(updated_at=timezone.now())
+
+
+def update_question_stats(question_id):
+    option_count = Option.objects.filter(question=question_id).count()
+    Question.objects.filter(id=question_id).update(option_count=option_count)
+
+
+def rebuild_stats(quiz_ids=None):
+    '''Recomputes the statistics of the given quizzes (all if None), returns the quiz count'''
+    quizzes = Quiz.objects.all()
+    if quiz_ids is not None:
+        quizzes = quizzes.filter(id__in=quiz_ids)
+    quiz_ids = list(quizzes.values_list('id', flat=True))
+
+    option_counts = Option.objects.filter(question__quiz__in=quiz_ids) \
+                                  .values_list('question') \
+                                  .annotate(Count('id'))
+    quiz_stats = dict(Option.objects.filter(question__quiz__in=quiz_ids, scor__gt=0)
+                                    .values_list('question__quiz')
+                                    .annotate(Sum('scor')))
+
+    with transaction.atomic():
+        # questions without options have no row in option_counts
+        Question.objects.filter(quiz__in=quiz_ids).update(option_count=0)
+        for question_id, option_count in option_counts:
+            Question.objects.filter(id=question_id).update(option_count=option_count)
+
+        for quiz_id in quiz_ids:
+            Quiz.objects.filter(id=quiz_id).update(max_score=quiz_stats.get(quiz_id, 0))
+    return len(quiz_ids)
@@ -0,0 +1,96 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..bulk import QuizImporter
+from ..models import Quiz, Question, Option
+from ..snapshots import publish_quiz
+
+
+@override_settings(ROOT_URLCONF='quiz.tests.urls', QUIZ_ADMIN_QUESTIONS_PER_PAGE=10)
+class TestQuizAdmin(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+        importer = QuizImporter()
+        importer.run(('quiz', 'description', 'question_text_%d' % question_no,
+                      [('option', 1), ('other option', -1)])
+                     for question_no in range(25))
+        self.quiz_id = importer.quiz_ids[0]
+        self.url = '/admin/quiz/quiz/%d/' % self.quiz_id
+
+    def test_paginated_questions(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'name="question_set-INITIAL_FORMS" type="hidden" value="10"')
+        self.assertContains(response, 'Page 1 of 3 (25 questions)')
+        self.assertContains(response, 'question_text_9"')
+        self.assertNotContains(response, 'question_text_10"')
+
+        response = self.client.get(self.url + '?questions_page=2')
+        self.assertContains(response, 'name="question_set-INITIAL_FORMS" type="hidden" value="5"')
+        self.assertContains(response, 'question_text_24"')
+        self.assertNotContains(response, 'question_text_9"')
+
+        # out of range pages are clamped
+        response = self.client.get(self.url + '?questions_page=x')
+        self.assertContains(response, 'Page 1 of 3')
+        response = self.client.get(self.url + '?questions_page=7')
+        self.assertContains(response, 'Page 3 of 3')
+
+    def test_edit_question_on_a_page(self):
+        questions = list(Question.objects.filter(quiz=self.quiz_id).order_by('id')[10:20])
+        data = {'name': 'quiz', 'description': 'description',
+                'question_set-TOTAL_FORMS': '11',
+                'question_set-INITIAL_FORMS': '10',
+                'question_set-MIN_NUM_FORMS': '0',
+                'question_set-MAX_NUM_FORMS': '1000'}
+        for form_no, question in enumerate(questions):
+            prefix = 'question_set-%d-' % form_no
+            data[prefix + 'id'] = question.id
+            data[prefix + 'quiz'] = self.quiz_id
+            data[prefix + 'text'] = 'changed %d' % form_no if form_no == 3 else question.text
+
+        response = self.client.post(self.url + '?questions_page=1', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Question.objects.get(id=questions[3].id).text, 'changed 3')
+        self.assertEqual(Question.objects.filter(quiz=self.quiz_id).count(), 25)
+
+    def test_question_changelist(self):
+        other_id = Quiz.objects.create(name='other', description='').id
+        Question.objects.create(quiz_id=other_id, text='question_text_other')
+
+        response = self.client.get('/admin/quiz/question/?quiz__id__exact=%d' % self.quiz_id)
+        self.assertContains(response, '25 questions')
+
+        response = self.client.get('/admin/quiz/question/?q=other')
+        self.assertContains(response, 'question_text_other')
+        self.assertNotContains(response, 'question_text_1<')
+
+    def test_clone_action(self):
+        response = self.client.post('/admin/quiz/quiz/', {'action': 'clone_quizzes',
+                                                          '_selected_action': [self.quiz_id]})
+        self.assertEqual(response.status_code, 302)
+
+        clone = Quiz.objects.exclude(id=self.quiz_id).get()
+        self.assertEqual(clone.name, 'quiz (copy)')
+        self.assertEqual(clone.question_set.count(), 25)
+        self.assertEqual(Option.objects.filter(question__quiz=clone).count(), 50)
+        self.assertEqual(clone.max_score, 25)
+
+    def test_stale_form_keeps_the_publish(self):
+        quiz = Quiz.objects.get(id=self.quiz_id)
+        # published while the change form is being saved
+        publish_quiz(self.quiz_id)
+
+        request = RequestFactory().post(self.url)
+        model_admin = admin.site._registry[Quiz]
+        form = model_admin.get_form(request, quiz)(
+            {'name': 'renamed', 'description': 'description', 'sample_size': ''},
+            instance=quiz)
+        self.assertTrue(form.is_valid())
+        model_admin.save_model(request, form.save(commit=False), form, True)
+
+        quiz = Quiz.objects.get(id=self.quiz_id)
+        self.assertEqual(quiz.name, 'renamed')
+        self.assertIsNotNone(quiz.published_snapshot_id)
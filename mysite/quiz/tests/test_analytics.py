@@ -0,0 +1,66 @@
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from ..analytics import quiz_analytics
+from ..attempts import AttemptRecord, save_attempts
+from ..models import Quiz, Question, Option, OptionPickCount, ScoreCount
+
+
+class TestAnalytics(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        self.options = []
+        for q_idx in range(2):
+            question = Question.objects.create(quiz=self.quiz,
+                                               text='question_text_' + str(q_idx))
+            for o_idx in range(2):
+                self.options.append(Option.objects.create(question=question, scor=o_idx,
+                                                          text='option_text_' + str(o_idx)))
+
+    def _record(self, score, options):
+        return AttemptRecord(self.quiz.id, score, 2, [option.id for option in options],
+                             timezone.now())
+
+    def _aggregates(self):
+        return (sorted(ScoreCount.objects.values_list('quiz_id', 'score', 'count')),
+                sorted(OptionPickCount.objects.values_list('quiz_id', 'question_id',
+                                                           'option_id', 'count')))
+
+    def test_incremental_update(self):
+        save_attempts([self._record(1, self.options[1:3])])
+        save_attempts([self._record(1, self.options[1:3]),
+                       self._record(2, [self.options[1], self.options[3]])])
+
+        scores, picks = self._aggregates()
+        self.assertEqual(scores, [(self.quiz.id, 1, 2), (self.quiz.id, 2, 1)])
+        self.assertEqual([(option_id, count) for _, _, option_id, count in picks],
+                         [(self.options[1].id, 3),
+                          (self.options[2].id, 2),
+                          (self.options[3].id, 1)])
+        self.assertEqual(picks[0][:2], (self.quiz.id, self.options[1].question_id))
+
+    def test_rebuild_matches_incremental(self):
+        save_attempts([self._record(1, self.options[1:3]),
+                       self._record(2, [self.options[0], self.options[3]])])
+        save_attempts([self._record(2, [self.options[0], self.options[3]])])
+        expected = self._aggregates()
+
+        OptionPickCount.objects.update(count=0)
+        ScoreCount.objects.all().delete()
+        call_command('rebuild_quiz_analytics', stdout=StringIO())
+        self.assertEqual(self._aggregates(), expected)
+
+    def test_quiz_analytics(self):
+        save_attempts([self._record(1, self.options[1:3]),
+                       self._record(2, [self.options[1], self.options[3]])])
+
+        result = quiz_analytics(self.quiz.id)
+        self.assertEqual(result['attempts'], 2)
+        self.assertEqual(result['scores'], [(1, 1, 50.0), (2, 1, 50.0)])
+        self.assertEqual(result['questions'],
+                         [('question_text_0', [('option_text_0', 0, 0.0),
+                                               ('option_text_1', 2, 100.0)]),
+                          ('question_text_1', [('option_text_0', 1, 50.0),
+                                               ('option_text_1', 1, 50.0)])])
@@ -0,0 +1,139 @@
+import json
+import time
+
+from django.test import TestCase
+from django.utils.http import http_date
+
+from ..models import Quiz, Question, Option, Attempt
+from ..plans import plan_cache
+
+
+class TestQuizApi(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        self.options = []
+        it_scores = iter([10, 0, -7, 18, 22, -40])
+        for q_idx in range(3):
+            q = Question.objects.create(quiz=self.quiz,
+                                        text='question_text_' + str(q_idx))
+            for o_idx in range(2):
+                self.options.append(Option.objects.create(question=q,
+                                                          scor=next(it_scores),
+                                                          text='option_text_' + str(o_idx)))
+        self.url = '/api/%d/' % self.quiz.id
+        self.answers_url = '/api/%d/answers/' % self.quiz.id
+
+    def _submit(self, data):
+        response = self.client.post(self.answers_url, json.dumps(data),
+                                    content_type='application/json')
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def test_definition(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        definition = json.loads(response.content.decode('utf-8'))
+
+        self.assertEqual(len(definition['questions']), 3)
+        self.assertEqual(definition['questions'][0]['options'],
+                         [{'id': self.options[0].id, 'text': 'option_text_0'},
+                          {'id': self.options[1].id, 'text': 'option_text_1'}])
+        self.assertNotIn('score', response.content.decode('utf-8'))
+        self.assertEqual(definition['version'], plan_cache.get(self.quiz.id).version)
+        self.assertEqual(response['ETag'], '"%s"' % plan_cache.get(self.quiz.id).content_version)
+
+    def test_unknown_quiz(self):
+        unknown_id = self.quiz.id + 1000
+        self.assertEqual(self.client.get('/api/%d/' % unknown_id).status_code, 404)
+        response = self.client.post('/api/%d/answers/' % unknown_id,
+                                    json.dumps({'version': 'x', 'options': []}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Attempt.objects.exists())
+        self.assertEqual(len(plan_cache), 0)
+
+    def test_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.options[0].text = 'changed'
+        self.options[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified(self):
+        response = self.client.get(self.url)
+        self.assertIn('public', response['Cache-Control'])
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_submit_page(self):
+        response, result = self._submit({'page': 0,
+                                         'options': [self.options[0].id, self.options[3].id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result['score'], 28)
+        self.assertEqual(result['sugestion']['worst'],
+                         {'text': 'for worst: question_text_1<option_text_1> -> <option_text_0>',
+                          'score_change': -25})
+        self.assertFalse(Attempt.objects.exists())
+
+    def test_submit_all(self):
+        response, result = self._submit({'options': [self.options[0].id,
+                                                     self.options[3].id,
+                                                     self.options[4].id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result['score'], 50)
+        self.assertEqual(result['max_score'], 50)
+        self.assertEqual(len(result['sugestions']), 2)
+        self.assertEqual(Attempt.objects.get().score, 50)
+
+    def test_submit_errors(self):
+        response, result = self._submit({'options': [self.options[0].id]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(result['pages']), ['0', '1'])
+
+        response, result = self._submit({'options': [0]})
+        self.assertEqual(response.status_code, 400)
+
+        response, result = self._submit({'options': [], 'page': 5})
+        self.assertEqual(response.status_code, 400)
+
+        response, result = self._submit({'options': [], 'version': 'old'})
+        self.assertEqual(response.status_code, 409)
+
+        response = self.client.post(self.answers_url, 'not json',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def _assert_unserved(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        # conditional requests get the 400 too
+        etag = '"%s"' % plan_cache.get(self.quiz.id).content_version
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag,
+                                   HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 400)
+
+        response, result = self._submit({'options': [self.options[0].id]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sampled_quiz(self):
+        Quiz.objects.filter(id=self.quiz.id).update(sample_size=2)
+        plan_cache.clear()
+
+        self._assert_unserved()
+
+    def test_lazy_quiz(self):
+        Quiz.objects.filter(id=self.quiz.id).update(lazy_pages=True)
+        plan_cache.clear()
+
+        self._assert_unserved()
@@ -0,0 +1,54 @@
+from django.test import TestCase
+
+from ..attempts import record_attempt
+from ..models import Quiz, Question, Option, Attempt, AttemptAnswer
+from ..plans import QuizPlan
+from ..progress import QuizProgress
+
+
+class TestRecordAttempt(TestCase):
+    def _make_quiz(self, question_count):
+        quiz = Quiz.objects.create(name='quiz', description='description')
+        questions = Question.objects.bulk_create([Question(quiz=quiz, text='question_text')
+                                                  for _ in range(question_count)])
+        questions = Question.objects.filter(quiz=quiz)
+        Option.objects.bulk_create([Option(question=question, scor=score, text='option_text')
+                                    for question in questions
+                                    for score in (-1, 2)])
+        return QuizPlan.load(quiz.id)
+
+    def test_record_attempt(self):
+        plan = self._make_quiz(3)
+        progress = QuizProgress.for_plan(plan, 2)
+        progress.current_score = [1, 2]
+        progress.set_selected(1, True)
+        progress.set_selected(2, True)
+        progress.set_selected(4, True)
+
+        attempt = record_attempt(plan, progress)
+
+        attempt = Attempt.objects.get(id=attempt.id)
+        self.assertEqual(attempt.quiz_id, plan.quiz_id)
+        self.assertEqual(attempt.score, 3)
+        self.assertEqual(set(AttemptAnswer.objects.filter(attempt=attempt)
+                                                  .values_list('option_id', flat=True)),
+                         set([plan.options[1].id, plan.options[2].id, plan.options[4].id]))
+
+    def test_query_count_does_not_depend_on_quiz_size(self):
+        # up to the SQLite limit of 999 variables per bulk INSERT
+        for question_count in (1, 50, 240):
+            plan = self._make_quiz(question_count)
+            progress = QuizProgress.for_plan(plan, 2)
+            for option in plan.options:
+                progress.set_selected(option.index, True)
+
+            # the first attempt of a quiz creates its analytics rows
+            record_attempt(plan, progress)
+
+            # in a savepoint inside the test transaction: the attempt and answers
+            # INSERTs, the score count UPDATE, the option pick counts SELECT and UPDATE,
+            # the leaderboard SELECT and INSERT
+            with self.assertNumQueries(9):
+                attempt = record_attempt(plan, progress)
+            self.assertEqual(AttemptAnswer.objects.filter(attempt=attempt).count(),
+                             question_count * 2)
@@ -0,0 +1,65 @@
+from django.test import TestCase
+
+import mock
+
+from .. import benchmarks
+
+
+class TestBenchmarks(TestCase):
+    @mock.patch.object(benchmarks, 'MIN_TIMING_SECONDS', 0)
+    def test_run(self):
+        results = benchmarks.run_benchmarks(sizes=[10, 20], repeat=1)
+
+        self.assertEqual(sorted(results), sorted(benchmarks.HELPERS))
+        # the QuizView helpers are timed by default, with the engine replacing them
+        for name in ('get_question_mapping', '_get_context_question_list',
+                     '_compute_sugestions', '_find_best_option', '_calculate_max_score'):
+            self.assertIn(name, results)
+        for name in benchmarks.HELPERS:
+            self.assertEqual(sorted(results[name]), ['10', '20'])
+            self.assertTrue(results[name]['10']['seconds'] > 0)
+            self.assertIn('peak_kb', results[name]['10'])
+
+    @mock.patch.object(benchmarks, 'MIN_TIMING_SECONDS', 0)
+    def test_reference_helpers(self):
+        results = benchmarks.run_benchmarks(sizes=[10], helpers=benchmarks.REFERENCE_HELPERS,
+                                            repeat=1)
+        self.assertEqual(sorted(results), sorted(benchmarks.REFERENCE_HELPERS))
+
+    @mock.patch.object(benchmarks, 'tracemalloc', None)
+    def test_peak_rss(self):
+        if not benchmarks._reset_peak_rss():
+            self.skipTest('the peak RSS cannot be reset')
+        peak_kb = benchmarks._peak_kb(lambda: bytearray(16 * 1024 * 1024))
+        # to the page
+        self.assertTrue(peak_kb >= 15 * 1024, peak_kb)
+
+    @mock.patch.object(benchmarks, 'MIN_TIMING_SECONDS', 0)
+    def test_tuple_loader_uses_less_memory(self):
+        results = benchmarks.run_benchmarks(sizes=[5000], repeat=1,
+                                            helpers=['load_plan', 'load_plan_models'])
+        tuples, models = results['load_plan']['5000'], results['load_plan_models']['5000']
+        if models['peak_kb'] is None:
+            self.skipTest('the peak memory cannot be measured')
+        self.assertTrue(tuples['peak_kb'] * 2 < models['peak_kb'], (tuples, models))
+
+    def test_compare(self):
+        baseline = {'_find_best_option': {'10': {'seconds': 0.001, 'peak_kb': 10.0},
+                                          '100': {'seconds': 0.01, 'peak_kb': None}}}
+        results = {'_find_best_option': {'10': {'seconds': 0.0011, 'peak_kb': 20.0},
+                                         '100': {'seconds': 0.02, 'peak_kb': 5.0},
+                                         '1000': {'seconds': 1.0, 'peak_kb': None}},
+                   '_calculate_max_score': {'10': {'seconds': 1.0, 'peak_kb': None}}}
+
+        regressions = benchmarks.compare(results, baseline, threshold=0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('_find_best_option with 10 options: peak_kb'))
+        self.assertTrue(regressions[1].startswith('_find_best_option with 100 options: seconds'))
+        self.assertIn('+100%', regressions[1])
+
+        self.assertEqual(benchmarks.compare(results, baseline, threshold=1.5), [])
+
+    def test_timer_noise_ignored(self):
+        baseline = {'_calculate_max_score': {'10': {'seconds': 1e-6, 'peak_kb': None}}}
+        results = {'_calculate_max_score': {'10': {'seconds': 3e-6, 'peak_kb': None}}}
+        self.assertEqual(benchmarks.compare(results, baseline), [])
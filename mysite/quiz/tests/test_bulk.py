@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+import mock
+
+from ..bulk import QuizImporter, clone_quiz, export_records
+from ..models import Quiz, Question, Option
+from ..plans import invalidate_quiz, plan_cache
+
+
+class TestImportExport(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+        self.records = []
+        for quiz_idx in range(2):
+            for question_idx in range(5):
+                self.records.append(('quiz_%d' % quiz_idx,
+                                     'description, "quoted" ñ',
+                                     'question_text_%d' % question_idx,
+                                     [('option_text_%d' % option_idx, option_idx - 1)
+                                      for option_idx in range(question_idx % 3)]))
+
+    def _path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def _exported(self, **kwargs):
+        # the keys are the ids of the quizzes, new ones once imported
+        return [record[:4] + (dict(record[4], key=None),)
+                for record in export_records(**kwargs)]
+
+    def _roundtrip(self, file_name):
+        QuizImporter(chunk_size=2).run(self.records)
+        self.assertEqual([record[:4] for record in export_records()], self.records)
+
+        # two quizzes of the same name, with their flags
+        Quiz.objects.filter(name='quiz_1').update(name='quiz_0', single_page=True,
+                                                  sample_size=3)
+        records = self._exported()
+        call_command('export_quizzes', self._path(file_name), stderr=StringIO())
+        Quiz.objects.all().delete()
+
+        out = StringIO()
+        call_command('import_quizzes', self._path(file_name), chunk_size=3, stdout=out)
+        self.assertIn('2 quizzes, 10 questions, 8 options', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(self._exported(chunk_size=2), records)
+        self.assertEqual(list(Quiz.objects.order_by('id')
+                                          .values_list('name', 'single_page', 'sample_size',
+                                                       'lazy_pages')),
+                         [('quiz_0', False, None, False), ('quiz_0', True, 3, False)])
+
+    def test_jsonl_roundtrip(self):
+        self._roundtrip('quizzes.jsonl')
+
+    def test_csv_roundtrip(self):
+        self._roundtrip('quizzes.csv')
+
+    def test_csv_without_quiz_fields(self):
+        with open(self._path('quiz.csv'), 'wb') as fileobj:
+            fileobj.write(b'quiz,description,question,option,score\n'
+                          b'quiz,,q0,a,1\n'
+                          b',,,b,2\n'
+                          b'quiz,,q1,,\n')
+        call_command('import_quizzes', self._path('quiz.csv'), stdout=StringIO())
+
+        quiz = Quiz.objects.get()
+        self.assertEqual((quiz.name, quiz.single_page, quiz.max_score), ('quiz', False, 3))
+        self.assertEqual(quiz.question_set.count(), 2)
+
+    def test_import_computes_stats(self):
+        with open(self._path('quiz.jsonl'), 'wb') as fileobj:
+            fileobj.write(b'{"quiz": "quiz", "question": "q0", "options": '
+                          b'[{"text": "a", "score": 3}, {"text": "b", "score": -2}]}\n'
+                          b'{"quiz": "quiz", "question": "q1", "options": []}\n')
+        call_command('import_quizzes', self._path('quiz.jsonl'), stdout=StringIO())
+
+        quiz = Quiz.objects.get()
+        self.assertEqual(quiz.max_score, 3)
+        question = Question.objects.get(text='q0')
+        self.assertEqual(question.option_count, 2)
+        self.assertEqual(Question.objects.get(text='q1').option_count, 0)
+        self.assertEqual(Option.objects.count(), 2)
+
+    def test_plan_loaded_during_import(self):
+        plans = []
+
+        def progress(importer):
+            # a request loading the plan between two chunks
+            plans.append(plan_cache.get(importer.quiz_ids[-1]))
+        importer = QuizImporter(chunk_size=2, progress=progress)
+        importer.run(('quiz', '', 'question %d' % question_no, [('option', 1)])
+                     for question_no in range(3))
+
+        self.assertEqual(len(plans[0].questions), 2)
+        plan = plan_cache.get(importer.quiz_ids[0])
+        self.assertEqual((len(plan.questions), plan.scoring.max_score), (3, 3))
+
+    def test_clone_quiz(self):
+        importer = QuizImporter()
+        importer.run(self.records)
+        quiz_id = importer.quiz_ids[0]
+        Quiz.objects.filter(id=quiz_id).update(single_page=True, sample_size=3)
+
+        clone_id = clone_quiz(quiz_id, chunk_size=2)
+        clone = Quiz.objects.get(id=clone_id)
+        self.assertEqual(clone.name, 'quiz_0 (copy)')
+        self.assertEqual((clone.single_page, clone.sample_size, clone.lazy_pages),
+                         (True, 3, False))
+        self.assertEqual(clone.max_score, Quiz.objects.get(id=quiz_id).max_score)
+        self.assertEqual([record[1:4] for record in export_records([clone_id])],
+                         [record[1:4] for record in export_records([quiz_id])])
+
+        # a request loading the plan of the clone before its flags are copied
+        def invalidate_and_load(quiz_id):
+            invalidate_quiz(quiz_id)
+            plan_cache.get(quiz_id)
+        with mock.patch('quiz.bulk.invalidate_quiz', side_effect=invalidate_and_load):
+            clone_id = clone_quiz(quiz_id, chunk_size=2)
+        self.assertEqual(plan_cache.get(clone_id).sample_size, 3)
+
+        empty_id = Quiz.objects.create(name='empty', description='').id
+        clone = Quiz.objects.get(id=clone_quiz(empty_id, name='empty clone'))
+        self.assertEqual(clone.name, 'empty clone')
+        self.assertFalse(clone.question_set.exists())
@@ -0,0 +1,521 @@
+import random
+
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+import mock
+
+from .. import views
+from ..bulk import QuizImporter
+from ..models import Quiz, Question, Option, Attempt
+from ..plans import plan_cache
+from ..progress import QuizProgress, SignedCookieProgressStore
+from ..stats import rebuild_stats
+
+
+class TestQuizFlow(TestCase):
+    '''Drives a whole quiz through the URLconf'''
+
+    def setUp(self):
+        plan_cache.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        self.options = []
+        it_scores = iter([10, 0, -7, 18, 22, -40])
+        for q_idx in range(3):
+            q = Question.objects.create(quiz=self.quiz,
+                                        text='question_text_' + str(q_idx))
+            for o_idx in range(2):
+                self.options.append(Option.objects.create(question=q,
+                                                          scor=next(it_scores),
+                                                          text='option_text_' + str(o_idx)))
+        self.url = '/%d/' % self.quiz.id
+
+    def _post(self, options, button):
+        data = dict(('option_' + str(option.id), 'on') for option in options)
+        data[button] = button
+        return self.client.post(self.url, data)
+
+    def test_full_quiz(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_0')
+        self.assertContains(response, 'question_text_1')
+
+        # no option selected on the second question
+        self._post(self.options[:1], 'Next')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'ERROR')
+        self.assertContains(response, 'question_text_0')
+
+        self._post([self.options[0], self.options[3]], 'Next')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_2')
+
+        self._post([self.options[4]], 'Finish')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Score: 50 / 50')
+
+        attempt = Attempt.objects.get(quiz=self.quiz)
+        self.assertEqual(attempt.score, 50)
+        self.assertEqual(set(attempt.attemptanswer_set.values_list('option_id', flat=True)),
+                         set([self.options[0].id, self.options[3].id, self.options[4].id]))
+
+    def test_unknown_quiz(self):
+        url = '/%d/' % (self.quiz.id + 1000)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        data = dict(('option_' + str(option.id), 'on') for option in self.options[::2])
+        data['Finish'] = 'Finish'
+        self.assertEqual(self.client.post(url, data).status_code, 404)
+        self.assertFalse(Attempt.objects.exists())
+        self.assertEqual(len(plan_cache), 0)
+        self.assertEqual(self.client.get('/abc/').status_code, 404)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # the selection is shown on the page
+        self._post([self.options[0], self.options[3]], 'Next')
+        self._post([self.options[4]], 'Previous')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # an error is only shown once
+        self._post([], 'Next')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'ERROR')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_previous_keeps_selection(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        self._post([self.options[5]], 'Previous')
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_0')
+        self.assertContains(response, 'checked', count=2)
+
+    def test_sugestions_after_previous(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        self._post([self.options[5]], 'Previous')
+        # the first page is changed: question_text_0 has now the best option unselected
+        self._post([self.options[1], self.options[3]], 'Next')
+        self._post([self.options[4]], 'Finish')
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Score: 40 / 50')
+        self.assertContains(response, 'for best: question_text_0&lt;option_text_1&gt; -&gt; '
+                                      '&lt;option_text_0&gt;. Score changing by 10')
+        self.assertContains(response, 'for worst: question_text_2&lt;option_text_0&gt; -&gt; '
+                                      '&lt;option_text_1&gt;. Score changing by -62')
+
+    def test_edited_texts_and_scores_keep_progress(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        Option.objects.filter(id=self.options[0].id).update(scor=5)
+        self.options[4].text = 'changed'
+        self.options[4].scor = 30
+        self.options[4].save()
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_2')
+        self.assertContains(response, 'changed')
+        self.assertNotContains(response, 'ERROR')
+
+        # scored with the current scores
+        self._post([self.options[4]], 'Finish')
+        self.assertContains(self.client.get(self.url), 'Score: 53 / 53')
+        self.assertEqual(Attempt.objects.get(quiz=self.quiz).score, 53)
+
+    def test_changed_options_restart_with_a_message(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        Option.objects.create(question=self.options[4].question, scor=1, text='new')
+
+        # the answers posted for the changed quiz are not applied
+        self._post([self.options[4]], 'Finish')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'The quiz was changed')
+        self.assertContains(response, 'question_text_0')
+        self.assertNotContains(response, 'checked')
+        self.assertFalse(Attempt.objects.exists())
+
+        self.assertNotContains(self.client.get(self.url), 'The quiz was changed')
+
+    def test_compact_session(self):
+        self.client.get(self.url)
+        session = self.client.session
+        self.assertEqual(list(session.keys()), ['quiz_progress'])
+        self.assertNotIn('option_text', repr(session['quiz_progress']))
+
+
+class TestSignedCookieQuizFlow(TestQuizFlow):
+    '''Same flow with the progress kept in a signed cookie'''
+
+    def setUp(self):
+        super(TestSignedCookieQuizFlow, self).setUp()
+        patcher = mock.patch.object(views.quiz_view, 'progress_store',
+                                    SignedCookieProgressStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_compact_session(self):
+        self._post(self.options[:2], 'Next')
+        self.client.get(self.url)
+        self.assertFalse(Session.objects.exists())
+        self.assertIn('quiz_progress_%d' % self.quiz.id, self.client.cookies)
+
+    def test_tampered_token_restarts(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        self.client.cookies['quiz_progress_%d' % self.quiz.id] = 'tampered'
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_0')
+        self.assertNotContains(response, 'checked')
+
+    def test_cookie_removed_on_finish(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        self._post([self.options[4]], 'Finish')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Score: 50 / 50')
+        self.assertEqual(response.cookies['quiz_progress_%d' % self.quiz.id].value, '')
+
+    def test_replayed_cookie_recorded_once(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        self._post([self.options[4]], 'Finish')
+        cookie_name = 'quiz_progress_%d' % self.quiz.id
+        token = self.client.cookies[cookie_name].value
+        self.assertContains(self.client.get(self.url), 'Score: 50 / 50')
+
+        self.client.cookies[cookie_name] = token
+        self.assertContains(self.client.get(self.url), 'Score: 50 / 50')
+        self.assertEqual(Attempt.objects.filter(quiz=self.quiz).count(), 1)
+
+    def test_large_quiz_token_size(self):
+        importer = QuizImporter()
+        importer.run(('large quiz', 'description', 'question %d' % question_no,
+                      [('option %d' % option_no, option_no) for option_no in range(4)])
+                     for question_no in range(500))
+        plan = plan_cache.get(importer.quiz_ids[0])
+
+        # every page submitted with random options selected
+        progress = QuizProgress.for_plan(plan, views.quiz_view.questions_per_page)
+        rand = random.Random(0)
+        for option in plan.options:
+            progress.set_selected(option.index, rand.random() < 0.5)
+        progress.current_page_no = progress.last_page_no
+        progress.page_sugestions = plan.scoring.change_records(
+            plan.scoring.selection_mask(progress), views.quiz_view.questions_per_page)
+
+        response = HttpResponse()
+        request = RequestFactory().get('/')
+        request.session = {}
+        views.quiz_view.progress_store.save(request, response, progress)
+        token = response.cookies['quiz_progress_%d' % plan.quiz_id].value
+        self.assertTrue(len(token) < 1500, len(token))
+        self.assertEqual(request.session, {})
+
+
+class TestOversizedCookieQuizFlow(TestQuizFlow):
+    '''Same flow with a progress too large for a cookie, kept in the session'''
+
+    def setUp(self):
+        super(TestOversizedCookieQuizFlow, self).setUp()
+        patcher = mock.patch.object(views.quiz_view, 'progress_store',
+                                    SignedCookieProgressStore(max_bytes=20))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_compact_session(self):
+        self._post(self.options[:2], 'Next')
+        session = self.client.session
+        self.assertEqual(list(session.keys()), ['quiz_progress'])
+        self.assertNotIn('option_text', repr(session['quiz_progress']))
+
+    def test_no_cookie(self):
+        self._post([self.options[0], self.options[3]], 'Next')
+        self.assertNotIn('quiz_progress_%d' % self.quiz.id, self.client.cookies)
+        self._post([self.options[4]], 'Finish')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Score: 50 / 50')
+        self.assertNotIn('quiz_progress', self.client.session)
+
+
+class TestLazyQuizFlow(TestQuizFlow):
+    '''Same flow with the questions loaded page by page'''
+
+    def setUp(self):
+        super(TestLazyQuizFlow, self).setUp()
+        Quiz.objects.filter(id=self.quiz.id).update(lazy_pages=True)
+        plan_cache.clear()
+
+    def test_loads_only_the_page(self):
+        self.client.get(self.url)
+        self.assertEqual(len(plan_cache.get(self.quiz.id)._pages), 1)
+        self._post(self.options[:3:2], 'Next')
+        self.client.get(self.url)
+        self.assertEqual(len(plan_cache.get(self.quiz.id)._pages), 2)
+
+    def test_edited_texts_and_scores_keep_progress(self):
+        # the content is not loaded: any edit of the quiz changes the version
+        self._post([self.options[0], self.options[3]], 'Next')
+        self.options[4].text = 'changed'
+        self.options[4].save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'The quiz was changed')
+        self.assertContains(response, 'question_text_0')
+
+    def test_stale_option_counts(self):
+        self._post(self.options[:3:2], 'Next')
+        # written without signals, the option_count of the next question is not updated
+        question = self.options[4].question
+        Option.objects.bulk_create([Option(question=question, scor=5, text='new')])
+
+        # not served until the counts are rebuilt, nothing written meanwhile
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(Question.objects.get(id=question.id).option_count, 2)
+
+        # the quiz starts again from the reloaded plan
+        rebuild_stats([self.quiz.id])
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_0')
+        self.assertNotContains(response, 'checked')
+        self._post(self.options[:3:2], 'Next')
+        self.assertContains(self.client.get(self.url), 'new')
+
+
+class TestSinglePageQuizFlow(TestCase):
+    '''The quiz of TestQuizFlow shown in one form'''
+
+    def setUp(self):
+        plan_cache.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description', single_page=True)
+        self.options = []
+        it_scores = iter([10, 0, -7, 18, 22, -40])
+        for q_idx in range(3):
+            q = Question.objects.create(quiz=self.quiz,
+                                        text='question_text_' + str(q_idx))
+            for o_idx in range(2):
+                self.options.append(Option.objects.create(question=q,
+                                                          scor=next(it_scores),
+                                                          text='option_text_' + str(o_idx)))
+        self.url = '/%d/' % self.quiz.id
+
+    def _post(self, options):
+        data = dict(('option_' + str(option.id), 'on') for option in options)
+        data['Finish'] = 'Finish'
+        return self.client.post(self.url, data)
+
+    def test_full_quiz(self):
+        response = self.client.get(self.url)
+        for q_idx in range(3):
+            self.assertContains(response, 'question_text_' + str(q_idx))
+        self.assertContains(response, 'Page 1')
+        self.assertNotContains(response, 'Page 2')
+
+        # no option selected on the second question and the third one
+        response = self.client.post(self.url, {'option_' + str(self.options[0].id): 'on',
+                                               'Finish': 'Finish'})
+        self.assertContains(response, 'ERROR', count=2)
+        self.assertContains(response, 'checked', count=1)
+        self.assertFalse(Attempt.objects.exists())
+
+        response = self._post([self.options[0], self.options[3], self.options[4]])
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Score: 50 / 50')
+        self.assertContains(response, 'Page 2')
+        self.assertEqual(Attempt.objects.get(quiz=self.quiz).score, 50)
+        self.assertNotIn('quiz_progress', self.client.session)
+
+        # reloading the result starts the quiz again, the attempt is recorded once
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Finish')
+        self.assertEqual(Attempt.objects.filter(quiz=self.quiz).count(), 1)
+
+    def test_sugestions(self):
+        self._post([self.options[1], self.options[3], self.options[4]])
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Score: 40 / 50')
+        self.assertContains(response, 'for best: question_text_0&lt;option_text_1&gt; -&gt; '
+                                      '&lt;option_text_0&gt;. Score changing by 10')
+        self.assertContains(response, 'for worst: question_text_2&lt;option_text_0&gt; -&gt; '
+                                      '&lt;option_text_1&gt;. Score changing by -62')
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+
+class TestSampledQuizFlow(TestCase):
+    '''Each attempt gets 3 random questions of a pool of 12'''
+
+    def setUp(self):
+        plan_cache.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description', sample_size=3)
+        self.questions = {}
+        for q_idx in range(12):
+            q = Question.objects.create(quiz=self.quiz, text='question_text_%d_' % q_idx)
+            self.questions[q.id] = [Option.objects.create(question=q, scor=scor,
+                                                          text='option_text_' + str(scor))
+                                    for scor in (q_idx, -q_idx)]
+        self.url = '/%d/' % self.quiz.id
+
+    def _drawn(self):
+        return self.client.session['quiz_progress']['question_ids']
+
+    def _post(self, question_ids, button):
+        data = dict(('option_' + str(self.questions[question_id][0].id), 'on')
+                    for question_id in question_ids)
+        data[button] = button
+        return self.client.post(self.url, data)
+
+    def test_full_quiz(self):
+        response = self.client.get(self.url)
+        drawn = self._drawn()
+        self.assertEqual(len(drawn), 3)
+        self.assertEqual(len(set(drawn)), 3)
+        self.assertTrue(set(drawn) <= set(self.questions))
+        for question_id in drawn[:2]:
+            self.assertContains(response, Question.objects.get(id=question_id).text)
+
+        # the drawn questions stay the same for the whole attempt
+        self.client.get(self.url)
+        self._post(drawn[:2], 'Next')
+        response = self.client.get(self.url)
+        self.assertEqual(self._drawn(), drawn)
+        self.assertContains(response, Question.objects.get(id=drawn[2]).text)
+
+        self._post(drawn[2:], 'Finish')
+        response = self.client.get(self.url)
+        max_score = sum(self.questions[question_id][0].scor for question_id in drawn)
+        self.assertContains(response, 'Score: %d / %d' % (max_score, max_score))
+        attempt = Attempt.objects.get(quiz=self.quiz)
+        self.assertEqual(attempt.max_score, max_score)
+        self.assertEqual(set(attempt.attemptanswer_set.values_list('option_id', flat=True)),
+                         set(self.questions[question_id][0].id for question_id in drawn))
+
+    def test_loads_only_the_sample(self):
+        self.client.get(self.url)
+        with mock.patch('quiz.chunks.CHUNK_SIZE', 2):
+            with self.assertNumQueries(5):      # session, 2 chunks of questions and options
+                self.client.get(self.url)
+
+    def test_drawn_question_deleted(self):
+        self.client.get(self.url)
+        drawn = self._drawn()
+        Question.objects.filter(id=drawn[0]).delete()
+
+        self.client.get(self.url)
+        self.assertNotIn(drawn[0], self._drawn())
+        self.assertEqual(len(self._drawn()), 3)
+
+    def test_sample_larger_than_pool(self):
+        Quiz.objects.filter(id=self.quiz.id).update(sample_size=20)
+        plan_cache.clear()
+        self.client.get(self.url)
+        self.assertEqual(sorted(self._drawn()), sorted(self.questions))
+
+    def test_single_page(self):
+        Quiz.objects.filter(id=self.quiz.id).update(single_page=True)
+        plan_cache.clear()
+
+        response = self.client.get(self.url)
+        drawn = self._drawn()
+        for question_id in drawn:
+            self.assertContains(response, Question.objects.get(id=question_id).text)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self._drawn(), drawn)
+
+        self._post(drawn, 'Finish')
+        response = self.client.get(self.url)
+        max_score = sum(self.questions[question_id][0].scor for question_id in drawn)
+        self.assertContains(response, 'Score: %d / %d' % (max_score, max_score))
+        self.assertNotIn('quiz_progress', self.client.session)
+
+
+class TestSignedCookieSampledQuizFlow(TestSampledQuizFlow):
+    '''Same flow with the drawn questions kept in the progress cookie'''
+
+    def setUp(self):
+        super(TestSignedCookieSampledQuizFlow, self).setUp()
+        store = SignedCookieProgressStore()
+        patcher = mock.patch.object(views.quiz_view, 'progress_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = store
+
+    def _drawn(self):
+        cookie = self.client.cookies['quiz_progress_%d' % self.quiz.id]
+        return signing.loads(cookie.value, salt=self.store.salt)['question_ids']
+
+    def test_loads_only_the_sample(self):
+        self.client.get(self.url)
+        with mock.patch('quiz.chunks.CHUNK_SIZE', 2):
+            with self.assertNumQueries(4):      # 2 chunks of questions and options
+                self.client.get(self.url)
+
+    def test_single_page(self):
+        Quiz.objects.filter(id=self.quiz.id).update(single_page=True)
+        plan_cache.clear()
+
+        self.client.get(self.url)
+        drawn = self._drawn()
+        self._post(drawn, 'Finish')
+        response = self.client.get(self.url)
+        max_score = sum(self.questions[question_id][0].scor for question_id in drawn)
+        self.assertContains(response, 'Score: %d / %d' % (max_score, max_score))
+        self.assertEqual(response.cookies['quiz_progress_%d' % self.quiz.id].value, '')
+
+
+class TestPageFragmentCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        question = Question.objects.create(quiz=self.quiz, text='question <b>text</b>')
+        self.options = [Option.objects.create(question=question, scor=score,
+                                              text='option_text_' + str(score))
+                        for score in (1, 2)]
+        self.url = '/%d/' % self.quiz.id
+
+    def test_selection_applied_on_cached_fragment(self):
+        self.client.get(self.url)
+        with mock.patch('quiz.views.render_to_string') as mock_render_to_string:
+            # no button: only the selection is saved
+            self.client.post(self.url, {'option_' + str(self.options[1].id): 'on'})
+            response = self.client.get(self.url)
+        self.assertFalse(mock_render_to_string.called)
+
+        self.assertContains(response, 'question &lt;b&gt;text&lt;/b&gt;')
+        self.assertContains(response, 'checked', count=1)
+        content = response.content.decode('utf-8')
+        self.assertTrue(content.index('checked') > content.index('option_text_1'))
+
+    def test_invalidated_on_edit(self):
+        self.client.get(self.url)
+        self.options[0].text = 'changed'
+        self.options[0].save()
+
+        response = self.client.get(self.url)
+        self.assertContains(response, 'changed')
+
+    def test_sampled_plan_not_cached(self):
+        Quiz.objects.filter(id=self.quiz.id).update(sample_size=1)
+        plan_cache.clear()
+
+        with mock.patch.object(cache, 'set') as mock_set:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'option_text_1')
+        self.assertFalse([args for args, _ in mock_set.call_args_list
+                          if args[0].startswith('quiz:page:')])
@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..models import Quiz
+from ..pagecache import INDEX_GENERATION_KEY, index_page_key, invalidate_index
+from ..transactions import run_deferred
+
+
+@override_settings(QUIZ_INDEX_PAGE_SIZE=2)
+class TestIndexView(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.quizzes = [Quiz.objects.create(name='quiz_%d' % idx, description='description')
+                        for idx in range(5)]
+
+    def test_keyset_pagination(self):
+        response = self.client.get('/')
+        self.assertContains(response, 'quiz_0 - description')
+        self.assertContains(response, 'quiz_1 - description')
+        self.assertNotContains(response, 'quiz_2')
+        self.assertContains(response, '?after=%d' % self.quizzes[1].id)
+
+        response = self.client.get('/?after=%d' % self.quizzes[3].id)
+        self.assertContains(response, 'quiz_4')
+        self.assertNotContains(response, 'quiz_3')
+        self.assertNotContains(response, 'Next page')
+
+        response = self.client.get('/?after=bad')
+        self.assertContains(response, 'quiz_0')
+
+    def test_cached_until_quiz_changes(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, 'quiz_0')
+
+        self.quizzes[0].name = 'renamed'
+        self.quizzes[0].save()
+        response = self.client.get('/')
+        self.assertContains(response, 'renamed - description')
+
+        self.quizzes[1].delete()
+        response = self.client.get('/')
+        self.assertNotContains(response, 'quiz_1')
+        self.assertContains(response, 'quiz_2')
+
+    def test_evicted_generation(self):
+        cache.clear()
+        self.client.get('/')
+        # the generation is evicted while the page stays cached, then bumped
+        cache.delete(INDEX_GENERATION_KEY)
+        Quiz.objects.filter(id=self.quizzes[0].id).update(name='renamed')
+        invalidate_index()
+        self.assertContains(self.client.get('/'), 'renamed - description')
+
+    def test_only_reached_pages_cached(self):
+        # a cursor no page links to
+        after = self.quizzes[2].id
+        self.client.get('/?after=%d' % after)
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get('/?after=%d' % after), 'quiz_3')
+
+        # the page linked from the first one
+        after = self.quizzes[1].id
+        self.client.get('/?after=%d' % after)
+        with self.assertNumQueries(1):
+            self.client.get('/?after=%d' % after)
+        self.client.get('/')
+        self.client.get('/?after=%d' % after)
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get('/?after=%d' % after), 'quiz_2')
+
+    def test_conditional_get(self):
+        response = self.client.get('/')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # another page has its own ETag
+        response = self.client.get('/?after=%d' % self.quizzes[1].id, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.quizzes[0].name = 'renamed'
+        self.quizzes[0].save()
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'renamed - description')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class TestIndexCommit(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+
+    def test_page_rendered_before_commit(self):
+        self.client.get('/')
+        old_page = cache.get(index_page_key(0))
+
+        def concurrent_request(sender, instance, **kwargs):
+            # another process renders the committed rows, the old ones, after
+            # the generation is bumped and before the commit
+            cache.set(index_page_key(0), old_page)
+        post_save.connect(concurrent_request, sender=Quiz)
+        self.addCleanup(post_save.disconnect, concurrent_request, sender=Quiz)
+
+        with transaction.atomic():
+            self.quiz.name = 'renamed'
+            self.quiz.save()
+        if not hasattr(transaction, 'on_commit'):
+            # Django 1.8 invalidates the index again once the request finishes
+            run_deferred()
+        self.assertContains(self.client.get('/'), 'renamed - description')
@@ -0,0 +1,86 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from ..attempts import AttemptRecord, save_attempts
+from ..leaderboard import TopAttempts, approximate_rank, top_scores
+from ..models import Quiz, Question, Option, LeaderboardEntry
+from ..plans import plan_cache
+
+
+class TestTopAttempts(TestCase):
+    def test_push(self):
+        top = TopAttempts(2)
+        now = timezone.now()
+        self.assertIsNone(top.push(5, 1, now))
+        self.assertIsNone(top.push(3, 2, now))
+        # not better than the worst one
+        self.assertEqual(top.push(3, 3, now), 3)
+        self.assertEqual(top.push(1, 4, now), 4)
+        # replaces the worst one
+        self.assertEqual(top.push(4, 5, now), 2)
+        # an earlier attempt with the same score stays
+        self.assertEqual(top.push(4, 6, now), 6)
+
+    def test_trimmed_to_size(self):
+        now = timezone.now()
+        top = TopAttempts(2, [(1, 1, now), (3, 2, now), (3, 3, now)])
+        self.assertEqual(top.evicted, [1])
+        self.assertEqual(top.push(3, 4, now), 4)
+
+
+@override_settings(QUIZ_LEADERBOARD_SIZE=3)
+class TestLeaderboard(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        question = Question.objects.create(quiz=self.quiz, text='question_text')
+        self.options = [Option.objects.create(question=question, scor=o_idx,
+                                              text='option_text_' + str(o_idx))
+                        for o_idx in range(2)]
+
+    def _records(self, *scores):
+        return [AttemptRecord(self.quiz.id, score, 10, [self.options[0].id], timezone.now())
+                for score in scores]
+
+    def _entries(self):
+        return list(LeaderboardEntry.objects.order_by('-score', 'attempt')
+                                            .values_list('score', 'attempt_id'))
+
+    def test_incremental_update(self):
+        first = save_attempts(self._records(4, 2))
+        second = save_attempts(self._records(2, 7, 1, 9, 5))
+        self.assertEqual(self._entries(), [(9, second[3].id), (7, second[1].id), (5, second[4].id)])
+        self.assertEqual(LeaderboardEntry.objects.filter(attempt=first[0]).count(), 0)
+
+        save_attempts(self._records(5))
+        self.assertEqual([score for score, _ in top_scores(self.quiz.id)], [9, 7, 5])
+        self.assertEqual(self._entries()[-1], (5, second[4].id))
+
+    def test_rebuild_matches_incremental(self):
+        save_attempts(self._records(4, 2, 8))
+        save_attempts(self._records(8, 1, 6))
+        expected = self._entries()
+
+        LeaderboardEntry.objects.all().delete()
+        call_command('rebuild_quiz_analytics', stdout=StringIO())
+        self.assertEqual(self._entries(), expected)
+
+    def test_approximate_rank(self):
+        self.assertEqual(approximate_rank(self.quiz.id, 3), (1, 0))
+        save_attempts(self._records(4, 2, 8, 4))
+        self.assertEqual(approximate_rank(self.quiz.id, 9), (1, 4))
+        self.assertEqual(approximate_rank(self.quiz.id, 4), (2, 4))
+        self.assertEqual(approximate_rank(self.quiz.id, 2), (4, 4))
+
+    def test_result_page(self):
+        save_attempts(self._records(0, 0))
+        Quiz.objects.filter(id=self.quiz.id).update(single_page=True)
+        plan_cache.clear()
+
+        self.client.post('/%d/' % self.quiz.id,
+                         {'option_%d' % self.options[1].id: 'on', 'Finish': 'Finish'})
+        response = self.client.get('/%d/' % self.quiz.id)
+        self.assertContains(response, 'Rank: 1 of 3')
+        self.assertEqual([entry.score for entry in response.context['leaderboard']], [1, 0, 0])
@@ -0,0 +1,75 @@
+import json
+
+from django.test import TestCase
+
+from ..loadtest import LoadTest, create_quiz
+from ..models import Quiz, Question, Attempt
+from ..plans import plan_cache
+
+
+class TestLoadTest(TestCase):
+    # the users are run from the test thread: the in-memory test database
+    # is not shared with other threads
+
+    def setUp(self):
+        plan_cache.clear()
+        self.quiz_id = create_quiz(7, 3)
+
+    def test_report(self):
+        load_test = LoadTest(self.quiz_id, iterations=2, previous_rate=0.5, seed=3)
+        load_test.run_user(0)
+        report = load_test.report(elapsed=1.0)
+        json.dumps(report)
+
+        self.assertEqual(report['quiz'], {'id': self.quiz_id, 'questions': 7,
+                                          'options': 21, 'single_page': False})
+        steps = report['steps']
+        self.assertEqual(steps['start']['count'], 2)
+        self.assertEqual(steps['finish']['count'], 2)
+        self.assertEqual(steps['result']['count'], 2)
+        self.assertEqual(steps['page']['count'], steps['next']['count'] + steps['previous']['count'])
+        self.assertEqual(report['requests'], sum(step['count'] for step in steps.values()))
+        self.assertEqual(report['throughput_rps'], report['requests'])
+        self.assertTrue(steps['next']['p50_ms'] <= steps['next']['p99_ms'])
+        self.assertTrue(steps['finish']['queries']['mean'] > 0)
+        self.assertTrue(report['session_bytes']['max'] > 0)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(Attempt.objects.filter(quiz=self.quiz_id).count(), 2)
+
+    def test_sampled_quiz(self):
+        Quiz.objects.filter(id=self.quiz_id).update(sample_size=3)
+        plan_cache.clear()
+
+        load_test = LoadTest(self.quiz_id, iterations=3, previous_rate=0.5)
+        load_test.run_user(0)
+        report = load_test.report(elapsed=1.0)
+
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['steps']['result']['count'], 3)
+        self.assertEqual(Attempt.objects.filter(quiz=self.quiz_id).count(), 3)
+
+    def test_errors(self):
+        # a question without options can not be answered
+        Question.objects.create(quiz_id=self.quiz_id, text='no options')
+
+        load_test = LoadTest(self.quiz_id, iterations=2)
+        load_test.run_user(0)
+        report = load_test.report(elapsed=1.0)
+
+        self.assertEqual(report['errors'],
+                         ['user 0, iteration %d: validation error: Please fill all questions '
+                          'with at least one option!' % iteration for iteration in range(2)])
+        self.assertNotIn('result', report['steps'])
+        self.assertEqual(Attempt.objects.filter(quiz=self.quiz_id).count(), 0)
+
+    def test_single_page(self):
+        Quiz.objects.filter(id=self.quiz_id).update(single_page=True)
+        plan_cache.clear()
+
+        load_test = LoadTest(self.quiz_id)
+        load_test.run_user(0)
+        report = load_test.report(elapsed=1.0)
+
+        self.assertEqual(sorted(report['steps']), ['finish', 'result', 'start'])
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(Attempt.objects.filter(quiz=self.quiz_id).count(), 1)
@@ -0,0 +1,98 @@
+import re
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+import mock
+
+from .. import metrics
+from ..models import Quiz, Question, Option
+from ..plans import plan_cache
+
+
+class TestHistogram(TestCase):
+    def test_render(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(('view', 'step'), value)
+
+        self.assertEqual(histogram.render(), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="view",step="step",le="0.1"} 2',
+            'test_seconds_bucket{view="view",step="step",le="1.0"} 3',
+            'test_seconds_bucket{view="view",step="step",le="+Inf"} 4',
+            'test_seconds_sum{view="view",step="step"} 3.65',
+            'test_seconds_count{view="view",step="step"} 4'])
+
+
+@override_settings(QUIZ_METRICS_ENABLED=True, QUIZ_METRICS_ALLOWED_IPS=['127.0.0.1'])
+class TestQuizMetricsMiddleware(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        question = Question.objects.create(quiz=self.quiz, text='question_text_0')
+        self.option = Option.objects.create(question=question, scor=3, text='option_text_0')
+        self.url = '/%d/' % self.quiz.id
+
+    def _count(self, content, name, step):
+        match = re.search(r'^%s_count\{view="QuizView",step="%s"\} (\d+)$' % (name, step),
+                          content, re.M)
+        return int(match.group(1)) if match else 0
+
+    def test_quiz_steps(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.post(self.url, {'option_%d' % self.option.id: 'on', 'Finish': 'Finish'})
+        self.client.get(self.url)
+
+        response = self.client.get('/metrics/')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        content = response.content.decode('utf-8')
+
+        for step, count in (('init', 1), ('page_get', 1), ('page_post', 1), ('finish', 1)):
+            self.assertEqual(self._count(content, 'quiz_request_seconds', step), count)
+            self.assertEqual(self._count(content, 'quiz_db_queries', step), count)
+            self.assertEqual(self._count(content, 'quiz_template_render_seconds', step), count)
+        # the progress is saved in the session on init and page POST
+        self.assertEqual(self._count(content, 'quiz_session_save_seconds', 'init'), 1)
+        self.assertEqual(self._count(content, 'quiz_session_bytes', 'page_post'), 1)
+        self.assertEqual(self._count(content, 'quiz_session_load_seconds', 'page_post'), 1)
+
+        # the result page records the attempt
+        match = re.search(r'^quiz_db_queries_sum\{view="QuizView",step="finish"\} (\d+)$',
+                          content, re.M)
+        self.assertTrue(int(match.group(1)) > 0)
+        self.assertNotIn('quiz_attempt_queue_depth', content)
+
+    def test_attempt_writer_stats(self):
+        stats = dict((key, 0) for key, _, _ in metrics.WRITER_METRICS)
+        stats['queue_depth'] = 7
+        with mock.patch.object(metrics, 'attempt_writer_stats', return_value=stats):
+            response = self.client.get('/metrics/')
+        self.assertIn('# TYPE quiz_attempt_queue_depth gauge\nquiz_attempt_queue_depth 7\n',
+                      response.content.decode('utf-8'))
+
+
+class TestMetricsAccess(TestCase):
+    def test_disabled(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+    @override_settings(QUIZ_METRICS_ENABLED=True, QUIZ_METRICS_TOKEN='secret')
+    def test_access(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer other')
+                                    .status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+                                    .status_code, 200)
+        with override_settings(QUIZ_METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+        User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.login(username='user', password='password')
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        User.objects.filter(username='user').update(is_staff=True)
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
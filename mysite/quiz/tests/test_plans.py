@@ -0,0 +1,298 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+import mock
+
+from .. import views
+from ..checks import check_shared_cache
+from ..lru import LRU
+from ..models import Quiz, Question, Option
+from ..plans import PlanCache, QuizPlan, StalePlan, load_question_rows, plan_cache
+from ..progress import QuizProgress
+from ..stats import rebuild_stats
+from ..transactions import run_deferred
+
+
+class TestLRU(TestCase):
+    def test_bound_and_recency(self):
+        lru = LRU(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        lru.set('c', 3)
+        self.assertEqual(lru.keys(), ['a', 'c'])
+        self.assertIsNone(lru.get('b'))
+
+        lru.discard_keys(lambda key: key == 'a')
+        self.assertEqual(lru.keys(), ['c'])
+        lru.clear()
+        self.assertEqual(len(lru), 0)
+
+
+class TestPlanCache(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        for q_idx in range(2):
+            q = Question.objects.create(quiz=self.quiz,
+                                        text='question_text_' + str(q_idx))
+            for o_idx in range(2):
+                Option.objects.create(question=q, scor=o_idx,
+                                      text='option_text_' + str(o_idx))
+
+    def test_plan_is_cached(self):
+        plan = plan_cache.get(self.quiz.id)
+        self.assertEqual(len(plan.questions), 2)
+        self.assertEqual(len(plan.options), 4)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(plan_cache.get(self.quiz.id) is plan)
+            self.assertTrue(plan_cache.get(str(self.quiz.id)) is plan)
+
+    def test_init_session_without_queries(self):
+        class DummyRequest:
+            session = {}
+
+        plan_cache.get(self.quiz.id)
+        with self.assertNumQueries(0):
+            views.QuizView()._init_session(DummyRequest(), plan_cache.get(self.quiz.id))
+
+    def test_invalidated_on_change(self):
+        plan = plan_cache.get(self.quiz.id)
+
+        option = Option.objects.first()
+        option.text = 'changed'
+        option.save()
+        new_plan = plan_cache.get(self.quiz.id)
+        self.assertFalse(new_plan is plan)
+        # the same questions and options: the sessions are kept
+        self.assertEqual(new_plan.version, plan.version)
+        self.assertNotEqual(new_plan.content_version, plan.content_version)
+        self.assertEqual(new_plan.options[0].text, 'changed')
+
+        Question.objects.create(quiz=self.quiz, text='question_text_2')
+        self.assertEqual(len(plan_cache.get(self.quiz.id).questions), 3)
+
+        Question.objects.filter(quiz=self.quiz).delete()
+        self.assertEqual(plan_cache.get(self.quiz.id).questions, ())
+
+    def _in_other_process(self, func):
+        '''Runs func in a forked process, which has its own plan cache'''
+        pid = os.fork()
+        if pid == 0:
+            try:
+                func()
+            except BaseException:
+                os._exit(1)
+            os._exit(0)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+    def test_invalidated_in_other_processes(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': cache_dir}}
+        with override_settings(CACHES=file_cache):
+            plan = plan_cache.get(self.quiz.id)
+
+            # edited through another process: the DB is shared, its signals
+            # invalidate the plan in the shared cache
+            Option.objects.filter(question__quiz=self.quiz).update(text='changed')
+            Quiz.objects.filter(id=self.quiz.id).update(updated_at=timezone.now())
+            self._in_other_process(lambda: plan_cache.invalidate(self.quiz.id))
+
+            new_plan = plan_cache.get(self.quiz.id)
+            self.assertFalse(new_plan is plan)
+            self.assertEqual(new_plan.options[0].text, 'changed')
+
+            # evicted generations do not bring back stale plans
+            cache.clear()
+            self._in_other_process(lambda: plan_cache.invalidate(self.quiz.id))
+            self.assertFalse(plan_cache.get(self.quiz.id) is new_plan)
+
+    def test_per_process_cache_warning(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['quiz.W001'])
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': tempfile.gettempdir()}}):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_loaded_from_tuples(self):
+        question_list = Question.objects.filter(quiz=self.quiz).order_by('id').prefetch_related(
+            Prefetch('option_set', queryset=Option.objects.order_by('id')))
+        expected = QuizPlan.from_questions(self.quiz.id, question_list)
+
+        with self.assertNumQueries(3):      # quiz, questions, options
+            plan = QuizPlan.load(self.quiz.id)
+        self.assertEqual(plan.questions, expected.questions)
+        self.assertEqual(plan.version, expected.version)
+
+        # sliced and unsliced querysets
+        self.assertEqual(QuizPlan(None, load_question_rows(question_list)).questions,
+                         expected.questions)
+        self.assertEqual(
+            QuizPlan(None, load_question_rows(question_list.all()[1:])).question_mapping(),
+            QuizPlan.from_questions(None, list(question_list)[1:]).question_mapping())
+
+    def test_lru_bound(self):
+        cache = PlanCache(max_size=1)
+        other_quiz = Quiz.objects.create(name='other', description='')
+
+        cache.get(self.quiz.id)
+        cache.get(other_quiz.id)
+        self.assertEqual(len(cache), 1)
+        with self.assertNumQueries(3):
+            cache.get(self.quiz.id)
+
+    def test_sampled_quiz_index(self):
+        Quiz.objects.filter(id=self.quiz.id).update(sample_size=1)
+        plan_cache.clear()
+
+        with self.assertNumQueries(2):      # quiz, question ids
+            pool = plan_cache.get(self.quiz.id)
+        question_ids = tuple(Question.objects.filter(quiz=self.quiz).order_by('id')
+                                             .values_list('id', flat=True))
+        self.assertEqual(pool.questions, ())
+        self.assertEqual(pool.question_ids, question_ids)
+
+        drawn = pool.sample()
+        self.assertEqual(len(drawn), 1)
+        plan = pool.sample_plan(drawn)
+        self.assertTrue(plan.sampled)
+        self.assertEqual([question.id for question in plan.questions], drawn)
+        self.assertEqual(len(plan.options), 2)
+
+        # in the given order
+        plan = pool.sample_plan(list(reversed(question_ids)))
+        self.assertEqual(plan.question_ids, tuple(reversed(question_ids)))
+
+
+class TestPlanCacheCommit(TransactionTestCase):
+    def setUp(self):
+        plan_cache.clear()
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        question = Question.objects.create(quiz=self.quiz, text='question_text')
+        self.option = Option.objects.create(question=question, scor=1, text='option_text')
+
+    def test_plan_loaded_before_commit(self):
+        old_plan = plan_cache.get(self.quiz.id)
+
+        def concurrent_request(sender, instance, **kwargs):
+            # another process reads the committed rows, the old ones, after the
+            # generation is bumped and before the commit
+            with mock.patch.object(QuizPlan, 'load', return_value=old_plan):
+                plan_cache.get(self.quiz.id)
+        post_save.connect(concurrent_request, sender=Option)
+        self.addCleanup(post_save.disconnect, concurrent_request, sender=Option)
+
+        with transaction.atomic():
+            self.option.text = 'changed'
+            self.option.save()
+        if not hasattr(transaction, 'on_commit'):
+            # Django 1.8 invalidates the plan again once the request finishes
+            self.assertTrue(plan_cache.get(self.quiz.id) is old_plan)
+            run_deferred()
+        self.assertEqual(plan_cache.get(self.quiz.id).options[0].text, 'changed')
+
+
+class TestLazyQuizPlan(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        for q_idx in range(5):
+            q = Question.objects.create(quiz=self.quiz, text='question_text_' + str(q_idx))
+            # the third question has no options
+            for o_idx in range(0 if q_idx == 2 else q_idx + 1):
+                Option.objects.create(question=q, scor=o_idx - 1,
+                                      text='option_text_%d_%d' % (q_idx, o_idx))
+        self.full_plan = plan_cache.get(self.quiz.id)
+        Quiz.objects.filter(id=self.quiz.id).update(lazy_pages=True)
+        plan_cache.clear()
+
+    def test_pages_match_the_full_plan(self):
+        with self.assertNumQueries(2):      # quiz, question ids and option counts
+            plan = plan_cache.get(self.quiz.id)
+        self.assertTrue(plan.lazy)
+        self.assertEqual(plan.option_count, len(self.full_plan.options))
+        self.assertEqual(plan.question_ids, self.full_plan.question_ids)
+
+        for page_no in range(3):
+            with self.assertNumQueries(2):  # questions, options
+                page = plan.page_questions(page_no, 2)
+            self.assertEqual(page, self.full_plan.page_questions(page_no, 2))
+            with self.assertNumQueries(0):
+                self.assertTrue(plan.page_questions(page_no, 2) is page)
+        self.assertEqual(plan.page_questions(3, 2), ())
+
+        self.assertEqual(plan.full().questions, self.full_plan.questions)
+        self.assertEqual(plan.questions_at([4, 1]),
+                         {1: self.full_plan.questions[1], 4: self.full_plan.questions[4]})
+        option_indexes = [0, 2, 3, 7, 9]
+        self.assertEqual(plan.option_ids(option_indexes),
+                         self.full_plan.option_ids(option_indexes))
+
+    def test_page_cache_bound(self):
+        plan = plan_cache.get(self.quiz.id)
+        plan._pages.max_size = 2
+        for page_no in range(3):
+            plan.page_questions(page_no, 2)
+        self.assertEqual(sorted(plan._pages.keys()), [(1, 2), (2, 2)])
+
+    def test_change_records(self):
+        plan = plan_cache.get(self.quiz.id)
+        progress = QuizProgress.for_plan(plan, 2)
+        for option in self.full_plan.options[::2]:
+            progress.set_selected(option.index, True)
+
+        full_scoring = self.full_plan.scoring
+        mask = full_scoring.selection_mask(progress)
+        records = full_scoring.change_records(mask, 2)
+        self.assertEqual(plan.scoring.change_records(plan.scoring.selection_mask(progress), 2),
+                         records)
+        self.assertEqual(plan.scoring.sugestion_texts(records),
+                         full_scoring.sugestion_texts(records))
+
+    def test_replaced_on_change(self):
+        plan = plan_cache.get(self.quiz.id)
+        Option.objects.create(question_id=plan.question_ids[2], scor=1, text='new')
+        new_plan = plan_cache.get(self.quiz.id)
+        self.assertNotEqual(new_plan.version, plan.version)
+        self.assertEqual(new_plan.option_count, plan.option_count + 1)
+
+        # a stale plan does not serve the pages with the new options
+        self.assertRaises(StalePlan, plan.page_questions, 1, 2)
+        self.assertEqual(len(plan._pages), 0)
+
+    def test_stale_option_counts(self):
+        # written without signals, Question.option_count is not updated
+        Option.objects.bulk_create([Option(question_id=self.full_plan.question_ids[1], scor=5,
+                                           text='new')])
+        plan = plan_cache.get(self.quiz.id)
+        with self.assertNumQueries(2):      # the page, nothing written
+            self.assertRaises(StalePlan, plan.page_questions, 0, 2)
+        self.assertRaises(StalePlan, plan.questions_at, [1])
+        self.assertRaises(StalePlan, plan.option_ids, [1])
+        self.assertEqual(Question.objects.get(id=self.full_plan.question_ids[1]).option_count, 2)
+
+        # dropped from the cache of the process only, reloaded as it is stored
+        new_plan = plan_cache.get(self.quiz.id)
+        self.assertFalse(new_plan is plan)
+        self.assertEqual(new_plan.version, plan.version)
+        self.assertRaises(StalePlan, new_plan.page_questions, 0, 2)
+
+        # aligned once the counts are rebuilt
+        rebuild_stats([self.quiz.id])
+        new_plan = plan_cache.get(self.quiz.id)
+        self.assertEqual(new_plan.option_count, plan.option_count + 1)
+        self.assertEqual([option.text for option in new_plan.page_questions(0, 2)[1].options],
+                         ['option_text_1_0', 'option_text_1_1', 'new'])
+        self.assertEqual(new_plan.page_questions(1, 2)[1].options[0].index, 4)
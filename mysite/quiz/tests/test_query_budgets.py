@@ -0,0 +1,277 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+import mock
+
+from ..attempts import save_aggregates
+from ..bulk import QuizImporter
+from ..models import Quiz, Question
+from ..plans import plan_cache
+from ..progress import SignedCookieProgressStore
+from ..snapshots import publish_quiz, snapshot_plan_cache
+from ..views import quiz_view
+from ..writebehind import WriteBehindBuffer
+
+
+# (questions, options per question) of the quizzes each budget is checked with
+SIZES = ((2, 2), (10, 4), (40, 8))
+
+
+class QueryBudgetTestCase(TestCase):
+    '''
+    Each endpoint has a fixed maximum number of queries, checked with the
+    quizzes of every size in SIZES: the same count at all the sizes shows
+    that it does not grow with the number of questions and options.
+    '''
+
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear()
+
+        def records(questions, options):
+            for question_no in range(questions):
+                yield ('quiz %dx%d' % (questions, options), 'description',
+                       'question %d' % question_no,
+                       [('option %d' % option_no, option_no - 1) for option_no in range(options)])
+
+        importer = QuizImporter()
+        for questions, options in SIZES:
+            importer.run(records(questions, options))
+        self.quiz_ids = importer.quiz_ids
+
+    def count_queries(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = func(*args, **kwargs)
+        self.assertIn(response.status_code, (200, 302, 304), response)
+        return len(queries)
+
+    def assertBudget(self, budget, counts):
+        '''counts are the query counts of an endpoint for the quizzes in SIZES'''
+        self.assertEqual(len(set(counts)), 1,
+                         'Query count grows with the quiz size: %s for %s' % (counts, SIZES))
+        self.assertTrue(counts[0] <= budget,
+                        '%d queries, over the budget of %d' % (counts[0], budget))
+
+
+@override_settings(QUIZ_AGGREGATES_WRITE_BEHIND=True)
+class TestQuizQueryBudgets(QueryBudgetTestCase):
+    def setUp(self):
+        super(TestQuizQueryBudgets, self).setUp()
+        # with QUIZ_AGGREGATES_WRITE_BEHIND the analytics and leaderboards are
+        # written after the requests
+        self.aggregate_writer = WriteBehindBuffer(save_aggregates)
+        patcher = mock.patch('quiz.attempts.get_aggregate_writer',
+                             return_value=self.aggregate_writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _page_data(self, plan, page_no, button):
+        data = dict((question.options[0].key, 'on')
+                    for question in plan.page_questions(page_no, quiz_view.questions_per_page))
+        data[button] = button
+        return data
+
+    def _take_quiz(self, quiz_id):
+        '''Returns the query counts of each step of the quiz flow'''
+        url = '/%d/' % quiz_id
+        client = Client()
+        counts = {}
+
+        plan_cache.invalidate(quiz_id)
+        counts['init_cold_plan'] = self.count_queries(client.get, url)
+        client = Client()
+        counts['init'] = self.count_queries(client.get, url)
+
+        plan = plan_cache.get(quiz_id)
+        last_page_no = len(plan.question_ids) // quiz_view.questions_per_page
+        for page_no in range(last_page_no):
+            counts['page_post'] = self.count_queries(client.post, url,
+                                                     self._page_data(plan, page_no, 'Next'))
+            counts['page_get'] = self.count_queries(client.get, url)
+        counts['finish_post'] = self.count_queries(client.post, url,
+                                                   self._page_data(plan, last_page_no, 'Finish'))
+        counts['result'] = self.count_queries(client.get, url)
+        return counts
+
+    @override_settings(QUIZ_INDEX_PAGE_SIZE=1)
+    def test_index(self):
+        # one quiz per page: the first page and the pages after each quiz
+        urls = ['/'] + ['/?after=%d' % quiz_id for quiz_id in self.quiz_ids[:-1]]
+
+        cold = []
+        for url in urls:
+            cache.clear()
+            cold.append(self.count_queries(self.client.get, url))
+        self.assertBudget(1, cold)
+
+        # every page cached, once reached from the first one
+        for url in urls:
+            self.client.get(url)
+        self.assertBudget(0, [self.count_queries(self.client.get, url) for url in urls])
+
+    def test_quiz_steps(self):
+        flows = [self._take_quiz(quiz_id) for quiz_id in self.quiz_ids]
+        budgets = {'init_cold_plan': 7,   # plan (3), session (4)
+                   'init': 4,             # session: load, exists, insert in a savepoint
+                   'page_post': 4,        # session: load, update in a savepoint
+                   'page_get': 1,         # session: load
+                   'finish_post': 4,
+                   'result': 10}          # session (4), attempt and answers in a
+                                          # savepoint (4), leaderboard (2)
+        for step, budget in sorted(budgets.items()):
+            self.assertBudget(budget, [flow[step] for flow in flows])
+
+    @override_settings(QUIZ_AGGREGATES_WRITE_BEHIND=False)
+    def test_synchronous_aggregates(self):
+        # the default: the analytics and leaderboard increments in the result step
+        self.assertBudget(21, [self._take_quiz(quiz_id)['result'] for quiz_id in self.quiz_ids])
+
+    def test_lazy_quiz_steps(self):
+        Quiz.objects.filter(id__in=self.quiz_ids).update(lazy_pages=True)
+        plan_cache.clear()
+
+        flows = [self._take_quiz(quiz_id) for quiz_id in self.quiz_ids]
+        budgets = {'init_cold_plan': 8,   # index (2), page (2), session (4)
+                   'init': 4,
+                   'page_post': 4,
+                   'page_get': 1,         # the pages are kept in the plan
+                   'finish_post': 4,
+                   'result': 13}          # and the option ids of the answers (1) and
+                                          # the questions of the suggestions (2)
+        for step, budget in sorted(budgets.items()):
+            self.assertBudget(budget, [flow[step] for flow in flows])
+
+    def test_lazy_quiz_signed_cookie_steps(self):
+        Quiz.objects.filter(id__in=self.quiz_ids).update(lazy_pages=True)
+        plan_cache.clear()
+
+        with mock.patch.object(quiz_view, 'progress_store', SignedCookieProgressStore()):
+            flows = [self._take_quiz(quiz_id) for quiz_id in self.quiz_ids]
+        budgets = {'init_cold_plan': 4,   # index (2), page (2)
+                   'init': 0,
+                   'page_post': 0,
+                   'page_get': 0,
+                   'finish_post': 0,
+                   'result': 11}          # the questions of every page, for the
+                                          # suggestions, in one chunked load (2)
+        for step, budget in sorted(budgets.items()):
+            self.assertBudget(budget, [flow[step] for flow in flows])
+
+    def test_published_quiz_steps(self):
+        for quiz_id in self.quiz_ids:
+            publish_quiz(quiz_id)
+        snapshot_plan_cache.clear()
+
+        flows = [self._take_quiz(quiz_id) for quiz_id in self.quiz_ids]
+        budgets = {'init_cold_plan': 6,   # quiz, snapshot, session (4)
+                   'init': 4,
+                   'page_post': 4,
+                   'page_get': 1,
+                   'finish_post': 4,
+                   'result': 11}          # and the options still in the quiz (1)
+        for step, budget in sorted(budgets.items()):
+            self.assertBudget(budget, [flow[step] for flow in flows])
+
+    def test_single_page_steps(self):
+        Quiz.objects.filter(id__in=self.quiz_ids).update(single_page=True)
+        plan_cache.clear()
+
+        gets, posts, results = [], [], []
+        for quiz_id in self.quiz_ids:
+            plan = plan_cache.get(quiz_id)
+            data = dict((question.options[0].key, 'on') for question in plan.questions)
+            data['Finish'] = 'Finish'
+            client = Client()
+            gets.append(self.count_queries(client.get, '/%d/' % quiz_id))
+            posts.append(self.count_queries(client.post, '/%d/' % quiz_id, data))
+            results.append(self.count_queries(client.get, '/%d/' % quiz_id))
+        self.assertBudget(0, gets)
+        self.assertBudget(4, posts)     # session: load, exists, insert in a savepoint
+        self.assertBudget(10, results)  # the result step of the other quizzes
+
+    def test_sampled_quiz_steps(self):
+        # 2 questions drawn from pools of 2, 10 and 40 questions
+        Quiz.objects.filter(id__in=self.quiz_ids).update(sample_size=2)
+        plan_cache.clear()
+
+        flows = []
+        for quiz_id in self.quiz_ids:
+            url = '/%d/' % quiz_id
+            client = Client()
+            counts = {'init_cold_plan': self.count_queries(client.get, url)}
+            plan = plan_cache.get(quiz_id).sample_plan(
+                client.session['quiz_progress']['question_ids'])
+            counts['page_get'] = self.count_queries(client.get, url)
+            counts['page_post'] = self.count_queries(client.post, url,
+                                                     self._page_data(plan, 0, 'Next'))
+            flows.append(counts)
+
+        budgets = {'init_cold_plan': 8,   # index (2), sample (2), session (4)
+                   'page_get': 3,         # session, sample (2)
+                   'page_post': 6}
+        for step, budget in sorted(budgets.items()):
+            self.assertBudget(budget, [flow[step] for flow in flows])
+
+    def test_api(self):
+        definitions, answers = [], []
+        for quiz_id in self.quiz_ids:
+            plan = plan_cache.get(quiz_id)
+            data = {'version': plan.version,
+                    'options': [question.options[0].id for question in plan.questions]}
+            plan_cache.invalidate(quiz_id)
+            definitions.append(self.count_queries(self.client.get, '/api/%d/' % quiz_id))
+            answers.append(self.count_queries(self.client.post, '/api/%d/answers/' % quiz_id,
+                                              json.dumps(data), content_type='application/json'))
+        self.assertBudget(3, definitions)
+        self.assertBudget(4, answers)   # attempt and answers in a savepoint
+
+    def test_get_question_mapping(self):
+        def question_mapping(quiz_id):
+            with CaptureQueriesContext(connection) as queries:
+                quiz_view.get_question_mapping(Question.objects.filter(quiz=quiz_id))
+            return len(queries)
+        self.assertBudget(2, [question_mapping(quiz_id) for quiz_id in self.quiz_ids])
+
+
+@override_settings(ROOT_URLCONF='quiz.tests.urls')
+class TestAdminQueryBudgets(QueryBudgetTestCase):
+    def setUp(self):
+        super(TestAdminQueryBudgets, self).setUp()
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        # fills the process-wide caches of the admin (content types)
+        self.client.get('/admin/quiz/quiz/%d/' % self.quiz_ids[0])
+        self.client.get('/admin/quiz/question/%d/' % Question.objects.values_list('id', flat=True)[0])
+
+    def test_quiz_changelist(self):
+        counts = [self.count_queries(self.client.get, '/admin/quiz/quiz/')]
+        importer = QuizImporter()
+        importer.run(('quiz %d' % quiz_no, 'description', 'question', [('option', 1)])
+                     for quiz_no in range(30))
+        counts.append(self.count_queries(self.client.get, '/admin/quiz/quiz/'))
+        self.assertBudget(5, counts)
+
+    def test_quiz_change(self):
+        # the questions are paginated: a count and one page of them
+        self.assertBudget(7, [self.count_queries(self.client.get, '/admin/quiz/quiz/%d/' % quiz_id)
+                              for quiz_id in self.quiz_ids])
+
+    def test_question_changelist(self):
+        counts = [self.count_queries(self.client.get, '/admin/quiz/question/')]
+        importer = QuizImporter()
+        importer.run(('quiz', 'description', 'question %d' % question_no, [('option', 1)])
+                     for question_no in range(60))
+        counts.append(self.count_queries(self.client.get, '/admin/quiz/question/'))
+        self.assertBudget(5, counts)
+
+    def test_question_change(self):
+        question_ids = [Question.objects.filter(quiz=quiz_id).values_list('id', flat=True)[0]
+                        for quiz_id in self.quiz_ids]
+        self.assertBudget(6, [self.count_queries(self.client.get,
+                                                 '/admin/quiz/question/%d/' % question_id)
+                              for question_id in question_ids])
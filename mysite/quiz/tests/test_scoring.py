@@ -0,0 +1,72 @@
+import random
+
+from django.test import SimpleTestCase
+
+from .. import views
+from ..plans import QuizPlan
+from ..progress import QuizProgress
+
+
+class TestScoringEngine(SimpleTestCase):
+    def setUp(self):
+        self.view = views.QuizView()
+
+    def _random_quiz(self, rnd, question_count, max_options):
+        option_id = 1
+        questions = []
+        for q_idx in range(question_count):
+            options = []
+            for _ in range(rnd.randint(0, max_options)):
+                options.append((option_id, 'option_text_' + str(option_id), rnd.randint(-5, 5)))
+                option_id += 1
+            questions.append((q_idx + 1, 'question_text_' + str(q_idx), options))
+        plan = QuizPlan(1, questions)
+
+        progress = QuizProgress.for_plan(plan, 2)
+        for option in plan.options:
+            progress.set_selected(option.index, rnd.random() < 0.4)
+        return plan, progress
+
+    def test_selection_mask(self):
+        plan, progress = self._random_quiz(random.Random(0), 10, 4)
+        mask = plan.scoring.selection_mask(progress)
+        self.assertEqual(list(mask),
+                         [progress.is_selected(option.index) for option in plan.options])
+
+    def test_matches_reference(self):
+        rnd = random.Random(1)
+        for question_count in range(0, 12):
+            for questions_per_page in (1, 2, 3):
+                plan, progress = self._random_quiz(rnd, question_count, 4)
+                scoring = plan.scoring
+                mask = scoring.selection_mask(progress)
+
+                self.assertEqual(scoring.max_score,
+                                 self.view._calculate_max_score(plan.options))
+                self.assertEqual(scoring.score(mask),
+                                 self.view._calculate_score([option for option in plan.options
+                                                             if progress.is_selected(option.index)]))
+                self.assertEqual(scoring.sugestions(mask, questions_per_page),
+                                 self.view._compute_sugestions(plan.questions,
+                                                               progress,
+                                                               questions_per_page))
+
+    def test_large_quiz(self):
+        plan, progress = self._random_quiz(random.Random(2), 2500, 8)
+        scoring = plan.scoring
+        self.assertEqual(scoring.sugestions(scoring.selection_mask(progress), 5),
+                         self.view._compute_sugestions(plan.questions, progress, 5))
+
+    def test_page_change_record(self):
+        rnd = random.Random(3)
+        for question_count in range(0, 9):
+            for questions_per_page in (1, 2, 3):
+                plan, progress = self._random_quiz(rnd, question_count, 3)
+                scoring = plan.scoring
+                mask = scoring.selection_mask(progress)
+
+                records = scoring.change_records(mask, questions_per_page)
+                self.assertEqual(len(records), question_count // questions_per_page + 1)
+                self.assertEqual([scoring.page_change_record(mask, questions_per_page, page_no)
+                                  for page_no in range(len(records))],
+                                 records)
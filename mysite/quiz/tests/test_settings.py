@@ -2,13 +2,17 @@
 SECRET_KEY = 'test'
 
 INSTALLED_APPS = (
+    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
+    'django.contrib.messages',
     'quiz',
 )
 
 MIDDLEWARE_CLASSES = (
+    # first, so that it sees the session saved
+    'quiz.metrics.QuizMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -30,3 +34,6 @@ DATABASES = {
         'NAME': ':memory:',
     }
 }
+
+# the tests run in a single process, with the per-process default cache
+SILENCED_SYSTEM_CHECKS = ['quiz.W001']
@@ -0,0 +1,106 @@
+from django.test import TestCase
+
+from ..models import Quiz, Question, Option, QuizSnapshot, Attempt
+from ..plans import QuizPlan, plan_cache
+from ..snapshots import get_snapshot_plan, publish_quiz, snapshot_plan_cache, unpublish_quiz
+
+
+class TestQuizSnapshots(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+        snapshot_plan_cache.clear()
+
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        self.options = []
+        it_scores = iter([10, 0, -7, 18, 22, -40])
+        for q_idx in range(3):
+            q = Question.objects.create(quiz=self.quiz,
+                                        text='question_text_' + str(q_idx))
+            for o_idx in range(2):
+                self.options.append(Option.objects.create(question=q,
+                                                          scor=next(it_scores),
+                                                          text='option_text_' + str(o_idx)))
+        self.url = '/%d/' % self.quiz.id
+
+    def _post(self, options, button, client=None):
+        data = dict(('option_' + str(option.id), 'on') for option in options)
+        data[button] = button
+        return (client or self.client).post(self.url, data)
+
+    def test_publish(self):
+        live_plan = QuizPlan.load(self.quiz.id)
+        snapshot = publish_quiz(self.quiz.id)
+        self.assertEqual(snapshot.version, live_plan.content_version)
+        self.assertEqual((snapshot.max_score, snapshot.question_count, snapshot.option_count),
+                         (50, 3, 6))
+        self.assertEqual(Quiz.objects.get(id=self.quiz.id).published_snapshot, snapshot)
+
+        with self.assertNumQueries(2):      # quiz, snapshot
+            plan = plan_cache.get(self.quiz.id)
+        self.assertTrue(plan.published)
+        self.assertEqual(plan.questions, live_plan.questions)
+        self.assertEqual(plan.version, live_plan.version)
+        self.assertEqual(plan.updated_at, snapshot.created_at)
+
+        # an unchanged quiz keeps its snapshot
+        self.assertEqual(publish_quiz(self.quiz.id), snapshot)
+        self.assertEqual(QuizSnapshot.objects.count(), 1)
+
+    def test_edits_served_once_published(self):
+        publish_quiz(self.quiz.id)
+        Question.objects.filter(text='question_text_0').update(text='changed')
+        Question.objects.get(text='changed').save()
+
+        self.assertContains(self.client.get(self.url), 'question_text_0')
+
+        publish_quiz(self.quiz.id)
+        self.client.cookies.clear()
+        self.assertContains(self.client.get(self.url), 'changed')
+
+        unpublish_quiz(self.quiz.id)
+        self.assertFalse(plan_cache.get(self.quiz.id).published)
+        self.assertEqual(QuizSnapshot.objects.count(), 2)
+
+    def test_session_kept_on_its_snapshot(self):
+        first_version = publish_quiz(self.quiz.id).version
+        self._post([self.options[0], self.options[3]], 'Next')
+
+        question = Question.objects.get(text='question_text_2')
+        question.text = 'changed'
+        question.save()
+        Option.objects.filter(id=self.options[5].id).delete()
+        self.assertNotEqual(publish_quiz(self.quiz.id).version, first_version)
+
+        # the session goes on with the first snapshot
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_2')
+        self._post([self.options[4], self.options[5]], 'Finish')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Score: 10 / 50')
+
+        # the answer of the deleted option is not recorded
+        attempt = Attempt.objects.get(quiz=self.quiz)
+        self.assertEqual(attempt.score, 10)
+        self.assertEqual(set(attempt.attemptanswer_set.values_list('option_id', flat=True)),
+                         set([self.options[0].id, self.options[3].id, self.options[4].id]))
+
+        # new sessions get the last snapshot
+        response = self.client.get(self.url)
+        self.assertContains(response, 'question_text_0')
+        self._post([self.options[0], self.options[3]], 'Next')
+        self.assertContains(self.client.get(self.url), 'changed')
+
+    def test_get_snapshot_plan(self):
+        version = publish_quiz(self.quiz.id).version
+        plan = get_snapshot_plan(self.quiz.id, version)
+        self.assertEqual(plan.content_version, version)
+        with self.assertNumQueries(0):
+            self.assertTrue(get_snapshot_plan(self.quiz.id, version) is plan)
+        self.assertTrue(get_snapshot_plan(self.quiz.id, 'unknown') is None)
+
+    def test_sampled_or_lazy_not_published(self):
+        Quiz.objects.filter(id=self.quiz.id).update(sample_size=2)
+        self.assertRaises(ValueError, publish_quiz, self.quiz.id)
+        Quiz.objects.filter(id=self.quiz.id).update(sample_size=None, lazy_pages=True)
+        self.assertRaises(ValueError, publish_quiz, self.quiz.id)
+        self.assertFalse(QuizSnapshot.objects.exists())
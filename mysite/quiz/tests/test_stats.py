@@ -0,0 +1,104 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+
+from ..models import Quiz, Question, Option
+from ..plans import plan_cache
+
+
+class TestQuizStats(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(name='quiz', description='description')
+        self.question = Question.objects.create(quiz=self.quiz, text='question_text_0')
+        self.options = [Option.objects.create(question=self.question, scor=score,
+                                              text='option_text_' + str(score))
+                        for score in (-3, 4, 7)]
+
+    def _assert_stats(self, max_score, option_count):
+        quiz = Quiz.objects.get(id=self.quiz.id)
+        question = Question.objects.get(id=self.question.id)
+        self.assertEqual(quiz.max_score, max_score)
+        self.assertEqual(question.option_count, option_count)
+
+    def test_maintained_on_write(self):
+        self._assert_stats(11, 3)
+
+        self.options[0].scor = 5
+        self.options[0].save()
+        self._assert_stats(16, 3)
+
+        self.options[2].delete()
+        self._assert_stats(9, 2)
+
+        # saving a stale instance does not overwrite the statistics
+        self.question.text = 'changed'
+        self.question.save()
+        self.quiz.save()
+        self._assert_stats(9, 2)
+
+        other_question = Question.objects.create(quiz=self.quiz, text='question_text_1')
+        Option.objects.create(question=other_question, scor=1, text='option_text')
+        self.assertEqual(Quiz.objects.get(id=self.quiz.id).max_score, 10)
+
+        other_question.delete()
+        self.assertEqual(Quiz.objects.get(id=self.quiz.id).max_score, 9)
+
+    def test_updated_at_touched_on_write(self):
+        def updated_at():
+            return Quiz.objects.values_list('updated_at', flat=True).get(id=self.quiz.id)
+
+        for change in (lambda: self.options[0].save(),
+                       lambda: self.options[1].delete(),
+                       lambda: Question.objects.create(quiz=self.quiz, text='new'),
+                       lambda: self.quiz.save()):
+            before = updated_at()
+            change()
+            self.assertGreater(updated_at(), before)
+
+    def test_cascade_delete(self):
+        def delete_queries(instance):
+            with CaptureQueriesContext(connection) as queries:
+                instance.delete()
+            return len(queries)
+
+        def question_with_options(quiz, option_count):
+            question = Question.objects.create(quiz=quiz, text='question')
+            for score in range(option_count):
+                Option.objects.create(question=question, scor=score, text='option')
+            return question
+
+        # the statistics are updated once, not once per deleted option
+        self.assertEqual(delete_queries(question_with_options(self.quiz, 20)),
+                         delete_queries(question_with_options(self.quiz, 2)))
+        self._assert_stats(11, 3)
+
+        quizzes = []
+        for option_count in (2, 20):
+            quiz = Quiz.objects.create(name='other', description='')
+            for _ in range(2):
+                question_with_options(quiz, option_count)
+            quizzes.append(quiz)
+        self.assertEqual(delete_queries(quizzes[1]), delete_queries(quizzes[0]))
+
+        # the following deletes are not skipped
+        self.options[0].delete()
+        self._assert_stats(11, 2)
+
+    def test_rebuild_command(self):
+        # bulk writes do not send signals
+        Option.objects.bulk_create([Option(question=self.question, scor=10, text='bulk')])
+        Question.objects.bulk_create([Question(quiz=self.quiz, text='no options')])
+        Quiz.objects.update(max_score=0)
+
+        out = StringIO()
+        call_command('rebuild_quiz_stats', stdout=out)
+        self.assertIn('1 quizzes', out.getvalue())
+        self._assert_stats(21, 4)
+        self.assertEqual(Question.objects.get(text='no options').option_count, 0)
+
+    def test_result_page_reads_stored_max_score(self):
+        plan_cache.clear()
+        Quiz.objects.update(max_score=100)
+        self.assertEqual(plan_cache.get(self.quiz.id).scoring.max_score, 100)
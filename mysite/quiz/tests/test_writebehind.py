@@ -0,0 +1,144 @@
+import threading
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+import mock
+
+from ..attempts import AttemptRecord, record_attempt, save_aggregates, save_attempts
+from ..models import (Quiz, Question, Option, Attempt, AttemptAnswer, LeaderboardEntry,
+                      ScoreCount)
+from ..plans import QuizPlan
+from ..progress import QuizProgress
+from ..writebehind import WriteBehindBuffer
+
+
+class TestWriteBehindBuffer(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+        self.written = threading.Event()
+
+        def write_batch(batch):
+            self.batches.append(list(batch))
+            self.written.set()
+        self.write_batch = write_batch
+
+    def test_flush_in_batches(self):
+        buffer = WriteBehindBuffer(self.write_batch, batch_size=2)
+        for record in range(5):
+            buffer.submit(record)
+        self.assertEqual(buffer.stats()['queue_depth'], 5)
+
+        buffer.flush()
+        self.assertEqual(self.batches, [[0, 1], [2, 3], [4]])
+        stats = buffer.stats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['written'], 5)
+        self.assertEqual(stats['batches'], 3)
+
+    def test_backpressure(self):
+        buffer = WriteBehindBuffer(self.write_batch, max_queue=2, put_timeout=0.01)
+        for record in range(3):
+            buffer.submit(record)
+
+        # the queue was full: the last record is written by the caller
+        self.assertEqual(self.batches, [[2]])
+        self.assertEqual(buffer.stats()['sync_writes'], 1)
+        self.assertEqual(buffer.stats()['enqueued'], 2)
+
+    def test_background_thread(self):
+        buffer = WriteBehindBuffer(self.write_batch, batch_size=3, flush_interval=0.01)
+        buffer.start()
+        buffer.submit(0)
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [[0]])
+
+        # the pending records are written on stop
+        buffer.flush_interval = 60
+        buffer.submit(1)
+        buffer.stop(timeout=5)
+        self.assertEqual(sum(self.batches, []), [0, 1])
+
+    def test_failed_write(self):
+        def write_batch(batch):
+            raise ValueError()
+        buffer = WriteBehindBuffer(write_batch)
+        buffer.submit(0)
+        with mock.patch('quiz.writebehind.logger'):
+            buffer.flush()
+        self.assertEqual(buffer.stats()['failed'], 1)
+        self.assertEqual(buffer.stats()['retried'], 1)
+
+    def test_failed_write_retried(self):
+        failures = [ValueError()]
+
+        def write_batch(batch):
+            if failures:
+                raise failures.pop()
+            self.write_batch(batch)
+        buffer = WriteBehindBuffer(write_batch, batch_size=2, flush_interval=0.01)
+        buffer.start()
+        with mock.patch('quiz.writebehind.logger'), \
+                mock.patch('quiz.writebehind.close_old_connections') as close_old_connections, \
+                mock.patch('quiz.writebehind.connection') as connection:
+            buffer.submit(0)
+            self.assertTrue(self.written.wait(5))
+            buffer.stop(timeout=5)
+
+        # on a new connection
+        self.assertEqual(self.batches, [[0]])
+        self.assertEqual(close_old_connections.call_count, 2)
+        self.assertEqual(connection.close.call_count, 2)    # retry and stop
+        stats = buffer.stats()
+        self.assertEqual((stats['written'], stats['failed'], stats['retried']), (1, 0, 1))
+
+
+class TestAttemptWriteBehind(TestCase):
+    def setUp(self):
+        quiz = Quiz.objects.create(name='quiz', description='description')
+        question = Question.objects.create(quiz=quiz, text='question_text')
+        for score in (1, 2):
+            Option.objects.create(question=question, scor=score, text='option_text')
+        self.plan = QuizPlan.load(quiz.id)
+
+    def test_save_attempts_batch(self):
+        option_ids = [option.id for option in self.plan.options]
+        records = [AttemptRecord(self.plan.quiz_id, 3, 3, option_ids, timezone.now())
+                   for _ in range(4)]
+
+        save_attempts(records)
+        self.assertEqual(Attempt.objects.count(), 4)
+        self.assertEqual(AttemptAnswer.objects.count(), 8)
+
+    @override_settings(QUIZ_ATTEMPT_WRITE_BEHIND=True)
+    def test_record_attempt_is_queued(self):
+        buffer = WriteBehindBuffer(save_attempts)
+        progress = QuizProgress.for_plan(self.plan, 2)
+        progress.set_selected(1, True)
+
+        with mock.patch('quiz.attempts.get_attempt_writer', return_value=buffer):
+            self.assertTrue(record_attempt(self.plan, progress) is None)
+        self.assertFalse(Attempt.objects.exists())
+
+        buffer.flush()
+        attempt = Attempt.objects.get()
+        self.assertEqual(list(attempt.attemptanswer_set.values_list('option_id', flat=True)),
+                         [self.plan.options[1].id])
+
+    @override_settings(QUIZ_AGGREGATES_WRITE_BEHIND=True)
+    def test_aggregates_are_queued(self):
+        buffer = WriteBehindBuffer(save_aggregates)
+        progress = QuizProgress.for_plan(self.plan, 2)
+        progress.current_score = [2]
+        progress.set_selected(1, True)
+
+        # in a savepoint inside the test transaction: the attempt and answers INSERTs
+        with mock.patch('quiz.attempts.get_aggregate_writer', return_value=buffer), \
+                self.assertNumQueries(4):
+            attempt = record_attempt(self.plan, progress)
+        self.assertEqual(Attempt.objects.get().id, attempt.id)
+        self.assertFalse(ScoreCount.objects.exists())
+
+        buffer.flush()
+        self.assertEqual(list(ScoreCount.objects.values_list('score', 'count')), [(2, 1)])
+        self.assertEqual(LeaderboardEntry.objects.get().attempt_id, attempt.id)
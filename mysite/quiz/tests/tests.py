@@ -4,7 +4,9 @@ from django.core.exceptions import ValidationError
 import mock
 
 from .. import views
-from ..models import Question, Option
+from ..models import Quiz, Question, Option
+from ..plans import QuizPlan, PlanOption
+from ..progress import QuizProgress
 
 
 class TestQuizView(TestCase):
@@ -17,6 +19,7 @@ class TestQuizView(TestCase):
         self.view = views.QuizView()
         self.quiz_id = 0
         self.questions_per_page = 2
+        Quiz.objects.create(id=self.quiz_id, name='quiz', description='description')
 
         it_scores = iter([10, 0, -7, 18, 22, -40])
 
@@ -52,6 +55,13 @@ class TestQuizView(TestCase):
                                           'option_6': {'is_selected': False,
                                                        'score': -40},
                                           }
+        self.plan = QuizPlan.load(self.quiz_id)
+
+    def _make_progress(self, plan, selected_option_indexes=()):
+        progress = QuizProgress.for_plan(plan, self.questions_per_page)
+        for option_index in selected_option_indexes:
+            progress.set_selected(option_index, True)
+        return progress
 
     def test_question_mapping(self):
         self.maxDiff = None
@@ -62,90 +72,60 @@ class TestQuizView(TestCase):
         self.assertEqual(result_options, self.expected_selected_options)
 
     def test_validate_min_options_selected(self):
-        given_qustions = [{'question_text': 'question_text_0',
-                           'options': {'option_1': 'option_text_1',
-                                       'option_2': 'option_text_2'}},
-                          {'question_text': 'question_text_1',
-                           'options': {'option_3': 'option_text_3',
-                                       'option_4': 'option_text_4'}}]
-        given_options = {'option_1': {'is_selected': False,
-                                      'score': 0},
-                         'option_2': {'is_selected': False,
-                                      'score': 0},
-                         'option_3': {'is_selected': False,
-                                      'score': 0},
-                         'option_4': {'is_selected': False,
-                                      'score': 0},
-                         }
+        given_qustions = self.plan.questions[:2]
+        given_progress = self._make_progress(self.plan)
 
         # no option selected
         try:
-            self.view._validate_min_options_selected(given_qustions, given_options)
+            self.view._validate_min_options_selected(given_qustions, given_progress)
             self.fail('_validate_min_options_selected method did not raise an exception.')
         except:
             pass
 
         # one option selected on one question
-        given_options['option_4']['is_selected'] = True
+        given_progress.set_selected(3, True)
         try:
-            self.view._validate_min_options_selected(given_qustions, given_options)
+            self.view._validate_min_options_selected(given_qustions, given_progress)
             self.fail('_validate_min_options_selected method did not raise an exception.')
         except:
             pass
 
         # one option selected on both questions
-        given_options['option_1']['is_selected'] = True
+        given_progress.set_selected(0, True)
         try:
-            self.view._validate_min_options_selected(given_qustions, given_options)
+            self.view._validate_min_options_selected(given_qustions, given_progress)
         except:
             self.fail('_validate_min_options_selected method raised an exception.')
 
         # all options selected
-        given_options['option_2']['is_selected'] = True
-        given_options['option_3']['is_selected'] = True
+        given_progress.set_selected(1, True)
+        given_progress.set_selected(2, True)
         try:
-            self.view._validate_min_options_selected(given_qustions, given_options)
+            self.view._validate_min_options_selected(given_qustions, given_progress)
         except ValidationError:
             self.fail('_validate_min_options_selected method raised an exception.')
 
     def test_calculate_score(self):
-        given_options_score = [{'score': 1},
-                               {'score': -10},
-                               {'score': 0},
-                               {'score': 0},
-                               {'score': 17}]
+        given_options_score = [PlanOption(idx, idx, '', score)
+                               for idx, score in enumerate([1, -10, 0, 0, 17])]
         result_score = self.view._calculate_score(given_options_score)
         self.assertEqual(result_score, 8)
 
     def test_get_context_question_list(self):
-        given_questions = [{'question_text': 'question_text_0',
-                            'options': {'option_1': 'option_text_1',
-                                        'option_2': 'option_text_2'}},
-                           {'question_text': 'question_text_1',
-                            'options': {'option_3': 'option_text_3',
-                                        'option_4': 'option_text_4'}}]
-        given_request_session = {}
-        given_request_session['selected_options'] = {
-            'option_1': {'is_selected': False},
-            'option_2': {'is_selected': False},
-            'option_3': {'is_selected': False},
-            'option_4': {'is_selected': False},
-        }
+        given_questions = self.plan.questions[:2]
+        given_progress = self._make_progress(self.plan, [1])
 
-        expected_result = [('question_text_0', [('option_2', 'option_text_2', False),
-                                                ('option_1', 'option_text_1', False)]),
+        expected_result = [('question_text_0', [('option_1', 'option_text_1', False),
+                                                ('option_2', 'option_text_2', True)]),
                            ('question_text_1', [('option_3', 'option_text_3', False),
                                                 ('option_4', 'option_text_4', False)])]
         result = self.view._get_context_question_list(given_questions,
-                                                      given_request_session)
+                                                      given_progress)
         self.assertEqual(result, expected_result)
 
     def test_calculate_max_score(self):
-        given_options = {'option_1': {'score': 0},
-                         'option_2': {'score': 10},
-                         'option_3': {'score': -7},
-                         'option_4': {'score': -20},
-                         }
+        given_options = [PlanOption(idx, idx, '', score)
+                         for idx, score in enumerate([0, 10, -7, -20])]
         result_score = self.view._calculate_max_score(given_options)
         self.assertEqual(result_score, 10)
 
@@ -188,50 +168,27 @@ class TestQuizView(TestCase):
         self.assertTrue(result is None)
 
     def test_compute_sugestions(self):
-        given_qustions = [{'question_text': 'question_text_0',
-                           'options': {'option_1': 'option_text_1',
-                                       'option_2': 'option_text_2',
-                                       'option_3': 'option_text_3'}},
-                          {'question_text': 'question_text_1',
-                           'options': {'option_4': 'option_text_4',
-                                       'option_5': 'option_text_5',
-                                       'option_6': 'option_text_6'}},
-                          {'question_text': 'question_text_2',
-                           'options': {'option_7': 'option_text_7',
-                                       'option_8': 'option_text_8',
-                                       'option_9': 'option_text_9'}}]
-
-        given_request_session = {}
-        given_request_session['selected_options'] = {
-            # question 0
-            'option_1': {'is_selected': False,
-                         'score': 10},
-            'option_2': {'is_selected': True,
-                         'score': 0},
-            'option_3': {'is_selected': False,
-                         'score': -10},
-            # question 1
-            'option_4': {'is_selected': True,
-                         'score': -1},
-            'option_5': {'is_selected': False,
-                         'score': 2},
-            'option_6': {'is_selected': False,
-                         'score': -1},
-            # question 2
-            'option_7': {'is_selected': True,
-                         'score': -1},
-            'option_8': {'is_selected': True,
-                         'score': 2},
-            'option_9': {'is_selected': False,
-                         'score': -1},
-        }
+        given_plan = QuizPlan(self.quiz_id, [
+            (1, 'question_text_0', [(1, 'option_text_1', 10),
+                                    (2, 'option_text_2', 0),
+                                    (3, 'option_text_3', -10)]),
+            (2, 'question_text_1', [(4, 'option_text_4', -1),
+                                    (5, 'option_text_5', 2),
+                                    (6, 'option_text_6', -1)]),
+            (3, 'question_text_2', [(7, 'option_text_7', -1),
+                                    (8, 'option_text_8', 2),
+                                    (9, 'option_text_9', -1)])])
+
+        # selected: option_2 (question 0), option_4 (question 1),
+        #           option_7 and option_8 (question 2)
+        given_progress = self._make_progress(given_plan, [1, 3, 6, 7])
 
         expected_result = [(('for best: question_text_0<option_text_2> -> <option_text_1>', 10),
                             ('for worst: question_text_0<option_text_2> -> <option_text_3>', -10)),
                            (('for best: No sugestion to improve score', 0),
                             ('for worst: question_text_2<option_text_8> -> <option_text_9>', -3))]
-        result = self.view._compute_sugestions(given_qustions,
-                                               given_request_session,
+        result = self.view._compute_sugestions(given_plan.questions,
+                                               given_progress,
                                                self.questions_per_page)
 
         self.assertEqual(result, expected_result)
@@ -240,166 +197,201 @@ class TestQuizView(TestCase):
         temp_request = self.DummyRequest()
         temp_request.session = {'fake_attribute_for_clear': 0}
 
-        self.view._init_session(temp_request, self.quiz_id)
+        progress = self.view._init_session(temp_request, self.plan)
 
         try:
             temp_request.session['fake_attribute_for_clear']
             self.fail('The session not cleared before init.')
         except KeyError:
             pass
-        self.assertEqual(temp_request.session['quiz_id'], self.quiz_id)
-        self.assertEqual(temp_request.session['current_page_no'], 0)
-        self.assertEqual(temp_request.session['question_list'], self.expected_qustion_list)
-        self.assertEqual(temp_request.session['selected_options'], self.expected_selected_options)
-        self.assertEqual(temp_request.session['last_page_no'],
-                         (len(self.expected_qustion_list) / self.questions_per_page))
+        self.assertEqual(temp_request.session, {'quiz_progress': progress.to_dict()})
+        self.assertEqual(progress.quiz_id, self.quiz_id)
+        self.assertEqual(progress.version, self.plan.version)
+        self.assertEqual(progress.current_page_no, 0)
+        self.assertEqual(progress.current_score, [0, 0])
+        self.assertEqual(progress.last_page_no,
+                         (len(self.expected_qustion_list) // self.questions_per_page))
+        self.assertFalse(any(progress.is_selected(option.index)
+                             for option in self.plan.options))
+
+    def test_get_progress(self):
+        temp_request = self.DummyRequest()
+        temp_request.session = {}
+        self.assertTrue(self.view._get_progress(temp_request, self.plan) is None)
+
+        progress = self.view._init_session(temp_request, self.plan)
+        progress.set_selected(4, True)
+        progress.current_page_no = 1
+        self.view._save_progress(temp_request, None, progress)
+
+        result = self.view._get_progress(temp_request, self.plan)
+        self.assertEqual(result.to_dict(), progress.to_dict())
+        self.assertTrue(result.is_selected(4))
+        self.assertFalse(result.is_selected(5))
 
+        # the quiz was edited since the session started
+        changed_plan = QuizPlan(self.quiz_id, [(1, 'question_text_0', [])])
+        self.assertTrue(self.view._get_progress(temp_request, changed_plan) is None)
+
+    @mock.patch('quiz.views.redirect')
     @mock.patch('quiz.views.QuizView._calculate_score')
     @mock.patch('quiz.views.QuizView._validate_min_options_selected')
-    def test_handle_post_request(self, mock_validate, mock_calculate_score):
+    def test_handle_post_request(self, mock_validate, mock_calculate_score, mock_redirect):
         temp_request = self.DummyRequest()
+        temp_request.session = {}
 
         # 'Previous'
-        temp_request.session['selected_options'] = self.expected_selected_options
-        temp_request.session['current_page_no'] = 1
-        temp_request.session['last_page_no'] = \
-            len(self.expected_qustion_list) / self.questions_per_page
-        temp_request.session['current_score'] = [0] * (
-            temp_request.session['last_page_no'] + 1)
-        temp_request.POST = {'Previous': None}
-
-        given_page_qustions = self.expected_qustion_list[:2]
+        progress = self._make_progress(self.plan)
+        progress.current_page_no = 1
+        temp_request.POST = {'Previous': None, 'option_2': 'on'}
+
+        given_page_qustions = self.plan.questions[:2]
         self.view._handle_post_request(temp_request,
+                                       self.plan,
+                                       progress,
                                        given_page_qustions,
                                        self.quiz_id)
 
         current_page = 0
-        self.assertEqual(temp_request.session['current_page_no'], current_page)
+        self.assertEqual(progress.current_page_no, current_page)
+        self.assertTrue(progress.is_selected(1))
+        self.assertEqual(temp_request.session['quiz_progress'], progress.to_dict())
+        mock_redirect.assert_called_with('quiz', quiz_id=self.quiz_id)
 
         # 'Next'/'Finish' without error
         mock_calculate_score.side_effect = [mock.sentinel.calculated_score]
-        temp_request.POST = {'Next': None}
+        temp_request.POST = {'Next': None, 'option_1': 'on'}
 
         self.view._handle_post_request(temp_request,
+                                       self.plan,
+                                       progress,
                                        given_page_qustions,
                                        self.quiz_id)
 
         current_page += 1
-        self.assertEqual(temp_request.session['current_score'][current_page - 1],
+        mock_calculate_score.assert_called_with([self.plan.options[0]])
+        # option_1 (10) is selected: for worst question_text_0 <option_1> -> <option_2>
+        self.assertEqual(progress.page_sugestions,
+                         [[None, [0, 0, 1, 10]], None])
+        self.assertFalse(progress.is_selected(1))
+        self.assertEqual(progress.current_score[current_page - 1],
                          mock.sentinel.calculated_score)
-        self.assertEqual(temp_request.session['current_page_no'],
+        self.assertEqual(progress.current_page_no,
                          current_page)
-        with self.assertRaises(KeyError):
-            temp_request.session['error']
+        self.assertTrue(progress.error is None)
 
         # 'Next'/'Finish' with error
-        def mock_raise_validation(page_question_list, selected_options):
+        def mock_raise_validation(page_question_list, progress):
             raise ValidationError('Error message.')
         mock_validate.side_effect = mock_raise_validation
 
         self.view._handle_post_request(temp_request,
+                                       self.plan,
+                                       progress,
                                        given_page_qustions,
                                        self.quiz_id)
 
-        self.assertTrue(temp_request.session['error'])
-        self.assertEqual(temp_request.session['current_page_no'],
+        self.assertTrue(progress.error)
+        self.assertEqual(progress.current_page_no,
                          current_page)
-        self.assertEqual(temp_request.session['current_score'][current_page - 1],
+        self.assertEqual(progress.current_score[current_page - 1],
                          mock.sentinel.calculated_score)
 
     @mock.patch('quiz.views.render')
-    @mock.patch('quiz.views.QuizView._compute_sugestions')
-    @mock.patch('quiz.views.QuizView._calculate_max_score')
+    @mock.patch('quiz.scoring.ScoringEngine.sugestion_texts')
     def test_handle_get_request(self,
-                                mock_calculate_max_score,
-                                mock_compute_sugestions,
+                                mock_sugestions,
                                 mock_render):
         temp_request = self.DummyRequest()
+        temp_request.session = {'quiz_progress': None}
 
-        mock_calculate_max_score.side_effect = [mock.sentinel.max_score]
-        mock_compute_sugestions.side_effect = [mock.sentinel.sugestions]
+        mock_sugestions.side_effect = [mock.sentinel.sugestions]
 
         # result page without error
-        current_page = 2
-        temp_request.session['selected_options'] = self.expected_selected_options
-        temp_request.session['current_page_no'] = current_page
-        temp_request.session['current_score'] = [1, 3]
-        temp_request.session['last_page_no'] = \
-            len(self.expected_qustion_list) / self.questions_per_page
+        progress = self._make_progress(self.plan)
+        progress.current_page_no = 2
+        progress.current_score = [1, 3]
+        progress.page_sugestions = [[None, None], [[2, 4, 5, 62], None]]
 
         self.view._handle_get_request(temp_request,
-                                      self.expected_qustion_list,
-                                      self.expected_qustion_list[:2],
+                                      self.plan,
+                                      progress,
+                                      self.plan.questions[2:],
                                       self.quiz_id)
 
         self.assertEqual(temp_request.session, {})
+        mock_sugestions.assert_called_with(progress.page_sugestions)
         expected_context = {'score': 4,
-                            'max_score': mock.sentinel.max_score,
-                            'sugestions': mock.sentinel.sugestions}
+                            'max_score': 50,
+                            'sugestions': mock.sentinel.sugestions,
+                            'leaderboard': mock.ANY,
+                            'rank': 1,
+                            'attempts': 1}
         mock_render.assert_called_with(temp_request,
                                        self.view.result_template_name,
                                        expected_context)
 
         # result page with error
-        current_page = 2
-        temp_request.session['error'] = True
-        temp_request.session['selected_options'] = self.expected_selected_options
-        temp_request.session['current_page_no'] = current_page
-        temp_request.session['current_score'] = [1, 3]
-        temp_request.session['last_page_no'] = \
-            len(self.expected_qustion_list) / self.questions_per_page
+        progress = self._make_progress(self.plan, [0])
+        progress.error = True
+        progress.current_page_no = 2
+        progress.current_score = [1, 3]
 
         self.view._handle_get_request(temp_request,
-                                      self.expected_qustion_list,
-                                      self.expected_qustion_list[:2],
+                                      self.plan,
+                                      progress,
+                                      [],
                                       self.quiz_id)
 
         expected_context = {
             'quiz_id': 0,
             'current_page': 1,
             'error': True,
-            'questions': [('question_text_0', [('option_2', 'option_text_2', False),
-                                               ('option_1', 'option_text_1', False)]),
-                          ('question_text_1', [('option_3', 'option_text_3', False),
-                                               ('option_4', 'option_text_4', False)])],
+            'questions_html': mock.ANY,
             'is_last_page': True
         }
         mock_render.assert_called_with(temp_request,
                                        self.view.template_name,
                                        expected_context)
+        questions_html = mock_render.call_args[0][2]['questions_html']
+        self.assertIn('question_text_2', questions_html)
+        self.assertIn("name='option_5'", questions_html)
+        self.assertNotIn('checked', questions_html)
+        self.assertTrue(progress.error is None)
+        self.assertEqual(temp_request.session['quiz_progress'], progress.to_dict())
 
     @mock.patch('quiz.views.QuizView._handle_post_request')
     @mock.patch('quiz.views.QuizView._handle_get_request')
-    @mock.patch('quiz.views.QuizView._init_session')
     def test__call__(self,
-                     mock_init_session,
                      mock_handle_get_request,
                      mock_handle_post_request):
-
-        def _mock_init_session(request, quiz_id):
-            request.session['question_list'] = self.expected_qustion_list
-            request.session['current_page_no'] = 0
-
         temp_request = self.DummyRequest()
+        temp_request.session = {}
 
         # get with uninitialised request.session
         temp_request.method = 'GET'
-        mock_init_session.side_effect = _mock_init_session
 
         self.view.__call__(temp_request, self.quiz_id)
 
-        mock_handle_get_request.assert_called_with(temp_request,
-                                                   self.expected_qustion_list,
-                                                   self.expected_qustion_list[:
-                                                        self.questions_per_page],
-                                                   self.quiz_id)
-
-        # post
+        args = mock_handle_get_request.call_args[0]
+        self.assertEqual(args[0], temp_request)
+        self.assertEqual(args[1].version, self.plan.version)
+        self.assertEqual(args[2].current_page_no, 0)
+        self.assertEqual(args[3], self.plan.questions[:self.questions_per_page])
+        self.assertEqual(args[4], self.quiz_id)
+        self.assertEqual(temp_request.session['quiz_progress'], args[2].to_dict())
+
+        # post on the second page
+        progress = QuizProgress.from_dict(temp_request.session['quiz_progress'])
+        progress.current_page_no = 1
+        temp_request.session['quiz_progress'] = progress.to_dict()
         temp_request.method = 'POST'
 
         self.view.__call__(temp_request, self.quiz_id)
 
-        mock_handle_post_request.assert_called_with(temp_request,
-                                                    self.expected_qustion_list[:
-                                                        self.questions_per_page],
-                                                    self.quiz_id)
+        args = mock_handle_post_request.call_args[0]
+        self.assertEqual(args[0], temp_request)
+        self.assertEqual(args[1].version, self.plan.version)
+        self.assertEqual(args[2].to_dict(), progress.to_dict())
+        self.assertEqual(args[3], self.plan.questions[self.questions_per_page:])
+        self.assertEqual(args[4], self.quiz_id)
@@ -0,0 +1,9 @@
+from django.conf.urls import include, url
+from django.contrib import admin
+
+
+# the quiz URLs with the admin, for the tests of the admin pages
+urlpatterns = [
+    url(r'^admin/', include(admin.site.urls)),
+    url(r'^', include('quiz.urls')),
+]
@@ -0,0 +1,52 @@
+'''
+Work to do again once the current transaction is committed.
+
+The model signals invalidate the cached plans and pages inside the
+transaction of the write (the admin saves in an atomic block): until the
+commit, a request of another process can still read the old rows and
+cache them under the new generation. after_commit runs the invalidation at
+once, for the reads of the transaction itself, and again after the commit:
+with transaction.on_commit from Django 1.9 on, and on Django 1.8, which has
+no commit hooks, when the request finishes (run_deferred, connected to
+request_finished in quiz.signals), after the atomic blocks of the view and
+ATOMIC_REQUESTS are closed.
+'''
+import threading
+
+from django.db import transaction
+
+
+_deferred = threading.local()
+
+
+def _pending():
+    try:
+        return _deferred.calls
+    except AttributeError:
+        _deferred.calls = []
+        return _deferred.calls
+
+
+def after_commit(func, *args):
+    '''Calls func(*args) now and, within a transaction, again after its commit'''
+    func(*args)
+    if not transaction.get_connection().in_atomic_block:
+        return
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is not None:
+        on_commit(lambda: func(*args))
+        return
+    pending = _pending()
+    if (func, args) not in pending:
+        pending.append((func, args))
+
+
+def run_deferred(**kwargs):
+    '''Runs the calls deferred by after_commit on Django 1.8, once committed'''
+    if transaction.get_connection().in_atomic_block:
+        # still in the transaction of the caller
+        return
+    pending = _pending()
+    _deferred.calls = []
+    for func, args in pending:
+        func(*args)
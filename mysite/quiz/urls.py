@@ -1,9 +1,12 @@
 from django.conf.urls import url
 
-from . import views
+from . import api, metrics, views
 
 
 urlpatterns = [
     url(r'^$', views.index_view),
-    url(r'(?P<quiz_id>.+)/$', views.quiz_view, name='quiz'),
+    url(r'^api/(?P<quiz_id>\d+)/$', api.quiz_definition, name='api_quiz'),
+    url(r'^api/(?P<quiz_id>\d+)/answers/$', api.submit_answers, name='api_answers'),
+    url(r'^metrics/$', metrics.metrics_view, name='quiz_metrics'),
+    url(r'^(?P<quiz_id>\d+)/$', views.quiz_view, name='quiz'),
 ]
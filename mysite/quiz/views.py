@@ -1,25 +1,104 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.middleware.csrf import get_token
 from django.shortcuts import render, redirect
 from django.core.exceptions import ValidationError
-
-from .models import Quiz, Question
-
+from django.db.models import QuerySet
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+from .models import Quiz
+from .pagecache import index_cursor_key, index_page_key, page_fragment_key
+from .plans import QuizPlan, StalePlan, get_plan, load_question_rows
+from .progress import QuizProgress, consume_nonce, get_progress_store
+from .snapshots import get_snapshot_plan
+from .attempts import record_attempt
+from .leaderboard import approximate_rank, top_scores
+
+import binascii
+import hashlib
 import logging
+import re
 
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
 
 
+def _index_page(request):
+    '''
+    Returns the (content, etag, rendered_at) of the requested index page,
+    rendered on a cache miss; kept on the request for the view and the
+    conditional GET functions.
+    '''
+    page = getattr(request, '_quiz_index_page', None)
+    if page is not None:
+        return page
+
+    page_size = getattr(settings, 'QUIZ_INDEX_PAGE_SIZE', 50)
+    try:
+        after = max(int(request.GET.get('after', 0)), 0)
+    except ValueError:
+        after = 0
+
+    key = index_page_key(after)
+    page = cache.get(key)
+    if page is None:
+        quizs_list = list(Quiz.objects.filter(id__gt=after)
+                                      .order_by('id')
+                                      .values_list('id', 'name', 'description')[:page_size + 1])
+        next_after = quizs_list[page_size - 1][0] if len(quizs_list) > page_size else None
+        content = render_to_string('index.html', {'quizs_list': quizs_list[:page_size],
+                                                  'is_first_page': after == 0,
+                                                  'next_after': next_after})
+        etag = hashlib.md5(content.encode('utf-8')).hexdigest()[:12]
+        page = (content, etag, timezone.now())
+        # only the pages reached from the first one are cached: any other
+        # cursor would add a cache entry
+        if after == 0 or cache.get(index_cursor_key(after)):
+            cache.set(key, page)
+            if next_after is not None:
+                cache.set(index_cursor_key(next_after), True)
+
+    request._quiz_index_page = page
+    return page
+
+
+@condition(etag_func=lambda request: _index_page(request)[1],
+           last_modified_func=lambda request: _index_page(request)[2])
 def index_view(request):
-    template_name = 'index.html'
+    '''
+    Lists the quizzes ordered by id, a page at a time: '?after=<id>' starts
+    the page after the quiz <id> (keyset pagination). The pages reached
+    from the first one are cached until a quiz is changed, and all of them
+    can be cached by shared caches for QUIZ_HTTP_MAX_AGE seconds.
+    '''
+    response = HttpResponse(_index_page(request)[0])
+    patch_cache_control(response, public=True,
+                        max_age=getattr(settings, 'QUIZ_HTTP_MAX_AGE', 60))
+    return response
+
 
-    return render(request, template_name, {'quizs_list': Quiz.objects.all})
+# stands for the 'checked' attribute of an option in the cached page fragments;
+# it is escaped if it appears in the quiz text, so it can not collide
+CHECKED_MARKER = '<!--checked-->'
+CHECKED_MARKER_RE = re.compile(re.escape(CHECKED_MARKER))
 
 
 class QuizView(object):
     template_name = 'quiz_form.html'
+    single_page_template_name = 'quiz_single_form.html'
+    questions_template_name = 'quiz_questions.html'
     result_template_name = 'quiz_result.html'
     questions_per_page = 2
 
+    def __init__(self, progress_store=None):
+        self.progress_store = progress_store or get_progress_store()
+
     def get_question_mapping(self, question_list):
         '''
         Maps the questions from DB into 2 structures:
@@ -36,40 +115,40 @@ class QuizView(object):
                             'option_2': {'is_selected': True,
                                          'score': 1},}}
         '''
-        selected_options = {}
-        questions_mapping = []
+        if isinstance(question_list, QuerySet):
+            # built from the rows of two queries, without model instances
+            return QuizPlan(None, load_question_rows(question_list)).question_mapping()
+        return QuizPlan.from_questions(None, question_list).question_mapping()
 
+    def _validate_min_options_selected(self, question_list, progress):
         for question in question_list:
-            raw_options = question.option_set.all()
-
-            mapped_options = {}
-            for option in raw_options:
-                mapped_options['option_' + str(option.id)] = option.text
-
-                selected_options['option_' + str(option.id)] = {'is_selected': False,
-                                                                'score': option.scor}
-
-            questions_mapping.append({'question_text': question.text,
-                                      'options': mapped_options})
-
-        return questions_mapping, selected_options
-
-    def _validate_min_options_selected(self, question_list, selected_options):
-        for question in question_list:
-            for option_id, _ in question['options'].items():
-                if selected_options[option_id]['is_selected']:
+            for option in question.options:
+                if progress.is_selected(option.index):
                     break
             else:
                 raise ValidationError('Please fill all questions '
                                       'with at least one option!')
 
+    def _get_page_errors(self, plan, progress, page_numbers=None):
+        '''Validates the pages (all of them by default), returns {page_no: error}'''
+        if page_numbers is None:
+            page_numbers = range(progress.last_page_no + 1)
+        errors = {}
+        for page_no in page_numbers:
+            try:
+                self._validate_min_options_selected(
+                    plan.page_questions(page_no, self.questions_per_page), progress)
+            except ValidationError as exception:
+                errors[page_no] = exception.message
+        return errors
+
     def _calculate_score(self, selected_option_list):
         page_score = 0
         for option in selected_option_list:
-            page_score += option['score']
+            page_score += option.score
         return page_score
 
-    def _get_context_question_list(self, page_question_list, request_session):
+    def _get_context_question_list(self, page_question_list, progress):
         '''Packs the questions info into a context list'''
         # context_question_list = [('question1', [('opt_id', 'opt_text', False),
         #                                         ('opt_id', 'opt_text', False)]),
@@ -79,18 +158,54 @@ class QuizView(object):
             # options = [('opt_id', 'opt_text', False),
             #            ('opt_id', 'opt_text', True)]
             options = []
-            for option_id, option_text in question['options'].items():
-                is_selected = request_session['selected_options'][option_id]['is_selected']
-                options.append((option_id, option_text, is_selected))
+            for option in question.options:
+                is_selected = progress.is_selected(option.index)
+                options.append((option.key, option.text, is_selected))
 
-            context_question_list.append((question['question_text'], options))
+            context_question_list.append((question.text, options))
         return context_question_list
 
+    def _render_page_fragment(self, page_question_list):
+        questions = [(question.text,
+                      [(option.key, option.text, mark_safe(CHECKED_MARKER))
+                       for option in question.options])
+                     for question in page_question_list]
+        html = render_to_string(self.questions_template_name, {'questions': questions})
+        return CHECKED_MARKER_RE.split(html)
+
+    def _get_page_fragment(self, plan, page_question_list, page_no):
+        '''
+        Returns the questions of a page rendered once per quiz content, as
+        the list of static segments around the options 'checked' attribute.
+        '''
+        if plan.sampled:
+            # the questions of a sampled plan are drawn for one attempt
+            return self._render_page_fragment(page_question_list)
+
+        key = page_fragment_key(plan, page_no, self.questions_per_page)
+        segments = cache.get(key)
+        if segments is None:
+            segments = self._render_page_fragment(page_question_list)
+            cache.set(key, segments)
+        return segments
+
+    def _render_page_questions(self, plan, progress, page_question_list, page_no):
+        '''Applies the selection of the session on the cached page fragment'''
+        segments = iter(self._get_page_fragment(plan, page_question_list, page_no))
+        parts = [next(segments)]
+        for question in page_question_list:
+            for option in question.options:
+                parts.append('checked' if progress.is_selected(option.index) else '')
+                parts.append(next(segments))
+        return mark_safe(''.join(parts))
+
+    # _calculate_max_score, _find_best_option and _compute_sugestions are the
+    # reference implementation of the vectorized quiz.scoring.ScoringEngine
     def _calculate_max_score(self, option_list):
         max_score = 0
-        for _, option_info in option_list.items():
-            if option_info['score'] > 0:
-                max_score += option_info['score']
+        for option in option_list:
+            if option.score > 0:
+                max_score += option.score
         return max_score
 
     def _find_best_option(self, options, selected=False, positive=False):
@@ -106,7 +221,7 @@ class QuizView(object):
 
         return result
 
-    def _compute_sugestions(self, question_list, request_session, questions_per_page):
+    def _compute_sugestions(self, question_list, progress, questions_per_page):
         question_it = iter(question_list)
         # sugestions = [
         #   p0          (('best q3<d> -> <b>', 17), (None, None)),
@@ -124,18 +239,18 @@ class QuizView(object):
                     is_min_valid = False
 
                     try:
-                        question = question_it.next()
+                        question = next(question_it)
                     except StopIteration:
                         page_sugestion = ((max_change, max_diff_for_max), (min_change, -max_diff_for_min))
                         sugestions.append(page_sugestion)
                         raise
 
                     options = [
-                        {'id': op_id,
-                         'text': op_text,
-                         'is_sel': request_session['selected_options'][op_id]['is_selected'],
-                         'score': request_session['selected_options'][op_id]['score']}
-                        for op_id, op_text in question['options'].items()]
+                        {'id': option.key,
+                         'text': option.text,
+                         'is_sel': progress.is_selected(option.index),
+                         'score': option.score}
+                        for option in question.options]
 
                     max_unsel = self._find_best_option(options, selected=False, positive=True)
                     min_sel = self._find_best_option(options, selected=True, positive=False)
@@ -147,7 +262,7 @@ class QuizView(object):
                         diff_for_max = max_unsel['score'] - min_sel['score']
                         if diff_for_max > 0:
                             if max_diff_for_max < diff_for_max:
-                                max_change = 'for best: '+question['question_text']+'<'+min_sel['text']+'> -> <'+max_unsel['text']+'>'
+                                max_change = 'for best: '+question.text+'<'+min_sel['text']+'> -> <'+max_unsel['text']+'>'
                                 max_diff_for_max = diff_for_max
 
                     # change the min_change if is a bigger difference
@@ -155,7 +270,7 @@ class QuizView(object):
                         diff_for_min = max_sel['score'] - min_unsel['score']
                         if diff_for_min > 0:
                             if max_diff_for_min < diff_for_min:
-                                min_change = 'for worst: '+question['question_text']+'<'+max_sel['text']+'> -> <'+min_unsel['text']+'>'
+                                min_change = 'for worst: '+question.text+'<'+max_sel['text']+'> -> <'+min_unsel['text']+'>'
                                 max_diff_for_min = diff_for_min
 
                 page_sugestion = ((max_change, max_diff_for_max), (min_change, -max_diff_for_min))
@@ -165,98 +280,311 @@ class QuizView(object):
                 break
         return sugestions
 
-    def _init_session(self, request, quiz_id):
-        raw_question_list = Question.objects.filter(quiz=quiz_id).prefetch_related('option_set')
-
-        request.session.clear()
-        request.session['quiz_id'] = quiz_id
-        request.session['current_page_no'] = 0
-
-        # 'selected_options' keeps track of selected options for each session
-        request.session['question_list'], request.session['selected_options'] = \
-            self.get_question_mapping(raw_question_list)
-
-        request.session['last_page_no'] = \
-            len(request.session['question_list']) / self.questions_per_page
+    def _init_session(self, request, plan):
+        progress = QuizProgress.for_plan(plan, self.questions_per_page)
+        if self.progress_store.load(request, plan.quiz_id) is not None:
+            # the answers of an attempt at a quiz whose questions or options
+            # changed since do not fit it any more
+            progress.error = 'The quiz was changed, please answer it again.'
+            request.quiz_restarted = True
+        self.progress_store.start(request, progress)
+        return progress
+
+    def _rescore(self, plan, progress):
+        '''
+        Scores the pages again with the plan: the texts and scores of the
+        quiz changed during the attempt, which kept its progress.
+        '''
+        progress.current_score = [
+            self._calculate_score([option
+                                   for question in plan.page_questions(page_no,
+                                                                       self.questions_per_page)
+                                   for option in question.options
+                                   if progress.is_selected(option.index)])
+            for page_no in range(progress.last_page_no + 1)]
+        progress.page_sugestions = [None] * (progress.last_page_no + 1)
+        progress.content_version = plan.content_version
+
+    def _get_progress(self, request, plan):
+        '''Returns the progress of the session or None if it is not for this plan'''
+        data = self.progress_store.load(request, plan.quiz_id)
+        if data is None:
+            return None
 
-        last_page_no = request.session['last_page_no']
-        request.session['current_score'] = [0] * (last_page_no + 1)
+        progress = QuizProgress.from_dict(data)
+        if not progress.matches(plan):
+            return None
+        return progress
 
-    def _handle_post_request(self, request, page_question_list, quiz_id):
+    def _get_sample(self, request, pool):
+        '''
+        Returns the plan and the progress of the attempt at a sampled quiz:
+        the questions are drawn from the pool when the attempt starts and
+        their ids are kept in the progress, so the pages stay the same.
+        '''
+        data = self.progress_store.load(request, pool.quiz_id)
+        if data is not None and data.get('question_ids'):
+            progress = QuizProgress.from_dict(data)
+            plan = pool.sample_plan(progress.question_ids)
+            if progress.matches(plan):
+                return plan, progress
+
+        plan = pool.sample_plan(pool.sample())
+        request.quiz_step = 'init'
+        return plan, self._init_session(request, plan)
+
+    def _get_pinned_progress(self, request, plan):
+        '''
+        A session started on another published snapshot of the quiz goes on
+        with it: returns the plan of the snapshot and the progress, or
+        (plan, None).
+        '''
+        data = self.progress_store.load(request, plan.quiz_id)
+        if data is not None and data.get('content_version'):
+            pinned_plan = get_snapshot_plan(plan.quiz_id, data['content_version'])
+            if pinned_plan is not None:
+                return pinned_plan, QuizProgress.from_dict(data)
+        return plan, None
+
+    def _save_progress(self, request, response, progress):
+        self.progress_store.save(request, response, progress)
+        return response
+
+    def _handle_post_request(self, request, plan, progress, page_question_list, quiz_id):
+        request.quiz_step = 'page_post'
         page_selected_options = []
-        # update the session data with selected options from POST
+        # update the progress with selected options from POST
         for question in page_question_list:
-            for option_id, _ in question['options'].items():
-                is_selected = (option_id in request.POST)
-                request.session['selected_options'][option_id]['is_selected'] = is_selected
+            for option in question.options:
+                is_selected = (option.key in request.POST)
+                progress.set_selected(option.index, is_selected)
                 if is_selected:
-                    page_selected_options.append(request.session['selected_options'][option_id])
+                    page_selected_options.append(option)
         if 'Previous' in request.POST:
-            request.session['current_page_no'] -= 1
+            progress.current_page_no -= 1
         elif 'Next' in request.POST or \
              'Finish' in request.POST:
             try:
-                self._validate_min_options_selected(page_question_list,
-                                                    request.session['selected_options'])
+                self._validate_min_options_selected(page_question_list, progress)
 
-                current_page_no = request.session['current_page_no']
                 current_score = self._calculate_score(page_selected_options)
-                request.session['current_score'][current_page_no] = current_score
+                progress.current_score[progress.current_page_no] = current_score
+
+                # the suggestions of a page only change when the page is submitted
+                scoring = plan.scoring
+                progress.page_sugestions[progress.current_page_no] = \
+                    scoring.page_change_record(scoring.selection_mask(progress),
+                                               self.questions_per_page,
+                                               progress.current_page_no)
             except ValidationError as exception:
-                request.session['error'] = exception.message
+                progress.error = exception.message
             else:
-                request.session['current_page_no'] += 1
+                progress.current_page_no += 1
 
-        return redirect('quiz', quiz_id=quiz_id)
+        return self._save_progress(request,
+                                   redirect('quiz', quiz_id=quiz_id),
+                                   progress)
 
-    def _handle_get_request(self, request, question_list, page_question_list, quiz_id):
-        error = request.session.get('error', None)
-        request.session['error'] = None
-        if request.session['current_page_no'] > request.session['last_page_no']:
+    def _page_etag(self, request, plan, progress):
+        '''
+        A quiz page only depends on the quiz content, the page, the selected
+        options and the CSRF token of the form.
+        '''
+        state = '%s:%d:%s:%s' % (plan.content_version, progress.current_page_no,
+                                 binascii.hexlify(bytes(progress.selected)).decode('ascii'),
+                                 get_token(request))
+        return hashlib.md5(state.encode('utf-8')).hexdigest()[:12]
+
+    def _leaderboard_context(self, quiz_id, score):
+        '''The best scores of the quiz and the rank of the attempt, once recorded'''
+        rank, attempts = approximate_rank(quiz_id, score)
+        return {'leaderboard': top_scores(quiz_id),
+                'rank': rank,
+                'attempts': attempts}
+
+    def _handle_get_request(self, request, plan, progress, page_question_list, quiz_id):
+        if getattr(request, 'quiz_step', None) != 'init':
+            request.quiz_step = 'page_get'
+        error = progress.error
+        progress.error = None
+        if progress.current_page_no > progress.last_page_no:
             if not error:
+                request.quiz_step = 'finish'
+                if progress.content_version != plan.content_version:
+                    self._rescore(plan, progress)
                 # create the result page
-                score = sum(request.session['current_score'])
-                max_score = self._calculate_max_score(request.session['selected_options'])
-                sugestions = self._compute_sugestions(question_list,
-                                                      request.session,
-                                                      self.questions_per_page)
+                score = sum(progress.current_score)
+                max_score = plan.scoring.max_score
+                sugestions = self._get_sugestions(plan, progress)
                 context = {'score': score,
                            'max_score': max_score,
                            'sugestions': sugestions}
-                request.session.clear()
-
-                return render(request, self.result_template_name, context)
+                # a replayed progress token shows the result again, unrecorded
+                if consume_nonce(progress):
+                    record_attempt(plan, progress)
+                context.update(self._leaderboard_context(plan.quiz_id, score))
+                response = render(request, self.result_template_name, context)
+                self.progress_store.finish(request, response, progress)
+                return response
             else:
-                request.session['current_page_no'] -= 1
+                progress.current_page_no -= 1
+                page_question_list = self._get_page_question_list(plan, progress)
+
+        etag = None
+        if not error:
+            # reloading a page (or going back to it) without changes is answered with a 304
+            etag = self._page_etag(request, plan, progress)
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+                response['ETag'] = quote_etag(etag)
+                return response
 
-        questions = self._get_context_question_list(page_question_list, request.session)
+        questions_html = self._render_page_questions(plan, progress, page_question_list,
+                                                     progress.current_page_no)
 
-        is_last_page = request.session['current_page_no'] == request.session['last_page_no']
+        is_last_page = progress.current_page_no == progress.last_page_no
 
         context = {'quiz_id': quiz_id,
                    'is_last_page': is_last_page,
-                   'current_page': request.session['current_page_no'],
-                   'questions': questions,
+                   'current_page': progress.current_page_no,
+                   'questions_html': questions_html,
                    'error': error}
 
-        return render(request, self.template_name, context)
+        response = render(request, self.template_name, context)
+        if error:
+            self._save_progress(request, response, progress)
+        else:
+            response['ETag'] = quote_etag(etag)
+        return response
 
-    def __call__(self, request, quiz_id):
-        # if the session is new get all questions from DB and map them into a dict structure
-        if request.session.get('quiz_id', -1) != quiz_id:
-            self._init_session(request, quiz_id)
+    def _handle_single_page_request(self, request, plan, progress, quiz_id):
+        '''
+        Serves a quiz shown in one form: the whole quiz is validated when the
+        form is posted, then scored and recorded by the result step the
+        response redirects to, as for the last page of the other quizzes. The
+        progress is only kept between the two.
+        '''
+        if request.method != 'POST' and progress is not None and \
+                progress.current_page_no > progress.last_page_no:
+            return self._handle_get_request(request, plan, progress, (), quiz_id)
 
-        question_list = request.session['question_list']
+        progress = QuizProgress.for_plan(plan, self.questions_per_page)
+        errors = {}
+        if request.method == 'POST':
+            request.quiz_step = 'page_post'
+            for option in plan.options:
+                progress.set_selected(option.index, option.key in request.POST)
+
+            errors = self._get_page_errors(plan, progress)
+            if not errors:
+                scoring = plan.scoring
+                progress.current_score = [scoring.score(scoring.selection_mask(progress))]
+                progress.current_page_no = progress.last_page_no + 1
+                return self._save_progress(request,
+                                           redirect('quiz', quiz_id=quiz_id),
+                                           progress)
+        else:
+            request.quiz_step = 'page_get'
+            etag = self._page_etag(request, plan, progress)
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+                response['ETag'] = quote_etag(etag)
+                return response
+
+        pages = []
+        for page_no in range(progress.last_page_no + 1):
+            page_question_list = plan.page_questions(page_no, self.questions_per_page)
+            if page_question_list:
+                pages.append((page_no,
+                              errors.get(page_no),
+                              self._render_page_questions(plan, progress,
+                                                          page_question_list, page_no)))
+
+        response = render(request, self.single_page_template_name,
+                          {'quiz_id': quiz_id, 'pages': pages})
+        if request.method != 'POST':
+            response['ETag'] = quote_etag(etag)
+        return response
+
+    def _get_sugestions(self, plan, progress):
+        '''Assembles the suggestions computed when each page was submitted'''
+        scoring = plan.scoring
+        records = list(progress.page_sugestions)
+        missing = [page_no for page_no, record in enumerate(records) if record is None]
+        if missing:
+            # the pages without a record (all of them with the signed cookie
+            # store) in one pass
+            first_page = missing[0]
+            computed = scoring.change_records(scoring.selection_mask(progress),
+                                              self.questions_per_page,
+                                              first_page, missing[-1] - first_page + 1)
+            for page_no in missing:
+                records[page_no] = computed[page_no - first_page]
+        return scoring.sugestion_texts(records)
+
+    def _get_page_question_list(self, plan, progress):
+        return plan.page_questions(progress.current_page_no, self.questions_per_page)
+
+    def __call__(self, request, quiz_id):
+        try:
+            return self._serve(request, quiz_id)
+        except StalePlan:
+            # a LazyQuizPlan found its pages changed and dropped itself
+            pass
+        try:
+            return self._serve(request, quiz_id)
+        except StalePlan:
+            # the stored option counts are wrong, see rebuild_quiz_stats
+            logger.warning('The option counts of quiz %s are stale', quiz_id)
+            response = HttpResponse('The quiz is being updated, please try again later.',
+                                    status=503)
+            response['Retry-After'] = '60'
+            return response
+
+    def _serve(self, request, quiz_id):
+        plan = get_plan(quiz_id)
+
+        # request.quiz_step labels the request metrics, see quiz.metrics
+        progress = None
+        if plan.sample_size is not None:
+            plan, progress = self._get_sample(request, plan)
+        # the questions drawn for a new attempt are kept from its first response on
+        new_sample = getattr(request, 'quiz_step', None) == 'init'
+
+        if plan.single_page:
+            if progress is None:
+                # a posted form waiting for its result step
+                progress = self._get_progress(request, plan)
+            response = self._handle_single_page_request(request, plan, progress, quiz_id)
+            if new_sample:
+                self._save_progress(request, response, progress)
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+        # if the session is new start it from the compiled quiz plan
+        if progress is None:
+            progress = self._get_progress(request, plan)
+        if progress is None and plan.published:
+            plan, progress = self._get_pinned_progress(request, plan)
+        if progress is None:
+            progress = self._init_session(request, plan)
+            request.quiz_step = 'init'
 
         # calculate current page
-        delta_quesiton_list = request.session['current_page_no'] * self.questions_per_page
-        page_question_list = question_list[delta_quesiton_list:
-                                           (delta_quesiton_list + self.questions_per_page)]
+        page_question_list = self._get_page_question_list(plan, progress)
 
-        if request.method == 'POST':
-            return self._handle_post_request(request, page_question_list, quiz_id)
+        if request.method == 'POST' and getattr(request, 'quiz_restarted', False):
+            # the answers were posted for the changed quiz: shows its first page
+            response = self._save_progress(request, redirect('quiz', quiz_id=quiz_id), progress)
+        elif request.method == 'POST':
+            response = self._handle_post_request(request, plan, progress, page_question_list, quiz_id)
         else:
-            return self._handle_get_request(request, question_list, page_question_list, quiz_id)
+            response = self._handle_get_request(request, plan, progress, page_question_list, quiz_id)
+        if new_sample:
+            self._save_progress(request, response, progress)
+        # the pages depend on the session, shared caches must not keep them
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
 quiz_view = QuizView()
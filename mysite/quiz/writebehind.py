@@ -0,0 +1,179 @@
+'''
+Write-behind buffer.
+
+Records are queued in memory and written by a background thread in
+batches, when batch_size records are pending or flush_interval seconds
+after the first pending one. The queue is bounded: when it is full
+submit() blocks up to put_timeout seconds and then writes the record
+synchronously, so callers are slowed down instead of records being lost.
+
+The background thread serves no request, so the request signals never
+recycle its DB connection: it closes the unusable or obsolete connections
+itself before each batch, and a failed batch is written again (retries
+times) on a new connection before its records are counted as failed.
+write_batch must write a batch atomically for the retries to be safe.
+'''
+import atexit
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connection
+from django.utils.six.moves import queue
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindBuffer(object):
+    def __init__(self, write_batch, max_queue=10000, batch_size=500,
+                 flush_interval=1.0, put_timeout=5.0, retries=1):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # updated under _lock, from the request threads and the background thread
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self.sync_writes = 0
+        self.batches = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='quiz-write-behind')
+                self._thread.daemon = True
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        '''Writes all the pending records and stops the background thread'''
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        else:
+            self.flush()
+
+    def submit(self, record):
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.sync_writes += 1
+            self._write([record])
+        else:
+            with self._lock:
+                self.enqueued += 1
+
+    def flush(self):
+        '''Writes the pending records from the calling thread'''
+        self._flush()
+
+    def _flush(self, in_background=False):
+        batch = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not _STOP:
+                batch.append(record)
+            if len(batch) == self.batch_size:
+                self._write(batch, in_background)
+                batch = []
+        if batch:
+            self._write(batch, in_background)
+
+    def stats(self):
+        with self._lock:
+            return {'queue_depth': self._queue.qsize(),
+                    'enqueued': self.enqueued,
+                    'written': self.written,
+                    'failed': self.failed,
+                    'retried': self.retried,
+                    'sync_writes': self.sync_writes,
+                    'batches': self.batches,
+                    'last_flush_seconds': self.last_flush_seconds,
+                    'max_flush_seconds': self.max_flush_seconds,
+                    'total_flush_seconds': self.total_flush_seconds}
+
+    def _write(self, batch, in_background=False):
+        '''
+        Writes a batch, retrying it on failure; in_background when called
+        from the background thread, which owns its connection.
+        '''
+        start = time.time()
+        written = False
+        for attempt_no in range(self.retries + 1):
+            if in_background:
+                # a connection dropped by the server or past CONN_MAX_AGE
+                close_old_connections()
+            try:
+                self.write_batch(batch)
+            except Exception:
+                if attempt_no == self.retries:
+                    logger.exception('Write-behind lost %d records', len(batch))
+                    break
+                logger.warning('Write-behind failed to write %d records, retrying',
+                               len(batch), exc_info=True)
+                with self._lock:
+                    self.retried += 1
+                if in_background:
+                    connection.close()
+            else:
+                written = True
+                break
+        duration = time.time() - start
+
+        with self._lock:
+            if written:
+                self.written += len(batch)
+            else:
+                self.failed += len(batch)
+            self.batches += 1
+            self.last_flush_seconds = duration
+            self.max_flush_seconds = max(self.max_flush_seconds, duration)
+            self.total_flush_seconds += duration
+
+    def _take_batch(self):
+        '''Waits for a full batch or flush_interval after the first record'''
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = None if deadline is None else deadline - time.time()
+            if timeout is not None and timeout <= 0:
+                break
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if record is _STOP:
+                return batch, True
+            batch.append(record)
+            if deadline is None:
+                deadline = time.time() + self.flush_interval
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._take_batch()
+            if batch:
+                self._write(batch, in_background=True)
+        self._flush(in_background=True)
+        connection.close()
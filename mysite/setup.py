@@ -9,5 +9,6 @@ setup(
     include_package_data=True,
     install_requires=[
         "Django >= 1.8",
+        "numpy",
     ]
 )